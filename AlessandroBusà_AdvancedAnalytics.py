@@ -15,205 +15,435 @@
 # 2. Creazione di grafici a barre per visualizzare le vendite.
 # 3. Classificazione delle mele e valutazione della performance del modello tramite matrice di confusione.
 # 4. Visualizzazione del trend delle vendite mensili nel tempo.
-
-# Import delle librerie necessarie per l'analisi e il machine learning
-from sklearn.model_selection import train_test_split                                    # Funzione per suddividere il dataset in training set e test set
-from sklearn.ensemble import RandomForestClassifier                                     # Classificatore Random Forest per problemi di classificazione
-from sklearn.metrics import classification_report, mean_squared_error, confusion_matrix # Funzioni per valutare le performance del modello di classificazione
-from sklearn.linear_model import LinearRegression                                       # Modello di regressione lineare per problemi di regressione
+#
+# Utilizzo (ogni sezione può essere eseguita da sola; senza sottocomando vengono eseguite tutte):
+#   python AlessandroBusà_AdvancedAnalytics.py sales --no-plots            # Solo il report delle vendite, senza grafici
+#   python AlessandroBusà_AdvancedAnalytics.py apple-quality               # Solo la classificazione della qualità delle mele
+#   python AlessandroBusà_AdvancedAnalytics.py trend --chart-dir grafici   # Solo il trend mensile, con il grafico salvato su file
+#   python AlessandroBusà_AdvancedAnalytics.py predict nuove_mele.csv      # Classifica nuove mele con il modello salvato
+#   python AlessandroBusà_AdvancedAnalytics.py model-search --folds 5      # Confronta gli iperparametri per accuratezza e latenza
+#   python AlessandroBusà_AdvancedAnalytics.py inference-benchmark         # Latenza di scikit-learn e della foresta compilata
+#   python AlessandroBusà_AdvancedAnalytics.py validate --dataset sales    # Controlla le regole sui dati e mette in quarantena le righe non valide
+#   python AlessandroBusà_AdvancedAnalytics.py sales --validate            # Report delle vendite sulle sole righe valide
+#   python AlessandroBusà_AdvancedAnalytics.py sales --aggregate-processes 0 --partition-by Branch  # Cubo delle vendite calcolato su tutti i core
+#   python AlessandroBusà_AdvancedAnalytics.py sales --sales-dataset vendite/ --city Yangon --month 2019-01  # Apre solo i file di Yangon di gennaio
+#   python AlessandroBusà_AdvancedAnalytics.py timeseries --freq week --by City --rolling 4  # Vendite settimanali per città, media mobile su 4 settimane
+#   python AlessandroBusà_AdvancedAnalytics.py forecast --freq day --horizon 7               # Previsioni per città x categoria di prodotto
+#   python AlessandroBusà_AdvancedAnalytics.py sketches --by City Gender --chunksize 250000   # Mediana e p95 dello scontrino, voti e fatture distinte
+#   python AlessandroBusà_AdvancedAnalytics.py query --by Payment City --measure "gross income" --where Month=2019-03  # Interrogazione ad hoc dal cubo
+#   python AlessandroBusà_AdvancedAnalytics.py serve --port 8765          # Report come JSON e PNG su http://127.0.0.1:8765/
+#   python AlessandroBusà_AdvancedAnalytics.py all --instrument detailed --profile-stage train --trace traccia.json  # Dove va il tempo
+#   python AlessandroBusà_AdvancedAnalytics.py benchmark --rows 10000 1000000 --compare benchmarks/results/base.json  # Tempo e memoria di ogni stadio
+#   python AlessandroBusà_AdvancedAnalytics.py sales --help                # Elenco completo delle opzioni
+
+# Import delle librerie leggere; scikit-learn (e, per i grafici, seaborn e matplotlib) viene importato solo dalle sezioni che lo usano
+import argparse                                                                         # Per l'interfaccia a riga di comando con i sottocomandi
+import sys                                                                              # Per leggere gli argomenti della riga di comando
 import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
-import matplotlib.pyplot as plt                                                         # Matplotlib per la creazione di grafici
-import seaborn as sns                                                                   # Seaborn per la visualizzazione avanzata dei dati
-from matplotlib.ticker import FuncFormatter                                             # FuncFormatter per formattare gli assi dei grafici
+from column_cache import file_fingerprint                                               # Hash del contenuto dei CSV, per le chiavi degli stadi di caricamento
+from loaders import (APPLE_CSV_ENV, CACHE_DIR_ENV, DEFAULT_APPLE_CSV, DEFAULT_CACHE_DIR,  # Caricamento dei CSV con lo schema dichiarato (categorie, float32/int32, date)
+                     DEFAULT_SALES_CSV, SALES_CSV_ENV, load_apple_data, load_sales_data, resolve_path)
+from apple_model import DEFAULT_PARAMS, DEFAULT_SPLIT                                   # Iperparametri e divisione del modello salvato, gli stessi nel report
+from incremental_cube import state_fingerprint, update_cube                             # Aggiornamento incrementale del cubo con i nuovi lotti di fatture
+from charts import CHART_FORMATS, render_charts, show_chart                             # Grafici descritti come job: seaborn e matplotlib vengono importati solo al momento del disegno
+from report_format import REPORT_FORMATS, write_section                                 # Formattazione vettorizzata delle sezioni del report (testo, CSV o Markdown)
+from sales_cube import build_sales_cube, build_sales_cube_streaming, rollup             # Cubo di aggregazione per derivare tutti i raggruppamenti da una sola scansione
+from parallel_aggregate import PARTITION_MODES, build_sales_cube_parallel               # Lo stesso cubo calcolato a partizioni in un pool di processi
+from sales_dataset import dataset_fingerprint, dataset_name, dataset_selection, read_sales_dataset  # Vendite su più file, con manifest e lettura dei soli file utili
+from pipeline import DEFAULT_MAX_BYTES, default_stage_cache_dir, run_pipeline          # Stadi con nome e risultati intermedi memorizzati su disco
+from validation import DATASET_RULES, SALES_RULES, quarantine_path, validate, validate_csv, write_quarantine  # Regole dichiarative di qualità dei dati
+from streaming_metrics import classification_report, confusion_frame, new_metrics, update  # Metriche di classificazione aggiornate a lotti e unibili
+from instrumentation import MODES, new_tracer, print_summary, span, write_trace         # Tempo, CPU, righe e memoria di ogni stadio e sezione
+from query import AGGREGATIONS, QUERY_DIMENSIONS, QUERY_MEASURES, build_query_cube      # Interrogazioni ad hoc sul cubo con tutte le dimensioni e misure
 
-def thousand_separator_for_plot(x, pos):                                                # Funzione per formattare i numeri per gli assi dei grafici
+def thousand_separator(x):                                                              # Funzione per formattare i numeri per l'output
     """
-    Formatta un numero per l'asse di un grafico con il punto come separatore delle migliaia.
+    Formatta un numero con il punto come separatore delle migliaia per l'output.
 
     Args:
         x: Il numero da formattare.
-        pos (int): La posizione dell'etichetta sull'asse (richiesta da matplotlib, ma non usata direttamente).
 
     Returns:
         str: Il numero formattato con il punto come separatore delle migliaia.
     """
-    return f'{int(x):,}'.replace(',', '.')                                              # Formatta il numero con il punto come separatore delle migliaia per i grafici.
+    return f'{int(x):,}'.replace(',', '.')                                              # Formatta il numero con il punto come separatore delle migliaia per l'output.
 
-def thousand_separator(x):                                                              # Funzione per formattare i numeri per l'output
+#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+SECTION_STAGES = {'sales': 'aggregate', 'apple-quality': 'evaluate', 'trend': 'forecast'}  # Stadio da cui dipende ogni sezione, nell'ordine in cui vengono eseguite da 'all'
+BENCHMARK_ROLLUPS = [['City'], ['Customer type'], ['City', 'Customer type'], ['Product line'], ['Gender'],  # Raggruppamenti del report misurati dal benchmark
+                     ['Product line', 'Gender'], ['City', 'Gender', 'Product line'], ['Month']]
+MIN_FORECAST_MONTHS = 2                                                                 # Mesi minimi per la regressione del trend: almeno uno nel training e uno nel test set
+
+def show_or_queue(options, chart_jobs, job):                                            # Funzione per mostrare un grafico oppure accodarlo per il salvataggio su file
     """
-    Formatta un numero con il punto come separatore delle migliaia per l'output.
+    Mostra subito un grafico a video oppure, se è impostata la cartella dei grafici, lo accoda per il rendering su file.
+
+    Con l'opzione '--no-plots' il grafico viene ignorato: seaborn e matplotlib non vengono nemmeno importati.
 
     Args:
-        x: Il numero da formattare.
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        chart_jobs (list): I grafici da salvare su file alla fine dell'analisi.
+        job (dict): La descrizione del grafico (vedi 'charts.py').
 
     Returns:
-        str: Il numero formattato con il punto come separatore delle migliaia.
+        None
     """
-    return f'{int(x):,}'.replace(',', '.')                                              # Formatta il numero con il punto come separatore delle migliaia per l'output.
+    if options.no_plots:
+        return
+    if options.chart_dir:
+        chart_jobs.append(job)                                                          # Verrà salvato alla fine, insieme agli altri, da un pool di processi.
+    else:
+        show_chart(job)                                                                 # Modalità interattiva: mostra il grafico e attende la chiusura della finestra.
+
+#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-def etichetta():                                                                        # Funzione per formattare l'etichetta dei grafici a barre
+# Stadi della pipeline: solo calcoli, senza stampe né grafici, così i risultati possono essere memorizzati su disco (vedi 'pipeline.py')
+
+def clean_apple_data(apple_data, test_size, random_state):
     """
-    Aggiunge etichette su ciascuna barra di un grafico a barre.
-    Itera su tutte le barre del grafico, aggiungendo un'etichetta sopra ogni barra,
-    con il valore della larghezza della barra formattato con il punto come separatore delle migliaia.
+    Stadio 'clean': separa le caratteristiche delle mele dalla qualità e divide il dataset in training set e test set.
 
-    Modifica lo stile del testo per l'etichetta, posizionandola al centro della barra orizzontalmente e verticalmente.
+    Le caratteristiche sono quelle dello schema del modello salvato ('APPLE_FEATURES', senza 'A_id'), nello stesso
+    formato e con la stessa divisione di 'apple_model.train_model': il test set è quello su cui il modello è stato misurato.
 
     Args:
-        None
+        apple_data (pd.DataFrame): Il DataFrame delle mele caricato da 'load_apple_data'.
+        test_size (float): La quota di righe destinata al test set.
+        random_state (int): Il seme che rende la divisione riproducibile.
 
     Returns:
-        None
+        dict: 'X_train', 'X_test' (matrici float32) e 'y_train', 'y_test' (array di etichette).
     """
-    for p in ax.patches:
-        ax.annotate(f'{p.get_width():,.0f}'.replace(',', '.'),                          # Utilizza 'annotate' per aggiungere un'etichetta sopra ogni barra.
-                                      (p.get_width(), p.get_y() + p.get_height() / 2),  # Posizione dell'etichetta sulla barra, al centro verticale.
-                                      ha='center', va='center',                         # Allineamento orizzontale e verticale al centro.
-                                      color='black', fontsize=10, fontweight='bold')    # Stile del testo dell'etichetta.
-   
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    from sklearn.model_selection import train_test_split                                # Funzione per suddividere il dataset in training set e test set
+    from apple_model import records_to_array                                            # Le stesse caratteristiche del modello salvato
 
-# Caricamento File.csv
-sales_data = pd.read_csv(r'C:\Users\alessandro\Desktop\file famiglia\Alessandro\Corso Start2Impact\08 - Advanced Analytics\supermarket_sales - Copia.csv')  #Caricamento primo file csv
-apple_data = pd.read_csv(r'C:\Users\alessandro\Desktop\file famiglia\Alessandro\Corso Start2Impact\08 - Advanced Analytics\apple_quality.csv')              #Caricamento secondo file csv
+    # Operazioni sulle mele (i valori non numerici di 'Acidity' e le righe incomplete sono già gestiti da 'load_apple_data')
+    X = records_to_array(apple_data)                                                            # Crea la matrice X con le sole caratteristiche dello schema, senza l'identificativo 'A_id', che non è una caratteristica predittiva
+    y = apple_data['Quality'].to_numpy(dtype=str)                                               # Crea il vettore y che contiene solo la colonna 'Quality', che è la nostra variabile target da prevedere
 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state) # Utilizza 'train_test_split' per dividere X e y in un training set e un test set, 'test_size=0.3' significa che il 30% dei dati sarà usato per il test e il 70% per l'addestramento, 'random_state=42' assicura che la divisione sia riproducibile.
+    return {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}
 
-city_customer_sales = sales_data.groupby(['City', 'Customer type'])['Total'].sum().reset_index() # Raggruppa il DataFrame sales_data in base alle colonne 'City' e 'Customer type', calcola la somma totale delle vendite nella colonna 'Total e poi resetta l'indice per ottenere un DataFrame ben formattato.
-customer_sales_total = sales_data.groupby('Customer type')['Total'].sum().reset_index()          # Raggruppa il DataFrame sales_data in base alla colonna 'Customer type', calcola la somma totale delle vendite nella colonna 'Total e poi resetta l'indice per ottenere un DataFrame ben formattato.
-city_total_sales = sales_data.groupby('City')['Total'].sum().reset_index()                       # Raggruppa il DataFrame sales_data in base alla colonna 'City', calcola la somma totale delle vendite nella colonna 'Total e poi resetta l'indice per ottenere un DataFrame ben formattato.
-
-# Stampa delle vendite per città e tipo di cliente
-print("Vendite per città e tipo di cliente:")
-for index, row in city_customer_sales.iterrows():                                                   # Itera su ogni riga del DataFrame 'city_customer_sales' utilizzando iterrows().
-    print(f"{row['City']} ({row['Customer type']}): {thousand_separator(round(row['Total'], 0))}")  # Stampa il nome della città, il tipo di cliente (Member o Normal)e il totale delle vendite formattato con separatore delle migliaia.
-
-# Visualizzazione delle vendite per città e tipo di cliente
-plt.figure(figsize=(10, 6))                                                                             # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-ax = sns.barplot(data=city_customer_sales, x='Total', y='City', hue='Customer type', palette='muted')   # Crea un grafico a barre utilizzando Seaborn, con le vendite totali per città e colorato per tipo di cliente.
-plt.title('Vendite per Tipo di Cliente e Città')                                                        # Imposta il titolo del grafico.
-plt.xlabel('Vendite Totali')                                                                            # Etichetta l'asse X come 'Vendite Totali'.
-plt.ylabel('Città')                                                                                     # Etichetta l'asse Y come 'Città'.
-etichetta()                                                                                             # Funzione richiamata per formattare l'etichetta dei grafici a barre
-
-# Formattazione dell'asse X
-ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))                        # Questo formatter personalizza i valori sull'asse X, utilizzando la funzione 'thousand_separator_for_plot' per formattare i numeri con un separatore delle migliaia (es. 1.000, 2.000, ecc.).
-plt.legend(title='Customer type', bbox_to_anchor=(1, 1), loc='upper left', borderaxespad=0.)    # 'plt.legend()' crea una legenda per il grafico -'title' imposta il titolo della legenda come "Customer type", 'bbox_to_anchor' specifica la posizione della legenda nel grafico,'loc' specifica la posizione relativa della legenda, impostata su 'upper left' per posizionarla nell'angolo in alto a sinistra della casella di ancoraggio e 'borderaxespad' determina la distanza tra la legenda e l'asse del grafico; impostato a 0 per attaccare la legenda direttamente all'asse.
-plt.show()                                                                                      # Mostra il grafico finale
-
-# Storytelling delle vendite per città e tipo di cliente
-print("\n VENDITE PER CITTA' E TIPO DI CLIENTE \n"
-      "Mandalay (Member): 162.487.983\n"
-      "Mandalay (Normal): 129.422.223\n"
-      "Mandalay mostra un totale di vendite di 162.487.983 per i membri, "
-      "che è significativamente più alto rispetto alle vendite per i clienti normali, pari a 129.422.223. "
-      "Questo suggerisce che i clienti membri contribuiscono in modo più sostanziale alle vendite totali in questa città, "
-      "il che potrebbe indicare l'efficacia di programmi di fidelizzazione o offerte specifiche per i membri.\n"
-      "Naypyitaw (Member): 182.687.148\n"
-      "Naypyitaw (Normal): 120.989.946\n"
-      "Anche a Naypyitaw, le vendite per i membri (182.687.148) superano quelle per i normali clienti (120.989.946). "
-      "Il divario tra le vendite dei membri e quelle dei normali clienti è evidente e potrebbe suggerire "
-      "che le strategie di marketing e vendita siano particolarmente efficaci per attrarre membri in questa città.\n"
-      "Yangon (Member): 121.135.140\n"
-      "Yangon (Normal): 160.343.925\n"
-      "A Yangon, la situazione è diversa. Le vendite per i clienti normali (160.343.925) superano quelle per i membri (121.135.140). "
-      "Questo potrebbe indicare una base di clienti normali più forte o un interesse minore "
-      "nei programmi di membership.\n\n")
-
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+def train_apple_model(split, n_estimators, random_state, n_jobs):
+    """
+    Addestra il classificatore Random Forest sul training set (usato dal benchmark per misurare l'addestramento).
 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    Args:
+        split (dict): Il risultato dello stadio 'clean'.
+        n_estimators (int): Il numero di alberi della foresta.
+        random_state (int): Il seme che rende l'addestramento riproducibile.
+        n_jobs (int): Il numero di core usati per addestrare gli alberi (-1 = tutti; il risultato non cambia).
 
-# Stampa delle vendite totali per tipo di cliente
-print("\nVendite totali per tipo di cliente:")
-for index, row in customer_sales_total.iterrows():                                       # Itera su ogni riga del DataFrame 'customer_sales_total' utilizzando iterrows().
-    print(f"{row['Customer type']}: {thousand_separator(round(row['Total'], 0))}")       # Stampa il tipo di cliente (Member o Normal) e il totale delle vendite formattato con separatore delle migliaia.
-
-# Visualizzazione delle vendite totali per tipo di cliente
-plt.figure(figsize=(8, 5))                                      # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-# Crea un grafico a barre utilizzando Seaborn
-ax = sns.barplot(data=customer_sales_total, 
-                                       x='Total',               # 'data' è il DataFrame che contiene i dati da visualizzare.
-                                       y='Customer type',       # 'y' rappresenta la colonna 'Customer type' per la tipologia di cliente sull'asse Y.
-                                       hue='Customer type',     # Imposta hue per la legenda.
-                                       palette='muted',         # 'palette' specifica il tema di colori da usare per le barre.
-                                       legend=False)            # Disabilita la legenda predefinita.
-
-plt.title('Vendite Totali per Tipo di Cliente')                 # Imposta il titolo del grafico.
-plt.xlabel('Vendite Totali')                                    # Etichetta l'asse X come 'Vendite Totali'.
-plt.ylabel('Tipo di Cliente')                                   # Etichetta l'asse Y come 'Tipo di Cliente'.
-etichetta()                                                     # Funzione richiamata per formattare l'etichetta dei grafici a barre
-ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))  # Personalizza i valori sull'asse X con il separatore delle migliaia.
-plt.show()                                                      # Mostra il grafico.
-
-# Storytelling delle vendite per tipo di cliente
-print("\nVENDITE TOTALI PER TIPO DI CLIENTE \n"
-      "Member: 466.310.271\n"
-      "Normal: 410.756.094\n"
-      "Le vendite totali per tipo di cliente mostrano che i membri contribuiscono significativamente di più alle vendite complessive, "
-      "con un totale di 466.310.271 contro 410.756.094 dei clienti normali. Questo è un dato "
-      "positivo, in quanto suggerisce che l'implementazione di strategie di fidelizzazione ha portato a vendite maggiori. "
-      "Tuttavia, è importante anche considerare la proporzione di clienti normali e trovare modi per "
-      "convertirli in membri.\n")
-
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+    Returns:
+        RandomForestClassifier: Il modello addestrato.
+    """
+    from sklearn.ensemble import RandomForestClassifier                                 # Classificatore Random Forest per problemi di classificazione
 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    rf = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)  # Crea un'istanza del modello RandomForestClassifier con il numero di alberi e il seme indicati.
+    rf.fit(split['X_train'], split['y_train'])                                              # Allena il modello utilizzando il training set.
+    return rf
+
+def load_apple_model(data_path, params, split):
+    """
+    Stadio 'train': il classificatore salvato da 'apple_model.py', riaddestrato solo se dati o iperparametri sono cambiati.
 
-# Stampa delle vendite totali per città
-print("\nTotale vendite per città:")
-for index, row in city_total_sales.iterrows():                             # Itera su ogni riga del DataFrame 'city_total_sales' utilizzando iterrows().
-    print(f"{row['City']}: {thousand_separator(round(row['Total'], 0))}")  # Stampa il nome della città e il totale delle vendite formattato con separatore delle migliaia.
-
-plt.figure(figsize=(10, 6))                             # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-# Crea un grafico a barre utilizzando Seaborn
-ax = sns.barplot(data=city_total_sales,                 # 'data' è il DataFrame che contiene i dati da visualizzare.
-                                    x='Total',          # 'x' rappresenta la colonna 'Total' per le vendite totali sull'asse X.
-                                    y='City',           # 'y' rappresenta la colonna 'City' per le città sull'asse Y.
-                                    hue='City',         # Imposta hue per la legenda.
-                                    palette='muted',    # 'palette' specifica il tema di colori da usare per le barre. 
-                                    legend=False)       # Disabilita la legenda predefinita.
-
-plt.title('Vendite Totali per Città')   # Imposta il titolo del grafico. Questo appare in cima al grafico e fornisce un contesto al lettore.
-plt.xlabel('Vendite Totali')            # Etichetta l'asse X con la descrizione 'Vendite Totali'. Questo aiuta a capire cosa rappresentano i valori sull'asse orizzontale.
-plt.ylabel('Città')                     # Etichetta l'asse Y con la descrizione 'Città'. Questo aiuta a capire quale categoria è rappresentata sull'asse verticale.
-etichetta()                             # Funzione richiamata per formattare l'etichetta dei grafici a barre
-ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))  # Formatta l'asse X per mostrare i valori con un separatore delle migliaia
-plt.show()                              # Visualizza il grafico
-
-# Storytelling delle vendite per città
-print("TOTALE VENDITE PER CITTA' \n"
-      "Mandalay: 291.910.206\n"
-      "Naypyitaw: 303.677.094\n"
-      "Yangon: 281.479.065\n"
-      "In termini di vendite totali per città, Naypyitaw ha il valore più alto con 303.677.094, seguita da Mandalay (291.910.206) "
-      "e Yangon (281.479.065). Questo potrebbe indicare che Naypyitaw sta performando meglio nel "
-      "complesso, il che potrebbe essere dovuto a fattori come una migliore strategia di marketing, "
-      "una maggiore popolazione di clienti o una combinazione di fattori favorevoli.\n")
-
-print("-" * 40)                                # Stampa una linea orizzontale di 40 caratteri 
+    Il report usa così lo stesso modello del sottocomando 'predict'.
+
+    Args:
+        data_path (str): Il CSV delle mele.
+        params (dict): Gli iperparametri del classificatore.
+        split (dict): 'test_size' e 'random_state' della divisione training/test (gli stessi dello stadio 'clean').
+
+    Returns:
+        RandomForestClassifier: Il modello.
+    """
+    from apple_model import load_or_train                                               # Modello salvato, riaddestrato solo quando serve (importa scikit-learn)
+
+    bundle, retrained = load_or_train(data_path, params=params, split=split)
+    return bundle['model']
+
+def evaluate_apple_model(rf, split, batch_size=100_000):
+    """
+    Stadio 'evaluate': valuta il classificatore sul test set, a lotti di previsioni.
+
+    Args:
+        rf (RandomForestClassifier): Il risultato dello stadio 'train'.
+        split (dict): Il risultato dello stadio 'clean'.
+        batch_size (int): Il numero di record previsti e accumulati nelle metriche per ogni lotto.
+
+    Returns:
+        dict: il report di classificazione ('report'), la matrice di confusione ('confusion_matrix') e lo stato
+            delle metriche incrementali ('metrics', vedi 'streaming_metrics.py').
+    """
+    metrics = new_metrics()
+    for start in range(0, len(split['X_test']), batch_size):
+        y_pred = rf.predict(split['X_test'][start:start + batch_size])                      # Utilizza il modello addestrato per fare previsioni su un lotto del test set.
+        update(metrics, split['y_test'][start:start + batch_size], y_pred)                  # Aggiorna la matrice di confusione: le previsioni del lotto non servono più.
+    report = classification_report(metrics)                                                 # Precisione, richiamo e punteggio F1 per ciascuna classe.
+    return {'report': report, 'confusion_matrix': metrics['matrix'], 'metrics': metrics}    # La matrice di confusione confronta le etichette reali (righe) con quelle previste (colonne): vere negative, false positive, false negative e vere positive.
+
+def forecast_monthly_sales(sales_cube, test_size, random_state):
+    """
+    Stadio 'forecast': regressione lineare sulle vendite mensili derivate dal cubo.
+
+    Args:
+        sales_cube (pd.DataFrame): Il risultato dello stadio 'aggregate'.
+        test_size (float): La quota di mesi destinata al test set.
+        random_state (int): Il seme che rende la divisione riproducibile.
+
+    Returns:
+        dict: le vendite mensili ('monthly_sales') e l'errore quadratico medio sul test set ('mse'), None se i mesi
+            sono meno di 'MIN_FORECAST_MONTHS' (es. dopo che '--validate' ha scartato quasi tutte le righe).
+    """
+    from sklearn.model_selection import train_test_split                                # Funzione per suddividere il dataset in training set e test set
+    from sklearn.linear_model import LinearRegression                                   # Modello di regressione lineare per problemi di regressione
+    from sklearn.metrics import mean_squared_error                                      # Errore quadratico medio per valutare il modello di regressione
+
+    # Raggruppiamo i dati per mese e sommiamo i profitti (la colonna 'Month' è già una dimensione del cubo)
+    monthly_sales = rollup(sales_cube, 'Month')                                                               # Deriva dal cubo le vendite totali ('Total') per ciascun mese, con l'indice ripristinato.
+
+    # Trasformiamo la colonna Month in numerica per la regressione
+    monthly_sales['Month_numeric'] = monthly_sales['Month'].astype(str).str.replace('-', '').astype(int)      # Converte i periodi mensili dalla forma 'YYYY-MM' (stringa) a un formato numerico intero e sostituisce il trattino '-' con una stringa vuota e poi converte il risultato in un numero intero. Questo passaggio è utile per l'analisi di regressione, poiché la variabile indipendente deve essere numerica.
+
+    if len(monthly_sales) < MIN_FORECAST_MONTHS:
+        return {'monthly_sales': monthly_sales, 'mse': None}                            # Nessun test set possibile: la regressione viene saltata.
+
+    # Creiamo il modello di regressione
+    X = monthly_sales[['Month_numeric']]                                                                      # Seleziona la colonna 'Month_numeric' come feature (variabile indipendente) per il modello di regressione.
+    y = monthly_sales['Total']                                                                                # Seleziona la colonna 'Total' come target (variabile dipendente) che vogliamo prevedere.
+
+    # Dividiamo il dataset per il training e il test set
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state) # Utilizza la funzione 'train_test_split' per dividere i dati in due set: uno per l'addestramento (80%) e uno per il test (20%).'random_state=42' assicura che la divisione sia riproducibile, fornendo sempre lo stesso set di dati per il training e il test.
+
+    # Inizializziamo il modello di regressione lineare
+    reg = LinearRegression()                                                                                  # Crea un'istanza del modello di regressione lineare.
+    reg.fit(X_train, y_train)                                                                                 # Addestra il modello sui dati di addestramento, apprendendo la relazione tra 'Month_numeric' e 'Total'.
+
+    # Facciamo previsioni sui dati di test
+    y_pred = reg.predict(X_test)                                                                              # Utilizza il modello di regressione addestrato (reg) per fare previsioni sui dati di test (X_test), producendo i valori previsti di vendita ('y_pred') per ciascun mese nel test set.
+
+    # Calcolo dell'errore quadratico medio per valutare la precisione del modello di regressione
+    mse = mean_squared_error(y_test, y_pred)                                                                  # Calcola l'errore quadratico medio (MSE), una metrica che misura quanto le previsioni differiscono dai valori reali. Confronta le previsioni 'y_pred' con i dati reali 'y_test'. Più basso è il valore, migliore è la precisione del modello.
+    return {'monthly_sales': monthly_sales, 'mse': mse}
+
+def update_sales_cube(state_dir, path):
+    """
+    Stadio 'aggregate' in modalità incrementale: ripiega nel cubo salvato le sole fatture non ancora contate.
+
+    Args:
+        state_dir (str): La cartella di stato del cubo incrementale.
+        path (str): Il percorso del CSV delle vendite.
+
+    Returns:
+        pd.DataFrame: Il cubo aggiornato.
+    """
+    sales_cube, new_rows = update_cube(state_dir, [path])                               # Lo stato vive nella sua cartella: il risultato non va memorizzato di nuovo.
+    return sales_cube
+
+def validate_sales_data(sales_data):
+    """
+    Stadio 'validate_sales': applica le regole di qualità alle vendite e separa le righe non valide.
+
+    Args:
+        sales_data (pd.DataFrame): Il risultato dello stadio 'load_sales'.
+
+    Returns:
+        dict: Le righe valide ('valid'), quelle in quarantena ('quarantine') e le violazioni per regola ('violations').
+    """
+    valid, quarantine, violations = validate(sales_data, SALES_RULES)
+    return {'valid': valid.reset_index(drop=True), 'quarantine': quarantine, 'violations': violations}
+
+def build_validated_sales_cube(validation, processes=None, partition_by='rows'):
+    """
+    Stadio 'aggregate' con la validazione attiva: il cubo delle vendite costruito sulle sole righe valide.
+
+    Args:
+        validation (dict): Il risultato dello stadio 'validate_sales'.
+        processes (int | None): Se indicato, il cubo viene calcolato in parallelo con questo numero di processi
+            (0 = uno per core); None = groupby seriale.
+        partition_by (str): Il partizionamento delle righe tra i processi ('rows', 'Branch' o 'City').
+
+    Returns:
+        pd.DataFrame: Il cubo delle vendite.
+    """
+    if processes is not None:
+        return build_sales_cube_parallel(validation['valid'], partition_by=partition_by, processes=processes or None)
+    return build_sales_cube(validation['valid'])
+
+def build_validated_query_cube(validation):
+    """
+    Stadio 'query_cube' con la validazione attiva: il cubo delle interrogazioni costruito sulle sole righe valide.
+
+    Args:
+        validation (dict): Il risultato dello stadio 'validate_sales'.
+
+    Returns:
+        pd.DataFrame: Il cubo delle interrogazioni.
+    """
+    return build_query_cube(validation['valid'])
+
+def build_stages(options):
+    """
+    Dichiara gli stadi del report: caricamento, pulizia, aggregazione, addestramento, valutazione e previsione.
+
+    Il rendering dei grafici non è uno stadio della pipeline: 'render_charts' salta già i grafici i cui dati e
+    il cui stile non sono cambiati.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando (file, modalità streaming o incrementale).
+
+    Returns:
+        dict: Gli stadi per 'run_pipeline', per nome.
+    """
+    cache_dir = resolve_path(None, CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    sales_csv = resolve_path(options.sales_csv, SALES_CSV_ENV, DEFAULT_SALES_CSV)
+    apple_csv = resolve_path(options.apple_csv, APPLE_CSV_ENV, DEFAULT_APPLE_CSV)
+    sales_key = lambda: file_fingerprint(sales_csv, cache_dir)                          # Il contenuto del CSV, non il suo percorso, decide se ricalcolare.
+    apple_key = lambda: file_fingerprint(apple_csv, cache_dir)
+
+    if options.sales_dataset:
+        filters = {'city': options.city, 'branch': options.branch, 'month': options.month}
+        load_sales = {'run': read_sales_dataset, 'params': {'source': options.sales_dataset, **filters},  # Solo i file che possono rispettare i filtri.
+                      'key': lambda: dataset_fingerprint(options.sales_dataset, **filters)}
+    else:
+        load_sales = {'run': load_sales_data, 'params': {'path': sales_csv}, 'key': sales_key, 'persist': False}  # Già nella cache colonnare di 'loaders.py'.
+
+    if options.state_dir:
+        aggregate = {'run': update_sales_cube, 'params': {'state_dir': options.state_dir, 'path': sales_csv}, 'persist': False,
+                     'key': lambda: state_fingerprint(options.state_dir, [sales_csv])}  # CSV cresciuto o stato aggiornato, senza rileggere il CSV.
+    elif options.chunksize:
+        aggregate = {'run': build_sales_cube_streaming, 'params': {'path': sales_csv, 'chunksize': options.chunksize}, 'key': sales_key}
+    elif options.validate:
+        aggregate = {'run': build_validated_sales_cube, 'inputs': ['validate_sales'],   # Le righe che violano le regole restano fuori da ogni cifra del report.
+                     'params': {'processes': options.aggregate_processes, 'partition_by': options.partition_by}}
+    elif options.aggregate_processes is not None:
+        aggregate = {'run': build_sales_cube_parallel, 'inputs': ['load_sales'],         # Stesso cubo, con i parziali calcolati da un pool di processi.
+                     'params': {'partition_by': options.partition_by, 'processes': options.aggregate_processes or None}}
+    else:
+        aggregate = {'run': build_sales_cube, 'inputs': ['load_sales']}               # Tutti i raggruppamenti del report vengono derivati da questa piccola tabella.
+
+    return {
+        'validate_sales': {'run': validate_sales_data, 'inputs': ['load_sales']},
+        'load_sales': load_sales,
+        'load_apple': {'run': load_apple_data, 'params': {'path': apple_csv}, 'key': apple_key, 'persist': False},
+        'clean': {'run': clean_apple_data, 'inputs': ['load_apple'], 'params': DEFAULT_SPLIT},
+        'aggregate': aggregate,
+        'query_cube': ({'run': build_validated_query_cube, 'inputs': ['validate_sales']} if options.validate  # Il cubo delle interrogazioni resta su disco tra le esecuzioni.
+                       else {'run': build_query_cube, 'inputs': ['load_sales']}),
+        'train': {'run': load_apple_model, 'params': {'data_path': apple_csv, 'params': DEFAULT_PARAMS, 'split': DEFAULT_SPLIT},  # Lo stesso modello di 'predict'.
+                  'key': apple_key, 'persist': False},                                  # Il modello è già salvato su disco da 'apple_model.py'.
+        'evaluate': {'run': evaluate_apple_model, 'inputs': ['train', 'clean'], 'rows': lambda rf, split: len(split['X_test'])},
+        'forecast': {'run': forecast_monthly_sales, 'inputs': ['aggregate'], 'params': {'test_size': 0.2, 'random_state': 42}},
+    }
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Analisi delle vendite per categoria di prodotto
-product_sales = sales_data.groupby('Product line')['Total'].sum().reset_index().sort_values(by='Total', ascending=False) # Raggruppa i dati per la categoria di prodotto ('Product line') e somma le vendite totali ('Total') per ogni categoria, 'reset_index()' riporta il risultato in un DataFrame e 'sort_values(by='Total', ascending=False)' ordina le categorie in ordine decrescente di vendite.
-print("\nVendite per categoria di prodotto:")                                                                            # Stampa un'intestazione per le vendite per categoria di prodotto.
-for index, row in product_sales.iterrows():                                                                              # Itera su ogni riga del DataFrame 'product_sales'.                                                                           
-    print(f"{row['Product line']}: {thousand_separator(round(row['Total'], 0))}")                                        # Per ogni categoria di prodotto, stampa il nome della categoria e il totale delle vendite formattato, 'thousand_separator(row['Total'])' applica la formattazione numerica definita per separare le migliaia e arrotonda al numero intero più vicino.
-
-# Visualizza le vendite per categoria di prodotto tramite grafico
-plt.figure(figsize=(10, 6))                                                                                                           # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-ax = sns.barplot(data=product_sales, x='Total', y='Product line', palette='pastel', hue='Product line', dodge=False, legend=False)    # Crea un grafico a barre con le vendite totali per ciascuna categoria di prodotto - 'data=product_sales' specifica il DataFrame da utilizzare. 'x' è impostato su 'Total' per le vendite totali e 'y' su 'Product line' per le categorie di prodotto, 'palette' specifica i colori per le barre e 'hue' permette di colorare le barre in base alla categoria,  'dodge=False' indica che le barre non devono essere divise e 'legend=False' disabilita la legenda.
-plt.title('Vendite Totali per Categoria di Prodotto')                                                                                 # Imposta il titolo del grafico.
-plt.xlabel('Vendite Totali')                                                                                                          # Etichetta l'asse X come 'Vendite Totali'.
-plt.ylabel('Categoria di Prodotto')                                                                                                   # Etichetta l'asse Y come 'Categoria di Prodotto'.
-etichetta()                                                                                                                           # Funzione richiamata per formattare l'etichetta dei grafici a barre
-# Formattazione dell'asse X
-ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))    # Utilizza il formatter personalizzato per l'asse X, che applica il formato numerico definito in 'thousand_separator_for_plot'
-plt.show()                        # Mostra il grafico finale.
-
-# Storytelling delle vendite per categoria di prodotto
-print("""
+def run_sales(options, sales_cube, chart_jobs):
+    """
+    Sezione delle vendite: totali per città, tipo di cliente, categoria di prodotto e genere, con i relativi grafici.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        sales_cube (pd.DataFrame): Il cubo di aggregazione delle vendite.
+        chart_jobs (list): I grafici da salvare su file alla fine dell'analisi.
+
+    Returns:
+        None
+    """
+    city_customer_sales = rollup(sales_cube, ['City', 'Customer type'])                                  # Deriva dal cubo le vendite totali per 'City' e 'Customer type', nello stesso formato di un groupby con l'indice resettato.
+    customer_sales_total = rollup(sales_cube, 'Customer type')                                           # Deriva dal cubo le vendite totali per 'Customer type', senza scansionare di nuovo 'sales_data'.
+    city_total_sales = rollup(sales_cube, 'City')                                                            # Deriva dal cubo le vendite totali per 'City', senza scansionare di nuovo 'sales_data'.
+
+    # Stampa delle vendite per città e tipo di cliente
+    write_section("Vendite per città e tipo di cliente:", city_customer_sales, ['City', 'Customer type'], fmt=options.format) # Scrive in un colpo solo le vendite per città e tipo di cliente (Member o Normal), formattate con separatore delle migliaia.
+
+    # Visualizzazione delle vendite per città e tipo di cliente
+    show_or_queue(options, chart_jobs, {'name': 'vendite_citta_tipo_cliente', 'kind': 'barh', 'data': city_customer_sales,     # Grafico a barre delle vendite totali per città, colorato per tipo di cliente.
+                                        'x': 'Total', 'y': 'City', 'hue': 'Customer type', 'palette': 'muted', 'figsize': (10, 6),
+                                        'title': 'Vendite per Tipo di Cliente e Città', 'xlabel': 'Vendite Totali', 'ylabel': 'Città',
+                                        'legend': {'title': 'Customer type', 'bbox_to_anchor': (1, 1), 'loc': 'upper left', 'borderaxespad': 0.}})  # Legenda attaccata all'angolo in alto a destra del grafico.
+
+    # Storytelling delle vendite per città e tipo di cliente
+    print("\n VENDITE PER CITTA' E TIPO DI CLIENTE \n"
+          "Mandalay (Member): 162.487.983\n"
+          "Mandalay (Normal): 129.422.223\n"
+          "Mandalay mostra un totale di vendite di 162.487.983 per i membri, "
+          "che è significativamente più alto rispetto alle vendite per i clienti normali, pari a 129.422.223. "
+          "Questo suggerisce che i clienti membri contribuiscono in modo più sostanziale alle vendite totali in questa città, "
+          "il che potrebbe indicare l'efficacia di programmi di fidelizzazione o offerte specifiche per i membri.\n"
+          "Naypyitaw (Member): 182.687.148\n"
+          "Naypyitaw (Normal): 120.989.946\n"
+          "Anche a Naypyitaw, le vendite per i membri (182.687.148) superano quelle per i normali clienti (120.989.946). "
+          "Il divario tra le vendite dei membri e quelle dei normali clienti è evidente e potrebbe suggerire "
+          "che le strategie di marketing e vendita siano particolarmente efficaci per attrarre membri in questa città.\n"
+          "Yangon (Member): 121.135.140\n"
+          "Yangon (Normal): 160.343.925\n"
+          "A Yangon, la situazione è diversa. Le vendite per i clienti normali (160.343.925) superano quelle per i membri (121.135.140). "
+          "Questo potrebbe indicare una base di clienti normali più forte o un interesse minore "
+          "nei programmi di membership.\n\n")
+
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    # Stampa delle vendite totali per tipo di cliente
+    write_section("\nVendite totali per tipo di cliente:", customer_sales_total, 'Customer type', fmt=options.format) # Scrive in un colpo solo le vendite totali per tipo di cliente (Member o Normal), formattate con separatore delle migliaia.
+
+    # Visualizzazione delle vendite totali per tipo di cliente
+    show_or_queue(options, chart_jobs, {'name': 'vendite_tipo_cliente', 'kind': 'barh', 'data': customer_sales_total,         # Grafico a barre delle vendite totali per tipo di cliente.
+                                        'x': 'Total', 'y': 'Customer type', 'hue': 'Customer type', 'palette': 'muted', 'figsize': (8, 5),
+                                        'title': 'Vendite Totali per Tipo di Cliente', 'xlabel': 'Vendite Totali', 'ylabel': 'Tipo di Cliente',
+                                        'legend': False})                                                                 # Disabilita la legenda predefinita.
+
+    # Storytelling delle vendite per tipo di cliente
+    print("\nVENDITE TOTALI PER TIPO DI CLIENTE \n"
+          "Member: 466.310.271\n"
+          "Normal: 410.756.094\n"
+          "Le vendite totali per tipo di cliente mostrano che i membri contribuiscono significativamente di più alle vendite complessive, "
+          "con un totale di 466.310.271 contro 410.756.094 dei clienti normali. Questo è un dato "
+          "positivo, in quanto suggerisce che l'implementazione di strategie di fidelizzazione ha portato a vendite maggiori. "
+          "Tuttavia, è importante anche considerare la proporzione di clienti normali e trovare modi per "
+          "convertirli in membri.\n")
+
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    # Stampa delle vendite totali per città
+    write_section("\nTotale vendite per città:", city_total_sales, 'City', fmt=options.format)                 # Scrive in un colpo solo il totale delle vendite per città, formattato con separatore delle migliaia.
+
+    show_or_queue(options, chart_jobs, {'name': 'vendite_citta', 'kind': 'barh', 'data': city_total_sales,  # Grafico a barre delle vendite totali per città.
+                                        'x': 'Total', 'y': 'City', 'hue': 'City', 'palette': 'muted', 'figsize': (10, 6),
+                                        'title': 'Vendite Totali per Città', 'xlabel': 'Vendite Totali', 'ylabel': 'Città',
+                                        'legend': False})                                                                 # Disabilita la legenda predefinita.
+
+    # Storytelling delle vendite per città
+    print("TOTALE VENDITE PER CITTA' \n"
+          "Mandalay: 291.910.206\n"
+          "Naypyitaw: 303.677.094\n"
+          "Yangon: 281.479.065\n"
+          "In termini di vendite totali per città, Naypyitaw ha il valore più alto con 303.677.094, seguita da Mandalay (291.910.206) "
+          "e Yangon (281.479.065). Questo potrebbe indicare che Naypyitaw sta performando meglio nel "
+          "complesso, il che potrebbe essere dovuto a fattori come una migliore strategia di marketing, "
+          "una maggiore popolazione di clienti o una combinazione di fattori favorevoli.\n")
+
+    print("-" * 40)                                # Stampa una linea orizzontale di 40 caratteri 
+
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    # Analisi delle vendite per categoria di prodotto
+    product_sales = rollup(sales_cube, 'Product line').sort_values(by='Total', ascending=False)                                     # Deriva dal cubo le vendite totali per categoria di prodotto ('Product line') e 'sort_values(by='Total', ascending=False)' ordina le categorie in ordine decrescente di vendite.
+    write_section("\nVendite per categoria di prodotto:", product_sales, 'Product line', fmt=options.format)   # Scrive in un colpo solo il totale delle vendite per categoria di prodotto, formattato con separatore delle migliaia.
+
+    # Visualizza le vendite per categoria di prodotto tramite grafico
+    show_or_queue(options, chart_jobs, {'name': 'vendite_categoria', 'kind': 'barh', 'data': product_sales, # Grafico a barre delle vendite totali per categoria di prodotto, in ordine decrescente.
+                                        'x': 'Total', 'y': 'Product line', 'hue': 'Product line', 'palette': 'pastel', 'dodge': False, 'figsize': (10, 6),
+                                        'title': 'Vendite Totali per Categoria di Prodotto', 'xlabel': 'Vendite Totali', 'ylabel': 'Categoria di Prodotto',
+                                        'legend': False})                                                                 # Disabilita la legenda predefinita.
+
+    # Storytelling delle vendite per categoria di prodotto
+    print("""
 ANALISI DEI DATI
 
 Dominanza della categoria "Health and Beauty":
@@ -240,33 +470,24 @@ si considera l'interesse crescente per cibi sani e bevande artigianali. Si potre
 più ampia.
 """)
 
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
-
-# Raggruppa le vendite per categoria di prodotto e genere
-category_gender_sales = sales_data.groupby(['Product line', 'Gender'])['Total'].sum().reset_index()     # Utilizza la funzione 'groupby' per raggruppare il DataFrame 'sales_data' per 'Product line' e 'Gender' e calcola la somma delle vendite totali ('Total') per ciascun gruppo e il risultato viene ripristinato come un nuovo DataFrame con l'indice reimpostato.
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Stampa delle vendite per categoria e genere
-print("\nVendite per categoria di prodotto e genere:")                                                  # Stampa un'intestazione per le vendite per categoria e genere.
-for index, row in category_gender_sales.iterrows():                                                     # Itera su ogni riga del DataFrame 'category_gender_sales' e stampiamo i risultati.
-    print(f"{row['Product line']} ({row['Gender']}): {thousand_separator(round(row['Total'], 0))}")     # Per ogni riga, stampa la categoria di prodotto e il genere con il totale delle vendite formattato utilizzando la funzione 'thousand_separator' per formattare i numeri.
+    # Raggruppa le vendite per categoria di prodotto e genere
+    category_gender_sales = rollup(sales_cube, ['Product line', 'Gender'])                                  # Deriva dal cubo le vendite totali per 'Product line' e 'Gender'.
 
-# Visualizzazione delle vendite per categoria e genere
-plt.figure(figsize=(12, 8))                                                                             # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-ax = sns.barplot(data=category_gender_sales, x='Total', y='Product line', hue='Gender', palette='muted')# Utilizza 'seaborn' per creare un grafico a barre, dove le vendite totali sono sull'asse X, le categorie di prodotto sull'asse Y, e il colore delle barre rappresenta il genere.
-plt.title('Vendite per Categoria di Prodotto e Genere')                                                 # Imposta il titolo del grafico.
-plt.xlabel('Vendite Totali')                                                                            # Etichetta l'asse X come 'Vendite Totali'.
-plt.ylabel('Categoria di Prodotto')                                                                     # Etichetta l'asse Y come 'Categoria di prodotto'.
-etichetta()                                                                                             # Funzione richiamata per formattare l'etichetta dei grafici a barre
+    # Stampa delle vendite per categoria e genere
+    write_section("\nVendite per categoria di prodotto e genere:", category_gender_sales, ['Product line', 'Gender'], fmt=options.format) # Scrive in un colpo solo le vendite per categoria di prodotto e genere, formattate con separatore delle migliaia.
 
-# Formattazione dell'asse X
-ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))  # Utilizza il formatter personalizzato per l'asse X, che applica il formato numerico definito in 'thousand_separator_for_plot'
-plt.legend(title='Genere')                                                # 'plt.legend()' crea una legenda per il grafico -'title' imposta il titolo della legenda come "Genere".
-plt.show()                                                                # Mostra il grafico finale
+    # Visualizzazione delle vendite per categoria e genere
+    show_or_queue(options, chart_jobs, {'name': 'vendite_categoria_genere', 'kind': 'barh', 'data': category_gender_sales,      # Grafico a barre delle vendite per categoria di prodotto, colorato per genere.
+                                        'x': 'Total', 'y': 'Product line', 'hue': 'Gender', 'palette': 'muted', 'figsize': (12, 8),
+                                        'title': 'Vendite per Categoria di Prodotto e Genere', 'xlabel': 'Vendite Totali', 'ylabel': 'Categoria di Prodotto',
+                                        'legend': {'title': 'Genere'}})                                                   # Legenda con il titolo 'Genere'.
 
-# Storytelling delle vendite per categoria di prodotto e genere
-print("""
+    # Storytelling delle vendite per categoria di prodotto e genere
+    print("""
 
 VENDITE PER CATEGORIA DI PRODOTTO E GENERE
 
@@ -304,30 +525,22 @@ Qui, gli uomini mostrano una spesa superiore, il che può riflettere un maggiore
 
 """)
 
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Impatto del genere sulle vendite
-gender_sales = sales_data.groupby('Gender')['Total'].sum().reset_index().sort_values(by='Total', ascending=False) # Raggruppa i dati per genere ('Gender') e somma le vendite totali ('Total') per ogni genere, 'reset_index()' riporta il risultato in un DataFrame e 'sort_values(by='Total', ascending=False)' ordina i generi in ordine decrescente di vendite.
-print("\nVendite per genere:")                                                                                    # Stampa un'intestazione per le vendite per genere.
-for index, row in gender_sales.iterrows():                                                                        # Itera su ogni riga del DataFrame 'gender_sales'.
-    print(f"{row['Gender']}: {thousand_separator(round(row['Total'], 0))}")                                       # Per ogni genere, stampa il nome del genere e il totale delle vendite formattato, 'thousand_separator(row['Total'])' applica la formattazione numerica definita per separare le migliaia e arrotonda al numero intero più vicino.
+    # Impatto del genere sulle vendite
+    gender_sales = rollup(sales_cube, 'Gender').sort_values(by='Total', ascending=False)                                     # Deriva dal cubo le vendite totali per genere ('Gender') e le ordina in ordine decrescente.
+    write_section("\nVendite per genere:", gender_sales, 'Gender', fmt=options.format)                         # Scrive in un colpo solo il totale delle vendite per genere, formattato con separatore delle migliaia.
 
-# Visualizzazione vendite per genere
-plt.figure(figsize=(10, 6))                                                                                           # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-ax = sns.barplot(data=gender_sales, x='Total', y='Gender', palette='pastel', hue='Gender', dodge=False, legend=False) # Crea un grafico a barre con le vendite totali per ciascun genere - 'data=gender_sales' specifica il DataFrame da utilizzare, 'x' è impostato su 'Total' per le vendite totali e 'y' su 'Gender' per i generi, 'palette' specifica i colori per le barre e 'hue' permette di colorare le barre in base al genere, 'dodge=False' indica che le barre non devono essere divise e 'legend=False' disabilita la legenda.
-plt.title('Vendite Totali per Genere')                                                                                # Imposta il titolo del grafico.
-plt.xlabel('Vendite Totali')                                                                                          # Etichetta l'asse X come 'Vendite Totali'.
-plt.ylabel('Genere')                                                                                                  # Etichetta l'asse Y come 'Genere'.
-etichetta()                                                                                                           # Funzione richiamata per formattare l'etichetta dei grafici a barre
+    # Visualizzazione vendite per genere
+    show_or_queue(options, chart_jobs, {'name': 'vendite_genere', 'kind': 'barh', 'data': gender_sales,      # Grafico a barre delle vendite totali per genere.
+                                        'x': 'Total', 'y': 'Gender', 'hue': 'Gender', 'palette': 'pastel', 'dodge': False, 'figsize': (10, 6),
+                                        'title': 'Vendite Totali per Genere', 'xlabel': 'Vendite Totali', 'ylabel': 'Genere',
+                                        'legend': False})                                                                 # Disabilita la legenda predefinita.
 
-# Formattazione dell'asse X
-ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))       # Utilizza il formatter personalizzato per l'asse X, che applica il formato numerico definito in 'thousand_separator_for_plot'
-plt.show()                                                                     # Mostra il grafico finale.
-
-# Storytelling dell' impatto del genere sulle vendite
-print("""
+    # Storytelling dell' impatto del genere sulle vendite
+    print("""
 
 VENDITE TOTALI PER GENERE
 
@@ -347,35 +560,31 @@ per potenziali opportunità di mercato.
 
 """)
 
-print("-" * 40)                         # Stampa una linea orizzontale di 40 caratteri 
+    print("-" * 40)                         # Stampa una linea orizzontale di 40 caratteri 
 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Raggruppa le vendite per città, genere e categoria di prodotto
-city_gender_category_sales = sales_data.groupby(['City', 'Gender', 'Product line'])['Total'].sum().reset_index()# Utilizza la funzione 'groupby' per raggruppare il DataFrame 'sales_data' in base a 'City', 'Gender' e 'Product line'. calcola la somma delle vendite totali ('Total') per ciascun gruppo e resettiamo l'indice per ottenere un nuovo DataFrame.
-print("Vendite per città, genere e categoria di prodotto:")                                                     # Stampa un'intestazione per le vendite per città, genere e categoria di prodotto.
-
-for index, row in city_gender_category_sales.iterrows():                                                        # Itera su ogni riga del DataFrame 'city_gender_category_sales'.
-    print(f"{row['City']} ({row['Gender']}, {row['Product line']}): {int(row['Total']):,.0f}".replace(',', '.'))# Stampa il nome della città, il genere, la categoria di prodotto e il totale delle vendite formattato con il separatore delle migliaia (.) in formato leggibile.
-  
-# Crea un grafico separato per ogni categoria di prodotto
-product_lines = city_gender_category_sales['Product line'].unique()                                             # Estrea le categorie di prodotto uniche dal DataFrame 'city_gender_category_sales' per poterle iterare.
-                                        
-for product in product_lines:                                                                                       
-    product_data = city_gender_category_sales[city_gender_category_sales['Product line'] == product]            # Filtra i dati per la categoria di prodotto corrente.
-    plt.figure(figsize=(12, 8))                                                                                 # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-    ax = sns.barplot(data=product_data, x='Total', y='City', hue='Gender', palette='pastel', dodge=True)        # Crea un grafico a barre utilizzando Seaborn, dove le vendite totali sono sull'asse X, le città sono sull'asse Y e il colore delle barre rappresenta il genere.
-    plt.title(f'Vendite per Città e Genere - Categoria: {product}')                                             # Imposta il titolo del grafico.
-    plt.xlabel('Vendite Totali')                                                                                # Etichetta l'asse X come 'Vendite Totali'.
-    plt.ylabel('Città')                                                                                         # Etichetta l'asse Y come 'Città'.
-    etichetta()                                                                                                 # Funzione richiamata per formattare l'etichetta dei grafici a barre                                                                                                                                                                                                                                                                 
-    # Formattazione dell'asse X
-    ax.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{int(x):,.0f}'.replace(',', '.')))                # Utilizza il formatter personalizzato per l'asse X.
-    plt.legend(title='Genere')                                                                                  # 'plt.legend()' crea una legenda per il grafico -'title' imposta il titolo della legenda come "Genere".
-    plt.show()                                                                                                  # Mostra il grafico finale
-    
-# Storytelling delle vendite per città, genere e categoria di prodotto
-print("""
+    # Raggruppa le vendite per città, genere e categoria di prodotto
+    city_gender_category_sales = rollup(sales_cube, ['City', 'Gender', 'Product line'])                    # Deriva dal cubo le vendite totali per 'City', 'Gender' e 'Product line'.
+    write_section("Vendite per città, genere e categoria di prodotto:", city_gender_category_sales, ['City', 'Gender', 'Product line'], fmt=options.format) # Scrive in un colpo solo le vendite per città, genere e categoria di prodotto, formattate con separatore delle migliaia.
+
+    # Grafico delle vendite per città e genere di ogni categoria di prodotto: tutti i pannelli in una sola figura (small multiples)
+    if options.small_multiples:
+        show_or_queue(options, chart_jobs, {'name': 'vendite_citta_genere_per_categoria', 'kind': 'facet_barh', 'data': city_gender_category_sales,  # Un pannello per categoria, assi condivisi.
+                                            'facet': 'Product line', 'x': 'Total', 'y': 'City', 'hue': 'Gender', 'palette': 'pastel', 'columns': 3,
+                                            'title': 'Vendite per Città e Genere - per Categoria di Prodotto', 'xlabel': 'Vendite Totali', 'ylabel': 'Città',
+                                            'legend': {'title': 'Genere'}})                                               # Una sola legenda per tutta la figura.
+    else:
+        product_lines = city_gender_category_sales['Product line'].unique()                       # Estrae le categorie di prodotto uniche dal DataFrame.
+        for product in product_lines:                                                             # Un grafico separato per ogni categoria di prodotto.
+            product_data = city_gender_category_sales[city_gender_category_sales['Product line'] == product]  # Filtra i dati per la categoria di prodotto corrente.
+            show_or_queue(options, chart_jobs, {'name': f'vendite_citta_genere_{product}', 'kind': 'barh', 'data': product_data,   # Grafico a barre delle vendite per città, colorato per genere.
+                                                'x': 'Total', 'y': 'City', 'hue': 'Gender', 'palette': 'pastel', 'dodge': True, 'figsize': (12, 8),
+                                                'title': f'Vendite per Città e Genere - Categoria: {product}', 'xlabel': 'Vendite Totali', 'ylabel': 'Città',
+                                                'legend': {'title': 'Genere'}})                                           # Legenda con il titolo 'Genere'.
+
+    # Storytelling delle vendite per città, genere e categoria di prodotto
+    print("""
 
 VENDITE PER CITTA', GENERE E CATEGORIA DI PRODOTTO
 
@@ -504,38 +713,33 @@ CONCLUSIONI E RACCOMANDAZIONI
 
 """)
 
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Operazioni sulle mele (e gestire i valori non numerici)
-apple_data['Acidity'] = pd.to_numeric(apple_data['Acidity'], errors='coerce')               # Converte la colonna 'Acidity' in valori numerici; se ci sono errori, sostituiamo con NaN.
-
-apple_data = apple_data.dropna()                                                            # Questo elimina tutte le righe del DataFrame che contengono valori NaN in qualsiasi colonna.
-
-X = apple_data.drop('Quality', axis=1)                                                      # Crea il DataFrame X con tutte le colonne tranne 'Quality', che sono le nostre caratteristiche predittive.
-y = apple_data['Quality']                                                                   # Crea il vettore y che contiene solo la colonna 'Quality', che è la nostra variabile target da prevedere.
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)   # Utilizza 'train_test_split' per dividere X e y in un training set e un test set, 'test_size=0.3' significa che il 30% dei dati sarà usato per il test e il 70% per l'addestramento, 'random_state=42' assicura che la divisione sia riproducibile.
-
-rf = RandomForestClassifier(n_estimators=100, random_state=42)                              # Crea un'istanza del modello RandomForestClassifier con 100 alberi e un seme random.
-rf.fit(X_train, y_train)                                                                    # Allena il modello utilizzando il training set.
+def run_apple_quality(options, evaluation, chart_jobs):
+    """
+    Sezione delle mele: classificazione della qualità con il modello Random Forest e matrice di confusione.
 
-y_pred = rf.predict(X_test)                                                                 # Utilizza il modello addestrato per fare previsioni sui dati del test set.
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        evaluation (dict): Il risultato dello stadio 'evaluate' (report e matrice di confusione).
+        chart_jobs (list): I grafici da salvare su file alla fine dell'analisi.
 
-print("\nClassificazione della qualità delle mele:")                                        # Visualizza le metriche di classificazione per confrontare le previsioni del modello con i valori reali.
-print(classification_report(y_test, y_pred))                                                # Stampa precisione, richiamo e punteggio F1 per ciascuna classe.
+    Returns:
+        None
+    """
+    print("\nClassificazione della qualità delle mele:")                                        # Visualizza le metriche di classificazione per confrontare le previsioni del modello con i valori reali.
+    print(evaluation['report'])                                                             # Stampa precisione, richiamo e punteggio F1 per ciascuna classe.
 
-# Visualizzazione della matrice di confusione
-conf_matrix = confusion_matrix(y_test, y_pred)                                                                        # Crea la matrice di confusione, 'confusion_matrix' confronta le etichette reali (y_test) con quelle previste (y_pred) e restituisce una matrice che mostra il numero di vere positivi, false positive, false negative e vere negative.
-sns.heatmap(conf_matrix, annot=True, fmt='d', cmap='Blues', xticklabels=['Bad', 'Good'], yticklabels=['Bad', 'Good']) # 'sns.heatmap' crea una mappa di calore utilizzando i dati della matrice di confusione, 'annot=True' permette di annotare le celle con i valori numerici, 'fmt='d'' specifica il formato dei numeri come interi, 'cmap='Blues'' imposta la mappa dei colori su tonalità di blu, 'xticklabels' e 'yticklabels' impostano le etichette per gli assi x e y.
-plt.ylabel('Valori Reali')                                                                                            # L'asse y rappresenta i valori reali delle classi (Bad o Good).
-plt.xlabel('Valori Predetti')                                                                                         # L'asse y rappresenta i valori reali delle classi (Bad o Good).
-plt.title('Matrice di Confusione')                                                                                    # Titolo che descrive il contenuto della mappa di calore.
-plt.show()                                                                                                            # Visualizza la mappa di calore
+    # Visualizzazione della matrice di confusione
+    show_or_queue(options, chart_jobs, {'name': 'matrice_confusione', 'kind': 'heatmap',              # Mappa di calore della matrice di confusione.
+                                        'data': confusion_frame(evaluation['metrics']),        # La matrice calcolata dallo stadio 'evaluate': etichette reali (righe) contro previste (colonne).
+                                        'cmap': 'Blues', 'figsize': (6.4, 4.8),
+                                        'title': 'Matrice di Confusione', 'xlabel': 'Valori Predetti', 'ylabel': 'Valori Reali'})
 
-# Storytelling sulle operazioni sulle mele (Matrice di Confusione)
-print("""
+    # Storytelling sulle operazioni sulle mele (Matrice di Confusione)
+    print("""
 
 MATRICE DI CONFUSIONE
 
@@ -607,74 +811,50 @@ di apprendimento automatico potrebbe contribuire a perfezionare il modello, gara
 
 """)
 
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Convertiamo la colonna Date in formato datetime e creiamo una nuova colonna "Month" per aggregare per mese
-sales_data['Date'] = pd.to_datetime(sales_data['Date'])                                                   # Converte la colonna 'Date' in formato datetime 
-sales_data['Month'] = sales_data['Date'].dt.to_period('M')                                                # Estrae il mese e l'anno dalla data e lo memorizza in una nuova colonna 'Month'
-
-# Raggruppiamo i dati per mese e sommiamo i profitti
-monthly_sales = sales_data.groupby('Month')['Total'].sum().reset_index()                                  # Raggruppa i dati nel DataFrame 'sales_data' per la colonna 'Month', calcolando la somma delle vendite totali ('Total') per ciascun mese e il risultato viene poi reimpostato come un nuovo DataFrame con l'indice ripristinato.
-
-# Trasformiamo la colonna Month in numerica per la regressione
-monthly_sales['Month_numeric'] = monthly_sales['Month'].astype(str).str.replace('-', '').astype(int)      # Converte i periodi mensili dalla forma 'YYYY-MM' (stringa) a un formato numerico intero e sostituisce il trattino '-' con una stringa vuota e poi converte il risultato in un numero intero. Questo passaggio è utile per l'analisi di regressione, poiché la variabile indipendente deve essere numerica.
-
-# Creiamo il modello di regressione
-X = monthly_sales[['Month_numeric']]                                                                      # Seleziona la colonna 'Month_numeric' come feature (variabile indipendente) per il modello di regressione.
-y = monthly_sales['Total']                                                                                # Seleziona la colonna 'Total' come target (variabile dipendente) che vogliamo prevedere.
-
-# Dividiamo il dataset per il training e il test set
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)                 # Utilizza la funzione 'train_test_split' per dividere i dati in due set: uno per l'addestramento (80%) e uno per il test (20%).'random_state=42' assicura che la divisione sia riproducibile, fornendo sempre lo stesso set di dati per il training e il test.
-
-# Inizializziamo il modello di regressione lineare
-reg = LinearRegression()                                                                                  # Crea un'istanza del modello di regressione lineare.
-reg.fit(X_train, y_train)                                                                                 # Addestra il modello sui dati di addestramento, apprendendo la relazione tra 'Month_numeric' e 'Total'.
-
-# Facciamo previsioni sui dati di test
-y_pred = reg.predict(X_test)                                                                              # Utilizza il modello di regressione addestrato (reg) per fare previsioni sui dati di test (X_test), producendo i valori previsti di vendita ('y_pred') per ciascun mese nel test set.
+def run_trend(options, forecast, chart_jobs):
+    """
+    Sezione del trend: regressione lineare sulle vendite mensili e grafico del trend nel tempo.
 
-# Calcolo dell'errore quadratico medio per valutare la precisione del modello di regressione
-mse = mean_squared_error(y_test, y_pred)                                                                  # Calcola l'errore quadratico medio (MSE), una metrica che misura quanto le previsioni differiscono dai valori reali. Confronta le previsioni 'y_pred' con i dati reali 'y_test'. Più basso è il valore, migliore è la precisione del modello.
-print(f"\nMean Squared Error: {thousand_separator(mse)}")                                                 # Stampa il valore dell'errore quadratico medio formattato con il separatore delle migliaia, 'thousand_separator' applica il formato per la visualizzazione.
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        forecast (dict): Il risultato dello stadio 'forecast' (vendite mensili ed errore quadratico medio).
+        chart_jobs (list): I grafici da salvare su file alla fine dell'analisi.
 
-# Storytelling sull'errore quadratico medio
-print("""
+    Returns:
+        None
+    """
+    monthly_sales = forecast['monthly_sales']                                                                 # Le vendite mensili calcolate dallo stadio 'forecast'.
+    mse = forecast['mse']                                                                                     # L'errore quadratico medio sul test set.
+    if mse is None:
+        print(f"\nRegressione del trend non eseguita: servono almeno {MIN_FORECAST_MONTHS} mesi di vendite, "
+              f"i dati ne contengono {len(monthly_sales)}.")
+    else:
+        print(f"\nMean Squared Error: {thousand_separator(mse)}")                                                 # Stampa il valore dell'errore quadratico medio formattato con il separatore delle migliaia, 'thousand_separator' applica il formato per la visualizzazione.
+
+        # Storytelling sull'errore quadratico medio
+        print("""
 L'elevato valore di errore quadratico medio (MSE), può essere attribuito principalmente al fatto che i dati disponibili coprono solo un periodo di tre mesi. Questo limitato 
 intervallo temporale non consente al modello di catturare in modo efficace eventuali trend stagionali, ciclici o variazioni nel comportamento delle vendite su periodi più lunghi.
 """)
 
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
- 
-#----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
 
-# Convertiamo 'Month' in stringa per la visualizzazione nel grafico
-monthly_sales['Month'] = monthly_sales['Month'].dt.strftime('%Y-%m')                                                  # Converte la colonna 'Month' in formato stringa, nel formato 'YYYY-MM', per una migliore visualizzazione nel grafico.
-
-# Visualizzazione del trend con un grafico a linea
-plt.figure(figsize=(10, 6))                                                                                                 # Crea una nuova figura per il grafico con una dimensione specificata (larghezza, altezza).
-plt.plot(monthly_sales['Month'], monthly_sales['Total'], marker='o', label='Vendite Totali', color='blue', linestyle='-')   # Crea un grafico a linee che rappresenta il trend delle vendite totali per mese, 'marker='o'' aggiunge dei marcatori per ciascun punto dati (vendite mensili), il colore è blu e le linee sono continue.
-plt.xlabel('Mese')                                                                                                          # Imposta l'etichetta per l'asse X, rappresentando i mesi.
-plt.ylabel('Vendite Totali')                                                                                                # Imposta l'etichetta per l'asse Y, rappresentando le vendite totali mensili.
-plt.title('Trend delle Vendite Mensili nel Tempo')                                                                          # Imposta il titolo del grafico.
-plt.xticks(rotation=45)                                                                                                     # Ruota le etichette dei mesi sull'asse X di 45 gradi per migliorarne la leggibilità.
-plt.gca().yaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))                                             # Applica il separatore delle migliaia (formato europeo con punto) all'asse Y utilizzando la funzione 'FuncFormatter'.
-plt.legend()                                                                                                                # Aggiunge una legenda per descrivere la linea nel grafico.
-plt.grid()                                                                                                                  # Aggiunge una griglia al grafico per una migliore leggibilità visiva e per facilitare il confronto dei dati.
-
-# Aggiungere etichette con i valori sopra i punti in grassetto
-for i in range(len(monthly_sales)):                                             # Itera attraverso ogni riga del dataframe 'monthly_sales' utilizzando il suo indice, 'len(monthly_sales)' restituisce il numero di righe nel dataframe, in modo da poter accedere a ciascun punto dati.
-    offset = monthly_sales['Total'][i] * - 0.01                                 # Definisce un piccolo offset per spostare leggermente l'etichetta sotto il punto, per evitare che si sovrapponga. L'offset è calcolato come l'1% del valore totale delle vendite, rendendolo dinamico rispetto all'altezza delle barre.
-    plt.text(monthly_sales['Month'][i], monthly_sales['Total'][i] + offset,     # 'plt.text()' aggiunge del testo al grafico. Qui viene posizionato il valore delle vendite totali per ciascun mese. La posizione X corrisponde alla data (mese) e la posizione Y è il valore delle vendite totali con l'offset per spostare leggermente il testo.
-             f"{thousand_separator(monthly_sales['Total'][i])}",                # formatta il valore delle vendite totali con un separatore delle migliaia ('.') per garantire che i numeri siano facilmente leggibili.
-             ha='center', va='bottom', fontsize=9, fontweight='bold')           # 'ha' (horizontal alignment) allinea il testo orizzontalmente al centro del punto dati, 'va' (vertical alignment) allinea il testo verticalmente sul fondo del punto dati. Il 'fontsize=9' definisce una dimensione del testo appropriata per il grafico e 'fontweight='bold'' rende il testo in grassetto per migliorare la visibilità.
-
-plt.tight_layout()                                                              # Assicura che gli elementi del grafico non si sovrappongano e che ci sia sufficiente spazio per tutte le etichette e assi.
-plt.show()                                                                      # Mostra il grafico aggiornato con le etichette sopra i punti dati.
-
-# Storytelling del trend delle Vendite Mensili nel Tempo
-print("""
+    #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+    # Convertiamo 'Month' in stringa per la visualizzazione nel grafico
+    monthly_sales['Month'] = monthly_sales['Month'].dt.strftime('%Y-%m')                                                  # Converte la colonna 'Month' in formato stringa, nel formato 'YYYY-MM', per una migliore visualizzazione nel grafico.
+
+    # Visualizzazione del trend con un grafico a linea
+    show_or_queue(options, chart_jobs, {'name': 'trend_vendite_mensili', 'kind': 'line', 'data': monthly_sales,             # Grafico a linea del trend, con le vendite sopra ogni punto in grassetto.
+                                        'x': 'Month', 'y': 'Total', 'label': 'Vendite Totali', 'color': 'blue', 'figsize': (10, 6),
+                                        'title': 'Trend delle Vendite Mensili nel Tempo', 'xlabel': 'Mese', 'ylabel': 'Vendite Totali'})
+
+    # Storytelling del trend delle Vendite Mensili nel Tempo
+    print("""
 Il grafico mostra il trend delle vendite mensili per un periodo di tre mesi (gennaio, febbraio e marzo del 2019), con i seguenti valori totali di vendita:
 
 Gennaio 2019: 338.942.184
@@ -703,6 +883,744 @@ Cambiamento nel comportamento dei consumatori:
 La flessione delle vendite potrebbe anche riflettere un cambiamento nei modelli di spesa dei clienti, che si stabilizzano dopo una spinta iniziale.
 """)
 
-print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
+    print("-" * 40)                                         # Stampa una linea orizzontale di 40 caratteri 
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+def run_predict(options):
+    """
+    Classifica le mele di un CSV con il modello salvato, riaddestrandolo solo se i dati o gli iperparametri sono cambiati.
+
+    Il file viene letto e classificato a blocchi, quindi può essere molto più grande della memoria disponibile.
+    Le previsioni ('A_id', se presente, e 'Quality') vanno sul file indicato o sullo standard output; i messaggi
+    sullo stato del modello, il throughput e, se il file contiene 'Quality', il report di classificazione vanno
+    sullo standard error, così l'uscita resta un CSV valido.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'predict'.
+
+    Returns:
+        None
+    """
+    from apple_model import load_or_train                                               # Modello salvato, riaddestrato solo quando serve (importa scikit-learn)
+    from scoring import score_file                                                      # Classificazione in streaming con lettura anticipata dei blocchi
+
+    bundle, retrained = load_or_train(options.apple_csv, options.model)
+    status = "riaddestrato" if retrained else "riusato"
+    print(f"Modello {status} (accuratezza sul test set: {bundle['accuracy']:.3f})", file=sys.stderr)
+
+    stats = score_file(options.input, options.output, options.model, options.chunksize, options.batch_size, options.engine)
+    print(f"Mele classificate: {stats['scored']} su {stats['rows']} righe ({stats['skipped']} incomplete scartate) "
+          f"in {stats['seconds']:.2f} s, {thousand_separator(stats['rows_per_s'])} righe/s", file=sys.stderr)
+    if stats['metrics'] is not None:                                                    # Il file contiene anche la qualità reale: valutazione in streaming.
+        print(f"\nValutazione delle previsioni:\n{classification_report(stats['metrics'])}", file=sys.stderr)
+
+def run_model_search(options):
+    """
+    Confronta le combinazioni di iperparametri del classificatore delle mele per accuratezza e tempi.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'model-search'.
+
+    Returns:
+        None
+    """
+    from apple_model import records_to_array                                            # Le stesse caratteristiche del modello salvato
+    from model_search import choose_model, search                                       # Validazione incrociata in parallelo con potatura
+
+    apple_data = load_apple_data(options.apple_csv)
+    X = records_to_array(apple_data)                                                    # Solo le caratteristiche dello schema, in float32.
+    y = apple_data['Quality'].to_numpy(dtype=str)
+    results = search(X, y, folds=options.folds, processes=options.processes, prune_margin=options.prune_margin)
+
+    print(f"\nRicerca del modello: {len(results)} combinazioni, validazione incrociata a {options.folds} fold "
+          f"({int(results['pruned'].sum())} scartate in anticipo)")
+    print(results.to_string(index=False, formatters={'accuracy': '{:.4f}'.format, 'accuracy_std': '{:.4f}'.format,
+                                                     'fit_s': '{:.3f}'.format, 'predict_us': '{:.1f}'.format}))
+    best = choose_model(results, options.latency_budget_us)
+    if best is None:
+        print("\nNessuna combinazione rispetta il budget di latenza indicato.")
+        return
+    params = ', '.join(f"{name}={best[name]}" for name in ('n_estimators', 'max_depth', 'max_features'))
+    print(f"\nModello scelto: {params} (accuratezza {best['accuracy']:.4f}, "
+          f"addestramento {best['fit_s']:.3f} s, previsione {best['predict_us']:.1f} µs per record)")
+
+def run_inference_benchmark(options):
+    """
+    Confronta la latenza per record di scikit-learn e della foresta compilata sul modello salvato.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'inference-benchmark'.
+
+    Returns:
+        None
+    """
+    from apple_model import load_or_train, records_to_array                             # Modello salvato e caratteristiche dello schema
+    from forest_inference import benchmark                                              # Misura delle due modalità di inferenza
+
+    bundle, _ = load_or_train(options.apple_csv, options.model)
+    X = records_to_array(load_apple_data(options.apple_csv), bundle['features'])
+    results = benchmark(bundle['model'], X, options.batch_sizes)
+
+    print(f"\nLatenza di inferenza del modello delle mele ({bundle['params']['n_estimators']} alberi), in µs per record")
+    print(results.to_string(index=False, formatters={'sklearn_us_per_row': '{:.1f}'.format,
+                                                     'compiled_us_per_row': '{:.1f}'.format,
+                                                     'speedup': '{:.2f}x'.format}))
+    if not results['identical'].all():
+        print("\nAttenzione: le previsioni delle due modalità non coincidono.")
+
+def report_validation(options, validation):
+    """
+    Scrive le righe di vendita non valide nel file di quarantena e riporta le violazioni per regola.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        validation (dict): Il risultato dello stadio 'validate_sales'.
+
+    Returns:
+        None
+    """
+    source = f'{dataset_name(options.sales_dataset)}.csv' if options.sales_dataset else resolve_path(options.sales_csv, SALES_CSV_ENV, DEFAULT_SALES_CSV)
+    path = options.quarantine or quarantine_path(source)
+    write_quarantine(validation['quarantine'], path)
+    total = len(validation['valid']) + len(validation['quarantine'])
+    print(f"\nValidazione delle vendite: {len(validation['quarantine'])} righe su {total} in quarantena ({path})")
+    for rule, count in validation['violations'].items():
+        if count:
+            print(f"- {rule}: {count} righe")
+
+def run_validate(options):
+    """
+    Valida un CSV a blocchi con le regole del dataset, scrivendo le righe non valide nel file di quarantena.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'validate'.
+
+    Returns:
+        None
+    """
+    if options.dataset == 'sales':
+        path = resolve_path(options.input, SALES_CSV_ENV, DEFAULT_SALES_CSV)
+    else:
+        path = resolve_path(options.input, APPLE_CSV_ENV, DEFAULT_APPLE_CSV)
+    stats = validate_csv(path, DATASET_RULES[options.dataset], options.quarantine, options.output, options.chunksize)
+
+    print(f"\nValidazione di {path}: {stats['valid']} righe valide, {stats['quarantined']} in quarantena "
+          f"({stats['quarantine']}), {thousand_separator(stats['rows_per_s'])} righe/s")
+    violations = pd.DataFrame({'regola': list(stats['violations']), 'violazioni': list(stats['violations'].values())})
+    print(violations.to_string(index=False))
+
+def load_sales_input(options):
+    """
+    Carica le vendite indicate dalle opzioni: il dataset su più file (con i filtri) oppure il singolo CSV.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+
+    Returns:
+        pd.DataFrame: Il DataFrame delle vendite.
+    """
+    if options.sales_dataset:
+        return read_sales_dataset(options.sales_dataset, options.city, options.branch, options.month)
+    return load_sales_data(options.sales_csv)
+
+def run_timeseries(options):
+    """
+    Ricampiona le vendite alla granularità richiesta, con finestra mobile facoltativa e mappa di calore ora x giorno.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'timeseries'.
+
+    Returns:
+        None
+    """
+    from query import parse_filters                                                     # Stessa sintassi di 'query --where'
+    from timeseries import build_time_store, hour_weekday, normalize_where, resample, rolling  # Indice temporale ordinato e intervalli precalcolati
+
+    where = parse_filters(options.where)                                                # Es. ['City=Yangon,Mandalay'] -> {'City': ['Yangon', 'Mandalay']}.
+    store = build_time_store(load_sales_input(options))
+    normalize_where(store, where)                                                       # Colonne sconosciute: errore prima di qualsiasi calcolo.
+    if options.rolling:
+        table = rolling(store, options.freq, options.rolling, options.measure, options.by, options.how, where)
+        title = f"\n{options.measure} ({options.how}) per {options.freq}, media mobile su {options.rolling} intervalli:"
+    else:
+        table = resample(store, options.freq, options.measure, options.by, options.how, where)
+        title = f"\n{options.measure} ({options.how}) per {options.freq}:"
+    series = table.stack().rename(options.measure).reset_index()                       # Formato lungo: una riga per intervallo (e gruppo).
+    series[options.freq] = series[options.freq].dt.strftime('%Y-%m-%d %H:%M' if options.freq == 'hour' else '%Y-%m-%d')
+    labels = [options.freq, options.by] if options.by else [options.freq]
+    write_section(title, series.fillna(0), labels, options.measure, fmt=options.format)
+
+    if options.heatmap:
+        grid = hour_weekday(store, options.measure, options.how, where)
+        print(f"\n{options.measure} ({options.how}) per giorno della settimana e ora del giorno:")
+        print(grid.round(0).fillna(0).astype('int64').to_string())
+        chart_jobs = []
+        show_or_queue(options, chart_jobs, {'name': f'ora_giorno_{options.measure}', 'kind': 'heatmap', 'data': grid,
+                                            'annot': False, 'cmap': 'YlOrRd', 'figsize': (12, 4.8),
+                                            'title': f'{options.measure} per giorno della settimana e ora',
+                                            'xlabel': 'Ora del giorno', 'ylabel': 'Giorno della settimana'})
+        if chart_jobs and not options.no_plots:
+            render_charts(chart_jobs, options.chart_dir, options.chart_format)
+
+def run_forecast(options):
+    """
+    Prevede in blocco le vendite di ogni combinazione dei gruppi richiesti, con un test set finale in ordine di tempo.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'forecast'.
+
+    Returns:
+        None
+    """
+    import time                                                                         # Per misurare il tempo di calcolo delle previsioni
+    from forecasting import forecast_table                                              # Minimi quadrati di tutte le serie in una sola chiamata
+    from timeseries import build_time_store, resample                                   # Serie ricampionate senza buchi
+
+    table = resample(build_time_store(load_sales_input(options)), options.freq, options.measure, options.by)
+    start = time.perf_counter()
+    result = forecast_table(table, options.freq, options.holdout, options.horizon)
+    seconds = time.perf_counter() - start
+
+    model = f"trend e stagionalità di periodo {result['period']}" if result['period'] else "trend lineare"
+    print(f"\nPrevisioni di {options.measure} per {' x '.join(options.by)}: {table.shape[1]} serie, {len(table)} intervalli "
+          f"({options.freq}), {model}, calcolate in {seconds * 1000:.1f} ms")
+    labels = list(options.by)
+    mse = result['mse'].reset_index()
+    mse.columns = labels + ['mse']
+    write_section(f"\nMSE sul test set (dal {result['holdout_start']:%Y-%m-%d}, in ordine di tempo):",
+                  mse.sort_values('mse', ascending=False), labels, 'mse', fmt=options.format)
+    forecast = result['forecast'].sum().reset_index()
+    forecast.columns = labels + [options.measure]
+    write_section(f"\nPrevisione di {options.measure} nei prossimi {options.horizon} intervalli "
+                  f"({result['forecast'].index[0]:%Y-%m-%d} - {result['forecast'].index[-1]:%Y-%m-%d}):",
+                  forecast, labels, options.measure, fmt=options.format)
+
+def print_table(options, title, table):
+    """
+    Stampa una tabella con più colonne di valori: testo allineato oppure CSV, secondo '--format'.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        title (str): Il titolo della tabella.
+        table (pd.DataFrame): La tabella.
+
+    Returns:
+        None
+    """
+    print(title)
+    if options.format == 'csv':
+        sys.stdout.write(table.to_csv(index=False, lineterminator='\n', float_format='%.2f'))
+    else:
+        print(table.to_string(index=False, float_format=lambda value: f'{value:.2f}'))
+
+def run_sketches(options):
+    """
+    Stima quantili dello scontrino e dei voti e fatture distinte per ogni dimensione richiesta, con sketch unibili.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'sketches'.
+
+    Returns:
+        None
+    """
+    import time                                                                         # Per misurare il tempo di costruzione degli sketch
+    from sketches import build_sketch_cube, build_sketch_cube_streaming, sketch_bytes, sketch_rollup  # Quantili e distinti per cella del cubo
+
+    start = time.perf_counter()
+    if options.chunksize:
+        sketch_cube = build_sketch_cube_streaming(options.sales_csv, options.chunksize, relative_error=options.relative_error,
+                                                  precision=options.precision)
+    else:
+        sketch_cube = build_sketch_cube(load_sales_input(options), relative_error=options.relative_error, precision=options.precision,
+                                        partition_by=options.partition_by, processes=1 if options.aggregate_processes is None else options.aggregate_processes)
+    seconds = time.perf_counter() - start
+    print(f"\nSketch di {len(sketch_cube['cells'])} celle del cubo ({sketch_bytes(sketch_cube) / 1024:.0f} KB) "
+          f"su {thousand_separator(sketch_cube['cells']['Count'].sum())} righe, calcolati in {seconds:.2f} s; "
+          f"errore relativo dei quantili {options.relative_error:g}, HyperLogLog con 2^{options.precision} registri")
+    for dimension in options.by:
+        print_table(options, f"\nQuantili e fatture distinte per {dimension}:", sketch_rollup(sketch_cube, dimension, options.quantiles))
+
+def run_query_command(options, tracer):
+    """
+    Risponde a un'interrogazione ad hoc dal cubo delle interrogazioni, memorizzato nella cache degli stadi.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'query'.
+        tracer (dict): Lo stato della strumentazione.
+
+    Returns:
+        None
+    """
+    import time                                                                         # Per misurare il tempo di risposta
+    from query import cache_info, new_query_engine, parse_filters, run_query            # Motore delle interrogazioni con cache LRU dei risultati
+
+    cache_dir = None if options.no_stage_cache else default_stage_cache_dir()
+    stages = build_stages(options)
+    pipeline = lambda targets: run_pipeline(stages, targets, cache_dir=cache_dir, max_bytes=options.stage_cache_mb << 20, tracer=tracer)
+    status = {}
+    query_cube = run_pipeline(stages, ['query_cube'], cache_dir=cache_dir, max_bytes=options.stage_cache_mb << 20,
+                              status=status, tracer=tracer)['query_cube']
+    load_rows = lambda: pipeline(['validate_sales'])['validate_sales']['valid'] if options.validate else pipeline(['load_sales'])['load_sales']
+    engine = new_query_engine(query_cube, load_rows)
+
+    filters = parse_filters(options.where)
+    timings = []
+    for _ in range(options.repeat):                                                     # Le ripetizioni vengono servite dalla cache dei risultati.
+        start = time.perf_counter()
+        with span(tracer, 'query'):
+            table = run_query(engine, options.by, options.measure, filters, options.how)
+        timings.append(time.perf_counter() - start)
+
+    source = 'dalle righe' if engine['rows'] is not None else f"dal cubo ({len(query_cube)} celle, {status['query_cube']})"
+    grouping = ' x '.join(options.by) or 'totale'
+    conditions = f" con {', '.join(options.where)}" if options.where else ''
+    print_table(options, f"\n{', '.join(options.measure)} per {grouping}{conditions}:", table)
+    info = cache_info(engine)
+    repeated = f", ripetizioni dalla cache in {min(timings[1:]) * 1000:.3f} ms ({info['hits']} risposte)" if len(timings) > 1 else ''
+    print(f"\nRisposta {source} in {timings[0] * 1000:.2f} ms{repeated}")
+
+def run_serve(options):
+    """
+    Carica dati, aggregati e modelli e serve il report in HTTP (JSON, testo e PNG) fino a Ctrl+C, ricaricandoli se cambiano i dati.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'serve'.
+
+    Returns:
+        None
+    """
+    import contextlib                                                                   # Per catturare il testo delle sezioni
+    import hashlib                                                                      # Per l'impronta dei dati da cui derivano gli ETag
+    import io                                                                           # Per il testo delle sezioni in memoria
+    from pipeline import stage_keys                                                     # Chiavi degli stadi: contenuto dei CSV e codice
+    from query import new_query_engine                                                  # Motore delle interrogazioni con cache LRU dei risultati
+    from report_server import make_server, new_report, new_report_state                 # Server HTTP del report
+    from streaming_metrics import accuracy, class_metrics                               # Metriche della classificazione come tabella
+
+    cache_dir = None if options.no_stage_cache else default_stage_cache_dir()
+    stages = build_stages(options)
+    targets = list(SECTION_STAGES.values()) + ['query_cube']
+    pipeline = lambda targets: run_pipeline(stages, targets, cache_dir=cache_dir, max_bytes=options.stage_cache_mb << 20)
+    load_rows = lambda: pipeline(['validate_sales'])['validate_sales']['valid'] if options.validate else pipeline(['load_sales'])['load_sales']
+    section_options = argparse.Namespace(**{**vars(options), 'chart_dir': '(server)', 'no_plots': False, 'format': 'text'})
+    runners = {'sales': (run_sales, 'aggregate'), 'apple-quality': (run_apple_quality, 'evaluate'), 'trend': (run_trend, 'forecast')}
+
+    def check():
+        keys = stage_keys(stages, targets)
+        return hashlib.sha256(''.join(keys[target] for target in targets).encode()).hexdigest()  # Cambia con i dati o con il codice degli stadi.
+
+    def load():
+        fingerprint = check()
+        results = pipeline(targets)
+
+        # Le sezioni vengono eseguite una volta con l'uscita catturata e i grafici accodati, come con '--chart-dir'
+        chart_jobs, texts = [], {}
+        for section, (runner, stage) in runners.items():
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                runner(section_options, results[stage], chart_jobs)
+            texts[section] = output.getvalue()
+
+        metrics = results['evaluate']['metrics']
+        documents = {
+            'sales': {'breakdowns': [{'by': dimensions, 'rows': rollup(results['aggregate'], dimensions)} for dimensions in BENCHMARK_ROLLUPS]},
+            'apple-quality': {'accuracy': accuracy(metrics), 'classes': class_metrics(metrics).rename_axis('class').reset_index(),
+                              'confusion_matrix': results['evaluate']['confusion_matrix']},
+            'trend': {'monthly_sales': results['forecast']['monthly_sales'][['Month', 'Total']], 'mse': results['forecast']['mse']},
+        }
+        return new_report(fingerprint, documents, texts, chart_jobs), results['query_cube'], load_rows
+
+    report, query_cube, load_rows = load()
+    state = new_report_state(report, new_query_engine(query_cube, load_rows, report['fingerprint']), check, load)  # I dati si ricontrollano durante il servizio.
+
+    server = make_server(state, options.host, options.port)
+    host, port = server.server_address[:2]
+    print(f"Report su http://{host}:{port}/ ({len(report['documents'])} documenti, {len(report['charts'])} grafici); Ctrl+C per fermare", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def run_benchmark(options):
+    """
+    Misura tempo e memoria di ogni stadio dell'analisi su dataset sintetici di una o più dimensioni.
+
+    Gli stadi sono quelli del report (caricamento, pulizia, aggregazione, addestramento, previsione, regressione,
+    report e grafici), eseguiti senza cache; i grafici vengono salvati in una cartella temporanea.
+
+    Args:
+        options (argparse.Namespace): Le opzioni del sottocomando 'benchmark'.
+
+    Returns:
+        None
+    """
+    import contextlib                                                                   # Per raccogliere il testo del report senza stamparlo
+    import io                                                                           # Per il buffer del testo del report
+    import tempfile                                                                     # Cartella temporanea dei grafici
+    from benchmark import (compare_results, default_results_path, ensure_dataset, environment,  # Dataset sintetici e misure degli stadi
+                           load_results, measure, new_timer, save_results, stop_timer)
+    from loaders import parse_apple_csv, parse_sales_csv                                # Lettura dei CSV senza la cache colonnare
+
+    sales_source = resolve_path(options.sales_csv, SALES_CSV_ENV, DEFAULT_SALES_CSV)
+    apple_source = resolve_path(options.apple_csv, APPLE_CSV_ENV, DEFAULT_APPLE_CSV)
+    results = {'created': pd.Timestamp.now().isoformat(timespec='seconds'), 'seed': options.seed,
+               'memory': options.memory, 'environment': environment(), 'runs': []}
+    for rows in options.rows:
+        apple_rows = options.apple_rows or rows
+        print(f"\nBenchmark con {thousand_separator(rows)} vendite e {thousand_separator(apple_rows)} mele...", file=sys.stderr)
+        sales_csv = ensure_dataset('sales', sales_source, rows, options.seed, options.data_dir)
+        apple_csv = ensure_dataset('apple', apple_source, apple_rows, options.seed, options.data_dir)
+
+        timer = new_timer(options.memory)
+        sales_data = measure(timer, 'load_sales', parse_sales_csv, sales_csv)
+        apple_data = measure(timer, 'load_apple', parse_apple_csv, apple_csv)
+        measure(timer, 'validate_sales', validate_sales_data, sales_data)
+        split = measure(timer, 'clean', clean_apple_data, apple_data, 0.3, 42)
+        sales_cube = measure(timer, 'aggregate', build_sales_cube, sales_data)
+        for processes in options.aggregate_processes:                                   # Scalabilità dell'aggregazione in parallelo, stesso cubo.
+            measure(timer, f'aggregate_parallel:{processes}', build_sales_cube_parallel, sales_data,
+                    partition_by=options.partition_by, processes=processes or None)
+        for dimensions in BENCHMARK_ROLLUPS:
+            measure(timer, 'rollup:' + '+'.join(dimensions), rollup, sales_cube, dimensions)
+        rf = measure(timer, 'train', train_apple_model, split, options.n_estimators, 42, -1)
+        evaluation = measure(timer, 'predict', evaluate_apple_model, rf, split)
+        forecast = measure(timer, 'regression', forecast_monthly_sales, sales_cube, 0.2, 42)
+
+        with tempfile.TemporaryDirectory() as chart_dir:
+            report_options = argparse.Namespace(format='text', chart_dir=chart_dir, chart_format='png',
+                                                small_multiples=True, no_plots=False)
+            chart_jobs = []
+            with contextlib.redirect_stdout(io.StringIO()):                             # Il testo del report viene prodotto ma non stampato.
+                measure(timer, 'report', lambda: (run_sales(report_options, sales_cube, chart_jobs),
+                                                  run_apple_quality(report_options, evaluation, chart_jobs),
+                                                  run_trend(report_options, forecast, chart_jobs)))
+            measure(timer, 'render_charts', render_charts, chart_jobs, chart_dir)
+        stages = stop_timer(timer)
+        del sales_data, apple_data, split, sales_cube, rf, evaluation, forecast
+        results['runs'].append({'rows': rows, 'apple_rows': apple_rows, 'stages': stages,
+                                'total_seconds': sum(stage['seconds'] for stage in stages)})
+
+    path = save_results(results, options.output or default_results_path())
+    for run in results['runs']:
+        stages = pd.DataFrame(run['stages']).dropna(axis=1, how='all')                   # Senza misura della memoria la colonna 'peak_mb' è vuota.
+        print(f"\nBenchmark con {thousand_separator(run['rows'])} vendite e {thousand_separator(run['apple_rows'])} mele "
+              f"(totale {run['total_seconds']:.2f} s):")
+        print(stages.to_string(index=False, na_rep='-', formatters={'seconds': '{:.4f}'.format, 'peak_mb': '{:.1f}'.format,
+                                                                    'rss_peak_mb': '{:.0f}'.format}))
+    print(f"\nRisultati salvati in {path}")
+
+    if options.compare:
+        comparison = compare_results(results, load_results(options.compare), options.tolerance)
+        if comparison.empty:
+            print(f"\nNessuna dimensione in comune con {options.compare}.")
+            return
+        print(f"\nConfronto con {options.compare} (rapporto attuale / riferimento):")
+        print(comparison[['rows', 'stage', 'seconds', 'seconds_baseline', 'time_ratio', 'memory_ratio', 'regression']].to_string(
+            index=False, na_rep='-', formatters={'seconds': '{:.4f}'.format, 'seconds_baseline': '{:.4f}'.format,
+                                                 'time_ratio': '{:.2f}x'.format,
+                                                 'memory_ratio': lambda ratio: '-' if pd.isna(ratio) else f'{ratio:.2f}x'}))
+        slower = comparison[comparison['regression']]
+        if len(slower):
+            print(f"\nAttenzione: {len(slower)} stadi più lenti di {options.tolerance:.2f}x rispetto al riferimento.")
+
+def build_tracer(options):
+    """
+    Crea lo stato della strumentazione dalle opzioni: '--trace' o '--profile-stage' senza '--instrument' attivano il riepilogo.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+
+    Returns:
+        dict: Lo stato della strumentazione (vedi 'instrumentation.py').
+    """
+    mode = options.instrument
+    if mode == 'off' and (options.trace or options.profile_stage):
+        mode = 'summary'
+    return new_tracer(mode, options.profile_stage, options.profile_output)
+
+def finish_tracing(options, tracer):
+    """
+    Stampa il riepilogo della strumentazione sull'uscita di errore e, se richiesto, scrive il file di traccia.
+
+    Args:
+        options (argparse.Namespace): Le opzioni della riga di comando.
+        tracer (dict): Lo stato della strumentazione.
+
+    Returns:
+        None
+    """
+    print_summary(tracer)
+    if options.profile_stage and options.profile_stage not in tracer['profiles']:
+        print(f"\nNessuno stadio o sezione '{options.profile_stage}' eseguito: nessun profilo raccolto.", file=sys.stderr)
+    if options.trace:
+        write_trace(tracer, options.trace, {'options': vars(options)})
+        print(f"Traccia salvata in {options.trace}", file=sys.stderr)
+
+def positive_int(value):
+    """
+    Tipo argparse per le opzioni che richiedono un intero positivo (es. '--horizon').
+
+    Args:
+        value (str): Il valore della riga di comando.
+
+    Returns:
+        int: Il valore convertito.
+
+    Raises:
+        argparse.ArgumentTypeError: Se il valore non è un intero maggiore di zero.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"serve un intero positivo: {value!r}")
+    return number
+
+def build_parser():
+    """
+    Costruisce l'interfaccia a riga di comando: un sottocomando per ogni sezione del report, più 'all' per eseguirle tutte.
+
+    Returns:
+        argparse.ArgumentParser: Il parser degli argomenti.
+    """
+    common = argparse.ArgumentParser(add_help=False)                                    # Opzioni condivise da tutti i sottocomandi
+    common.add_argument('--sales-csv', help="CSV delle vendite (di default ANALYTICS_SALES_CSV o il file accanto allo script)")
+    common.add_argument('--apple-csv', help="CSV delle mele (di default ANALYTICS_APPLE_CSV o il file accanto allo script)")
+    common.add_argument('--sales-dataset', metavar='CARTELLA|GLOB',
+                        help="vendite su più file (es. uno per filiale e per mese): una cartella di CSV o un pattern come 'vendite/*/2019-01.csv'")
+    common.add_argument('--city', help="con '--sales-dataset': solo le vendite di questa città (si aprono solo i file che la contengono)")
+    common.add_argument('--branch', help="con '--sales-dataset': solo le vendite di questa filiale")
+    common.add_argument('--month', metavar='YYYY-MM', help="con '--sales-dataset': solo le vendite di questo mese")
+    common.add_argument('--chunksize', type=int, help="legge il CSV delle vendite in streaming a blocchi di questo numero di righe (es. 100000)")
+    common.add_argument('--state-dir', help="ripiega il CSV delle vendite nel cubo salvato in questa cartella (solo le fatture nuove)")
+    common.add_argument('--format', choices=REPORT_FORMATS, default='text', help="formato delle tabelle del report (di default 'text')")
+    common.add_argument('--chart-dir', help="salva i grafici in questa cartella (senza display, in parallelo) invece di mostrarli")
+    common.add_argument('--chart-format', choices=CHART_FORMATS, default='png', help="formato dei file dei grafici (di default 'png')")
+    common.add_argument('--no-small-multiples', dest='small_multiples', action='store_false',
+                        help="un grafico separato per ogni categoria invece di un'unica figura a pannelli")
+    common.add_argument('--aggregate-processes', type=int, metavar='N',
+                        help="calcola il cubo delle vendite in parallelo con N processi (0 = uno per core), con le colonne in memoria condivisa")
+    common.add_argument('--partition-by', choices=PARTITION_MODES, default='rows',
+                        help="partizionamento delle vendite tra i processi di '--aggregate-processes' (di default 'rows')")
+    common.add_argument('--no-plots', action='store_true', help="nessun grafico: solo il report testuale")
+    common.add_argument('--no-stage-cache', action='store_true', help="ricalcola tutti gli stadi senza usare la cache su disco dei risultati intermedi")
+    common.add_argument('--validate', action='store_true',
+                        help="applica le regole di qualità alle vendite: il report usa solo le righe valide, le altre vanno in quarantena")
+    common.add_argument('--quarantine', help="file di quarantena delle vendite non valide (di default 'quarantine/<nome del CSV>')")
+    common.add_argument('--instrument', choices=MODES, default='off',
+                        help="strumentazione di stadi e sezioni: 'summary' (tempo, CPU, righe, memoria) o 'detailed' (anche page fault, cambi di contesto, GC)")
+    common.add_argument('--profile-stage', metavar='STADIO',
+                        help="profila con cProfile questo stadio o sezione (es. train, aggregate, section:sales, render_charts)")
+    common.add_argument('--profile-output', help="file in cui salvare le statistiche complete di cProfile (formato di 'pstats')")
+    common.add_argument('--trace', help="scrive gli span in questo file JSON (formato Trace Event, apribile con chrome://tracing o Perfetto)")
+    common.add_argument('--stage-cache-mb', type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help="dimensione massima della cache degli stadi in MB: oltre si eliminano le voci usate meno di recente")
+
+    parser = argparse.ArgumentParser(description="Analisi delle vendite e classificazione della qualità delle mele.")
+    commands = parser.add_subparsers(dest='command', metavar='{all,sales,apple-quality,trend,predict,model-search,inference-benchmark,validate,timeseries,forecast,sketches,query,serve,benchmark}')
+    commands.add_parser('all', parents=[common], help="tutte le sezioni del report (sottocomando predefinito)")
+    commands.add_parser('sales', parents=[common], help="vendite per città, tipo di cliente, categoria di prodotto e genere")
+    commands.add_parser('apple-quality', parents=[common], help="classificazione della qualità delle mele (Random Forest)")
+    commands.add_parser('trend', parents=[common], help="trend delle vendite mensili (regressione lineare)")
+
+    scoring = commands.add_parser('predict', help="classifica la qualità delle mele di un CSV con il modello salvato")
+    scoring.add_argument('input', help="CSV delle mele da classificare (colonne Size, Weight, ..., Acidity; 'A_id' facoltativa)")
+    scoring.add_argument('--output', help="CSV in cui scrivere le previsioni (di default lo standard output)")
+    scoring.add_argument('--model', help="file del modello (di default ANALYTICS_APPLE_MODEL o 'models/apple_quality.joblib')")
+    scoring.add_argument('--apple-csv', help="CSV di addestramento, usato se il modello manca o non è aggiornato")
+    scoring.add_argument('--chunksize', type=int, default=250_000, help="righe lette e classificate per ogni blocco (di default 250000)")
+    scoring.add_argument('--batch-size', type=int, default=100_000, help="record classificati per ogni lotto (di default 100000)")
+    scoring.add_argument('--engine', choices=('sklearn', 'compiled'), default='sklearn',
+                         help="modalità di inferenza: 'compiled' usa la foresta esportata in array, più rapida su lotti piccoli")
+
+    tuning = commands.add_parser('model-search', help="validazione incrociata in parallelo su una griglia di iperparametri del classificatore")
+    tuning.add_argument('--apple-csv', help="CSV delle mele (di default ANALYTICS_APPLE_CSV o il file accanto allo script)")
+    tuning.add_argument('--folds', type=int, default=5, help="numero di fold della validazione incrociata (di default 5)")
+    tuning.add_argument('--processes', type=int, help="processi del pool (di default uno per core)")
+    tuning.add_argument('--prune-margin', type=float, default=0.02,
+                        help="dopo i primi fold scarta le combinazioni con accuratezza inferiore alla migliore meno questo margine")
+    tuning.add_argument('--latency-budget-us', type=float, help="tempo di previsione massimo per record, in microsecondi, del modello scelto")
+
+    latency = commands.add_parser('inference-benchmark', help="latenza per record di scikit-learn e della foresta compilata")
+    latency.add_argument('--model', help="file del modello (di default ANALYTICS_APPLE_MODEL o 'models/apple_quality.joblib')")
+    latency.add_argument('--apple-csv', help="CSV delle mele, usato per i record di prova e per riaddestrare il modello se serve")
+    latency.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 100_000],
+                         help="dimensioni dei lotti da misurare (di default 1 100 100000)")
+
+    checks = commands.add_parser('validate', help="controlla le regole di qualità di un CSV e mette in quarantena le righe non valide")
+    checks.add_argument('--dataset', choices=tuple(DATASET_RULES), default='sales', help="regole da applicare (di default 'sales')")
+    checks.add_argument('--input', help="CSV da validare (di default quello del dataset, come negli altri sottocomandi)")
+    checks.add_argument('--quarantine', help="file delle righe non valide, con le regole violate (di default 'quarantine/<nome del CSV>')")
+    checks.add_argument('--output', help="CSV in cui scrivere le sole righe valide")
+    checks.add_argument('--chunksize', type=int, default=250_000, help="righe validate per ogni blocco (di default 250000)")
+
+    series = commands.add_parser('timeseries', parents=[common], help="vendite ricampionate per ora, giorno, settimana o mese")
+    series.add_argument('--freq', choices=('hour', 'day', 'week', 'month'), default='month', help="granularità (di default 'month')")
+    series.add_argument('--measure', choices=('Total', 'Quantity', 'cogs', 'gross income', 'Rating'), default='Total',
+                        help="misura da aggregare (di default 'Total')")
+    series.add_argument('--how', choices=('sum', 'mean', 'count'), default='sum', help="aggregazione di ogni intervallo (di default 'sum')")
+    series.add_argument('--by', choices=('City', 'Branch', 'Customer type', 'Gender', 'Product line', 'Payment'),
+                        help="una serie per ogni valore di questa dimensione")
+    series.add_argument('--where', action='append', default=[], metavar='COLONNA=VALORE[,VALORE]',
+                        help="considera solo le vendite con questi valori (ripetibile, es. --where City=Yangon,Mandalay)")
+    series.add_argument('--rolling', type=int, help="media mobile su questo numero di intervalli")
+    series.add_argument('--heatmap', action='store_true', help="aggiunge la mappa di calore giorno della settimana x ora del giorno")
+
+    forecasts = commands.add_parser('forecast', parents=[common], help="previsioni in blocco per ogni combinazione di città e categoria di prodotto")
+    forecasts.add_argument('--freq', choices=('hour', 'day', 'week', 'month'), default='day', help="granularità delle serie (di default 'day')")
+    forecasts.add_argument('--measure', choices=('Total', 'Quantity', 'cogs', 'gross income'), default='Total',
+                           help="misura da prevedere (di default 'Total')")
+    forecasts.add_argument('--by', nargs='+', default=['City', 'Product line'],
+                           choices=('City', 'Branch', 'Customer type', 'Gender', 'Product line', 'Payment'),
+                           help="dimensioni che definiscono le serie (di default City e Product line)")
+    forecasts.add_argument('--holdout', type=float, default=0.2, help="quota finale degli intervalli usata come test set (di default 0.2)")
+    forecasts.add_argument('--horizon', type=positive_int, default=7, help="intervalli da prevedere dopo l'ultimo osservato (di default 7)")
+
+    sketch = commands.add_parser('sketches', parents=[common], help="quantili dello scontrino e dei voti e fatture distinte, con sketch a memoria limitata")
+    sketch.add_argument('--by', nargs='+', default=['City', 'Gender', 'Product line'],
+                        choices=('City', 'Customer type', 'Gender', 'Product line', 'Month'),
+                        help="una tabella per ognuna di queste dimensioni (di default City, Gender e Product line)")
+    sketch.add_argument('--quantiles', type=float, nargs='+', default=[0.5, 0.95], help="quantili da stimare (di default 0.5 0.95)")
+    sketch.add_argument('--relative-error', type=float, default=0.01, help="errore relativo massimo dei quantili (di default 0.01)")
+    sketch.add_argument('--precision', type=int, default=12,
+                        help="registri dell'HyperLogLog come potenza di 2, tra 4 e 16 (di default 12: errore tipico dell'1.6%%)")
+
+    ask = commands.add_parser('query', parents=[common], help="interrogazione ad hoc: raggruppamento, filtri e misure a scelta, dal cubo delle interrogazioni")
+    ask.add_argument('--by', nargs='*', default=[], metavar='COLONNA',
+                     help=f"dimensioni del raggruppamento (dal cubo: {', '.join(QUERY_DIMENSIONS)}; le altre colonne leggono le righe)")
+    ask.add_argument('--measure', nargs='+', default=['Total'], choices=QUERY_MEASURES, help="misure da riportare (di default Total)")
+    ask.add_argument('--how', choices=AGGREGATIONS, help="aggregazione di tutte le misure (di default la somma, la media per Rating)")
+    ask.add_argument('--where', action='append', default=[], metavar='COLONNA=VALORE[,VALORE]',
+                     help="considera solo le vendite con questi valori (ripetibile, es. --where Month=2019-03 --where City=Yangon,Mandalay)")
+    ask.add_argument('--repeat', type=int, default=1, help="ripete l'interrogazione per misurare le risposte dalla cache dei risultati")
+
+    server = commands.add_parser('serve', parents=[common], help="server HTTP locale del report: sezioni come JSON e testo, grafici PNG, interrogazioni")
+    server.add_argument('--host', default='127.0.0.1', help="indirizzo su cui ascoltare (di default solo connessioni locali)")
+    server.add_argument('--port', type=int, default=8765, help="porta del server (di default 8765; 0 = una porta libera)")
+
+    bench = commands.add_parser('benchmark', help="tempo e memoria di ogni stadio su dataset sintetici (es. 10000, 1000000, 10000000 righe)")
+    bench.add_argument('--rows', type=int, nargs='+', default=[10_000], help="righe di vendite dei dataset sintetici (di default 10000)")
+    bench.add_argument('--apple-rows', type=int, help="righe del dataset sintetico delle mele (di default le stesse delle vendite)")
+    bench.add_argument('--seed', type=int, default=42, help="seme della generazione dei dataset (di default 42)")
+    bench.add_argument('--sales-csv', help="CSV delle vendite da cui stimare le distribuzioni (di default quello dello script)")
+    bench.add_argument('--apple-csv', help="CSV delle mele da cui stimare le distribuzioni (di default quello dello script)")
+    bench.add_argument('--data-dir', help="cartella dei dataset generati, riusati tra le esecuzioni (di default 'benchmarks/data')")
+    bench.add_argument('--aggregate-processes', type=int, nargs='+', default=[], metavar='N',
+                       help="misura anche il cubo in parallelo con questi numeri di processi (es. 1 8 32; 0 = uno per core)")
+    bench.add_argument('--partition-by', choices=PARTITION_MODES, default='rows', help="partizionamento dell'aggregazione in parallelo")
+    bench.add_argument('--n-estimators', type=int, default=100, help="alberi della Random Forest (di default 100, come nel report)")
+    bench.add_argument('--output', help="file JSON dei risultati (di default 'benchmarks/results/<data e ora>.json')")
+    bench.add_argument('--compare', metavar='JSON', help="risultati di riferimento con cui confrontare questa esecuzione")
+    bench.add_argument('--tolerance', type=float, default=1.2, help="rapporto di durata oltre il quale uno stadio è una regressione (di default 1.2)")
+    bench.add_argument('--no-memory', dest='memory', action='store_false', help="non misura il picco di memoria allocata (misure di tempo più precise)")
+    return parser
+
+def main(argv=None):
+    """
+    Punto di ingresso dello script: esegue le sezioni richieste e, alla fine, salva i grafici accodati.
+
+    Args:
+        argv (list | None): Gli argomenti della riga di comando (di default quelli del processo).
+
+    Returns:
+        None
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv = ['all'] + argv                                                           # Senza sottocomando vengono eseguite tutte le sezioni.
+    parser = build_parser()
+    options = parser.parse_args(argv)
+    if options.command == 'predict':
+        run_predict(options)
+        return
+    if options.command == 'model-search':
+        run_model_search(options)
+        return
+    if options.command == 'inference-benchmark':
+        run_inference_benchmark(options)
+        return
+    if getattr(options, 'sales_dataset', None):
+        try:
+            dataset_selection(options.sales_dataset, options.city, options.branch, options.month)  # Dal manifest, prima di caricare qualsiasi riga.
+        except (FileNotFoundError, ValueError) as error:                                # Dataset vuoto, mese non valido o nessun file con i filtri.
+            parser.error(str(error))
+    if options.command == 'validate':
+        run_validate(options)
+        return
+    if not getattr(options, 'sales_dataset', None) and any(getattr(options, name, None) for name in ('city', 'branch', 'month')):
+        parser.error("--city, --branch e --month richiedono --sales-dataset")
+    if options.command in ('timeseries', 'forecast'):
+        tracer = build_tracer(options)
+        try:
+            with span(tracer, options.command):
+                run_timeseries(options) if options.command == 'timeseries' else run_forecast(options)
+        except (KeyError, ValueError) as error:                                         # Condizione, colonna o numero di intervalli non validi.
+            parser.error(str(error.args[0] if error.args else error))
+        finish_tracing(options, tracer)
+        return
+    if options.command == 'sketches':
+        if options.chunksize and (options.sales_dataset or options.aggregate_processes is not None):
+            parser.error("--chunksize non si combina con --sales-dataset né con --aggregate-processes")
+        tracer = build_tracer(options)
+        with span(tracer, options.command):
+            run_sketches(options)
+        finish_tracing(options, tracer)
+        return
+    if options.command in ('query', 'serve'):
+        if options.chunksize or options.state_dir:
+            parser.error(f"{options.command} richiede il caricamento completo delle vendite (senza --chunksize né --state-dir)")
+    if options.command == 'serve':
+        run_serve(options)
+        return
+    if options.command == 'query':
+        tracer = build_tracer(options)
+        try:
+            run_query_command(options, tracer)
+        except (KeyError, ValueError) as error:                                         # Colonna, misura, aggregazione o condizione non valida.
+            parser.error(str(error.args[0] if error.args else error))
+        finish_tracing(options, tracer)
+        return
+    if options.command == 'benchmark':
+        run_benchmark(options)
+        return
+    if options.validate and (options.chunksize or options.state_dir):
+        parser.error("--validate richiede il caricamento completo delle vendite (senza --chunksize né --state-dir)")
+    if options.aggregate_processes is not None and (options.chunksize or options.state_dir):
+        parser.error("--aggregate-processes richiede il caricamento completo delle vendite (senza --chunksize né --state-dir)")
+    if options.sales_dataset and (options.chunksize or options.state_dir or options.sales_csv):
+        parser.error("--sales-dataset non si combina con --sales-csv, --chunksize né --state-dir")
+    sections = tuple(SECTION_STAGES) if options.command == 'all' else (options.command,)
+
+    # Calcolo degli stadi necessari: quelli con una voce valida nella cache degli stadi vengono solo riletti
+    cache_dir = None if options.no_stage_cache else default_stage_cache_dir()
+    targets = [SECTION_STAGES[section] for section in sections]
+    validating = options.validate and ('sales' in sections or 'trend' in sections)      # Solo le sezioni delle vendite dipendono dalla validazione.
+    tracer = build_tracer(options)
+    results = run_pipeline(build_stages(options), targets + ['validate_sales'] if validating else targets,
+                           cache_dir=cache_dir, max_bytes=options.stage_cache_mb << 20, tracer=tracer)
+    if validating:
+        report_validation(options, results['validate_sales'])
+
+    chart_jobs = []                                                                     # Grafici da salvare su file alla fine dell'analisi (solo con '--chart-dir')
+    if 'sales' in sections:
+        with span(tracer, 'section:sales', rows=len(results['aggregate'])):
+            run_sales(options, results['aggregate'], chart_jobs)
+    if 'apple-quality' in sections:
+        with span(tracer, 'section:apple-quality', rows=int(results['evaluate']['confusion_matrix'].sum())):
+            run_apple_quality(options, results['evaluate'], chart_jobs)
+    if 'trend' in sections:
+        with span(tracer, 'section:trend', rows=len(results['forecast']['monthly_sales'])):
+            run_trend(options, results['forecast'], chart_jobs)
+
+    # Salvataggio su file dei grafici accodati: rendering senza display, in parallelo, saltando i grafici invariati
+    if options.chart_dir and not options.no_plots:
+        with span(tracer, 'render_charts', rows=len(chart_jobs)):
+            written = render_charts(chart_jobs, options.chart_dir, options.chart_format)  # Restituisce i file effettivamente (ri)scritti.
+        print(f"\nGrafici salvati in {options.chart_dir}: {len(written)} aggiornati, {len(chart_jobs) - len(written)} invariati")
+    finish_tracing(options, tracer)
+
+if __name__ == '__main__':                                                              # Il controllo su __main__ serve anche ai sistemi che avviano i processi del pool con 'spawn'.
+    main()
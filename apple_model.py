@@ -0,0 +1,286 @@
+# ###########################################################################################################
+# Modello della qualità delle mele: salvataggio su disco e previsione a lotti
+# ###########################################################################################################
+#
+# Il classificatore Random Forest viene salvato (con joblib) insieme a tutto ciò che serve per riusarlo:
+# - lo schema delle caratteristiche, nell'ordine in cui il modello le aspetta ('APPLE_FEATURES');
+# - gli iperparametri e la divisione training/test usati per l'addestramento;
+# - l'hash del CSV di addestramento e l'accuratezza misurata sul test set.
+# 'load_or_train' riaddestra il modello solo se il CSV o gli iperparametri sono cambiati; 'predict' carica il
+# modello una sola volta per processo e classifica grandi quantità di record a lotti, come array float32
+# contigui. L'addestramento e la previsione usano tutti i core disponibili (n_jobs=-1). Con engine='compiled' la
+# previsione usa la foresta esportata in array NumPy ('forest_inference.py'): stesse previsioni, latenza molto
+# più bassa per singoli record o piccoli lotti.
+#
+# Il percorso del modello arriva dall'argomento delle funzioni oppure dalla variabile d'ambiente
+# 'ANALYTICS_APPLE_MODEL'; di default è 'models/apple_quality.joblib' accanto a questo file.
+
+import os                                                                               # Per la gestione del file del modello
+import tempfile                                                                         # Per salvare il modello in modo atomico
+import numpy as np                                                                      # NumPy per le matrici delle caratteristiche
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from column_cache import file_fingerprint                                               # Hash del contenuto del CSV di addestramento
+from loaders import (APPLE_CSV_ENV, APPLE_FEATURES, CACHE_DIR_ENV, DATA_DIR,            # Schema e caricamento tipizzato del dataset delle mele
+                     DEFAULT_APPLE_CSV, DEFAULT_CACHE_DIR, load_apple_data, resolve_path)
+
+APPLE_MODEL_ENV = 'ANALYTICS_APPLE_MODEL'                                               # Variabile d'ambiente con il percorso del modello salvato
+DEFAULT_APPLE_MODEL = os.path.join(DATA_DIR, 'models', 'apple_quality.joblib')          # Percorso predefinito del modello salvato
+MODEL_FORMAT_VERSION = 1                                                                # Da incrementare se cambia il contenuto del file del modello
+DEFAULT_PARAMS = {'n_estimators': 100, 'random_state': 42}                              # Iperparametri del classificatore, come nel report
+DEFAULT_SPLIT = {'test_size': 0.3, 'random_state': 42}                                  # Divisione training/test, come nel report
+DEFAULT_BATCH_SIZE = 100_000                                                            # Record classificati per ogni lotto: limita la memoria temporanea
+RECORD_EXTRAS = ('A_id', 'Quality')                                                     # Colonne dei record conservate oltre alle caratteristiche
+ENGINES = ('sklearn', 'compiled')                                                       # Modalità di inferenza: scikit-learn o foresta compilata
+
+_loaded_models = {}                                                                     # Modelli già caricati in questo processo: (percorso, data di modifica) -> modello
+_compiled_forests = {}                                                                  # Foreste compilate dei modelli caricati: (percorso, data di modifica) -> foresta
+
+def records_to_array(records, features=APPLE_FEATURES):
+    """
+    Converte i record da classificare in una matrice float32 contigua, con le colonne nell'ordine dello schema.
+
+    Args:
+        records (pd.DataFrame | np.ndarray): I record, con almeno le colonne dello schema (le altre sono ignorate),
+            oppure già una matrice con una colonna per caratteristica.
+        features (list): Lo schema delle caratteristiche del modello.
+
+    Returns:
+        np.ndarray: La matrice (righe x caratteristiche) in float32.
+
+    Raises:
+        KeyError: Se mancano colonne dello schema.
+        ValueError: Se la matrice non ha una colonna per caratteristica.
+    """
+    if isinstance(records, pd.DataFrame):
+        missing = [feature for feature in features if feature not in records.columns]
+        if missing:
+            raise KeyError(f"Colonne mancanti nei record da classificare: {', '.join(missing)}")
+        records = records[features].to_numpy(dtype=np.float32)                          # Riordina le colonne secondo lo schema.
+    values = np.ascontiguousarray(records, dtype=np.float32)
+    if values.ndim != 2 or values.shape[1] != len(features):
+        raise ValueError(f"Attese {len(features)} caratteristiche per record ({', '.join(features)}), ricevuta una matrice {values.shape}")
+    return values
+
+def clean_records(records, features=APPLE_FEATURES):
+    """
+    Prepara un blocco di record da classificare: caratteristiche numeriche in float32, righe incomplete scartate.
+
+    I valori non numerici diventano mancanti (come la riga di testo finale di 'apple_quality.csv'), come in
+    'load_apple_data'; le colonne diverse dalle caratteristiche, da 'A_id' e dall'etichetta 'Quality' (usata per
+    valutare le previsioni) vengono ignorate.
+
+    Args:
+        records (pd.DataFrame): I record letti dal CSV.
+        features (list): Lo schema delle caratteristiche del modello.
+
+    Returns:
+        pd.DataFrame: I record completi, con le caratteristiche in float32 (e 'A_id' e 'Quality', se presenti).
+    """
+    records = records[[column for column in records.columns if column in features or column in RECORD_EXTRAS]]
+    records = records.apply(lambda column: column if column.dtype.kind in 'fi' or column.name == 'Quality'
+                            else pd.to_numeric(column, errors='coerce'))                 # Converte solo le colonne numeriche con testo.
+    records = records.dropna()
+    records = records.astype({feature: 'float32' for feature in features})
+    if 'A_id' in records.columns:
+        records = records.astype({'A_id': 'int64'})
+    return records.reset_index(drop=True)
+
+def read_records(path, features=APPLE_FEATURES):
+    """
+    Legge un CSV di mele da classificare: le caratteristiche dello schema ed eventualmente 'A_id' e 'Quality'.
+
+    Args:
+        path (str): Il percorso del CSV.
+        features (list): Lo schema delle caratteristiche del modello.
+
+    Returns:
+        pd.DataFrame: I record completi (vedi 'clean_records').
+    """
+    return clean_records(pd.read_csv(path, usecols=lambda column: column in features or column in RECORD_EXTRAS), features)
+
+def train_model(data_path=None, params=None, split=None):
+    """
+    Addestra il classificatore della qualità delle mele e ne prepara il pacchetto da salvare.
+
+    Args:
+        data_path (str | None): Il CSV di addestramento; se assente si usa la variabile d'ambiente o il file predefinito.
+        params (dict | None): Gli iperparametri di RandomForestClassifier (di default 'DEFAULT_PARAMS').
+        split (dict | None): 'test_size' e 'random_state' della divisione training/test (di default 'DEFAULT_SPLIT').
+
+    Returns:
+        dict: Il modello addestrato con schema, iperparametri, hash dei dati e accuratezza sul test set.
+    """
+    from sklearn import __version__ as sklearn_version                                  # Versione di scikit-learn, salvata con il modello
+    from sklearn.ensemble import RandomForestClassifier                                 # Classificatore Random Forest per problemi di classificazione
+    from sklearn.model_selection import train_test_split                                # Funzione per suddividere il dataset in training set e test set
+
+    data_path = resolve_path(data_path, APPLE_CSV_ENV, DEFAULT_APPLE_CSV)
+    params = dict(DEFAULT_PARAMS if params is None else params)
+    split = dict(DEFAULT_SPLIT if split is None else split)
+    apple_data = load_apple_data(data_path)
+
+    X = records_to_array(apple_data)                                                    # Solo le caratteristiche dello schema, senza l'identificativo 'A_id'.
+    y = apple_data['Quality'].to_numpy(dtype=str)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, **split)
+
+    model = RandomForestClassifier(**params, n_jobs=-1)                                 # Alberi addestrati in parallelo su tutti i core.
+    model.fit(X_train, y_train)
+    return {
+        'format_version': MODEL_FORMAT_VERSION,
+        'model': model,
+        'features': list(APPLE_FEATURES),
+        'params': params,
+        'split': split,
+        'data_fingerprint': _data_fingerprint(data_path),
+        'accuracy': float((model.predict(X_test) == y_test).mean()),
+        'sklearn_version': sklearn_version,
+    }
+
+def save_model(bundle, path=None):
+    """
+    Salva il pacchetto del modello in modo atomico (prima su un file temporaneo, poi con una rinomina).
+
+    Args:
+        bundle (dict): Il pacchetto prodotto da 'train_model'.
+        path (str | None): Il file di destinazione; se assente si usa la variabile d'ambiente o il percorso predefinito.
+
+    Returns:
+        str: Il percorso del file salvato.
+    """
+    import joblib                                                                       # Serializzazione efficiente dei modelli di scikit-learn
+
+    path = resolve_path(path, APPLE_MODEL_ENV, DEFAULT_APPLE_MODEL)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handle, staging = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-', suffix='.joblib')
+    os.close(handle)
+    joblib.dump(bundle, staging)
+    os.replace(staging, path)
+    return path
+
+def load_model(path=None):
+    """
+    Carica il pacchetto del modello, una sola volta per processo finché il file non cambia.
+
+    Args:
+        path (str | None): Il file del modello; se assente si usa la variabile d'ambiente o il percorso predefinito.
+
+    Returns:
+        dict: Il pacchetto del modello.
+
+    Raises:
+        FileNotFoundError: Se il modello non è ancora stato salvato.
+    """
+    import joblib                                                                       # Serializzazione efficiente dei modelli di scikit-learn
+
+    path = os.path.abspath(resolve_path(path, APPLE_MODEL_ENV, DEFAULT_APPLE_MODEL))
+    signature = (path, os.stat(path).st_mtime_ns)
+    if signature not in _loaded_models:
+        _loaded_models.clear()                                                          # Tiene in memoria solo la versione corrente del modello.
+        _compiled_forests.clear()
+        _loaded_models[signature] = joblib.load(path)
+    return _loaded_models[signature]
+
+def load_compiled_forest(path=None):
+    """
+    Restituisce la foresta compilata del modello salvato, esportata una sola volta per processo finché il file non cambia.
+
+    Args:
+        path (str | None): Il file del modello; se assente si usa la variabile d'ambiente o il percorso predefinito.
+
+    Returns:
+        dict: La foresta compilata (vedi 'forest_inference.compile_forest').
+    """
+    from forest_inference import compile_forest                                         # Alberi esportati in array NumPy piatti
+
+    bundle = load_model(path)
+    signature = next(key for key, value in _loaded_models.items() if value is bundle)
+    if signature not in _compiled_forests:
+        _compiled_forests[signature] = compile_forest(bundle['model'])
+    return _compiled_forests[signature]
+
+def is_current(bundle, data_path=None, params=None, split=None):
+    """
+    Verifica se un modello salvato corrisponde ancora ai dati e agli iperparametri richiesti.
+
+    Args:
+        bundle (dict): Il pacchetto del modello.
+        data_path (str | None): Il CSV di addestramento; se assente si usa la variabile d'ambiente o il file predefinito.
+        params (dict | None): Gli iperparametri richiesti (di default 'DEFAULT_PARAMS').
+        split (dict | None): La divisione training/test richiesta (di default 'DEFAULT_SPLIT').
+
+    Returns:
+        bool: True se il modello può essere riusato senza riaddestrarlo.
+    """
+    data_path = resolve_path(data_path, APPLE_CSV_ENV, DEFAULT_APPLE_CSV)
+    return (bundle.get('format_version') == MODEL_FORMAT_VERSION
+            and bundle['features'] == list(APPLE_FEATURES)
+            and bundle['params'] == dict(DEFAULT_PARAMS if params is None else params)
+            and bundle['split'] == dict(DEFAULT_SPLIT if split is None else split)
+            and bundle['data_fingerprint'] == _data_fingerprint(data_path))
+
+def load_or_train(data_path=None, path=None, params=None, split=None):
+    """
+    Restituisce il modello salvato se è ancora valido, altrimenti lo riaddestra e lo salva.
+
+    Args:
+        data_path (str | None): Il CSV di addestramento; se assente si usa la variabile d'ambiente o il file predefinito.
+        path (str | None): Il file del modello; se assente si usa la variabile d'ambiente o il percorso predefinito.
+        params (dict | None): Gli iperparametri richiesti (di default 'DEFAULT_PARAMS').
+        split (dict | None): La divisione training/test richiesta (di default 'DEFAULT_SPLIT').
+
+    Returns:
+        tuple: (pacchetto del modello, True se è stato riaddestrato).
+    """
+    path = resolve_path(path, APPLE_MODEL_ENV, DEFAULT_APPLE_MODEL)
+    if os.path.exists(path):
+        bundle = load_model(path)
+        if is_current(bundle, data_path, params, split):
+            return bundle, False                                                        # Stessi dati e stessi iperparametri: niente riaddestramento.
+    bundle = train_model(data_path, params, split)
+    save_model(bundle, path)
+    return bundle, True
+
+def predict(records, path=None, batch_size=DEFAULT_BATCH_SIZE, engine='sklearn'):
+    """
+    Classifica la qualità di un insieme di mele con il modello salvato, a lotti di dimensione fissa.
+
+    Args:
+        records (pd.DataFrame | np.ndarray): I record da classificare (vedi 'records_to_array').
+        path (str | None): Il file del modello; se assente si usa la variabile d'ambiente o il percorso predefinito.
+        batch_size (int): Il numero di record classificati per ogni lotto.
+        engine (str): 'sklearn' oppure 'compiled' (la foresta esportata, più rapida su pochi record).
+
+    Returns:
+        np.ndarray: La qualità prevista per ogni record ('good' o 'bad').
+
+    Raises:
+        ValueError: Se la modalità di inferenza non è tra 'ENGINES'.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Modalità di inferenza sconosciuta: {engine} (attese: {', '.join(ENGINES)})")
+    bundle = load_model(path)
+    values = records_to_array(records, bundle['features'])
+    model = bundle['model']
+    if engine == 'compiled':
+        from forest_inference import predict as predict_compiled                        # Inferenza vettorizzata sugli array dei nodi
+
+        forest = load_compiled_forest(path)
+        run = lambda batch: predict_compiled(forest, batch)
+    else:
+        run = model.predict
+    predictions = np.empty(len(values), dtype=model.classes_.dtype)
+    for start in range(0, len(values), batch_size):                                     # Memoria temporanea limitata alla dimensione di un lotto.
+        predictions[start:start + batch_size] = run(values[start:start + batch_size])
+    return predictions
+
+def _data_fingerprint(data_path):
+    """
+    Calcola l'hash del CSV di addestramento, riusando l'indice degli hash della cache colonnare.
+
+    Args:
+        data_path (str): Il CSV di addestramento.
+
+    Returns:
+        str: L'hash esadecimale del contenuto del file.
+    """
+    return file_fingerprint(data_path, resolve_path(None, CACHE_DIR_ENV, DEFAULT_CACHE_DIR))
@@ -0,0 +1,323 @@
+# ###########################################################################################################
+# Benchmark dell'analisi: dataset sintetici in scala e misura di tempo e memoria di ogni stadio
+# ###########################################################################################################
+#
+# I CSV distribuiti con lo script hanno 1.000 vendite e 4.000 mele: troppo pochi per capire come l'analisi
+# cresce con i dati. Qui si generano dataset sintetici statisticamente simili, di qualunque dimensione:
+# - vendite: le combinazioni delle dimensioni (città, filiale, tipo di cliente, genere, categoria, pagamento)
+#   vengono ricampionate dalle righe originali, quindi le distribuzioni congiunte delle categorie restano le
+#   stesse; prezzo, quantità e valutazione seguono le distribuzioni empiriche, data e ora cadono nello stesso
+#   periodo e nelle stesse ore di apertura, e 'cogs', 'Tax 5%', 'Total' e 'gross income' sono coerenti tra loro;
+# - mele: per ogni qualità una normale multivariata con media e covarianza stimate dal CSV originale, nella
+#   proporzione originale delle due classi.
+# I file vengono scritti a blocchi (anche 10 milioni di righe non stanno mai tutte in memoria durante la
+# generazione) e riusati dalle esecuzioni successive con la stessa dimensione e lo stesso seme.
+#
+# 'measure' esegue uno stadio e ne registra la durata e il picco di memoria allocata (tracemalloc, che vede
+# anche gli array di NumPy e Pandas), oltre al picco di memoria residente del processo. I risultati vengono
+# salvati in JSON insieme alle versioni delle librerie, così due versioni dello script si confrontano con
+# 'compare_results'.
+
+import json                                                                             # Per salvare e rileggere i risultati del benchmark
+import os                                                                               # Per i percorsi dei dataset e dei risultati
+import platform                                                                         # Per descrivere la macchina nei risultati
+import time                                                                             # Per misurare la durata degli stadi
+import tracemalloc                                                                      # Per il picco di memoria allocata da ogni stadio
+from datetime import datetime                                                           # Per la data dell'esecuzione nei risultati
+import numpy as np                                                                      # NumPy per la generazione vettorizzata dei dati
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from loaders import APPLE_FEATURES, DATA_DIR, SALES_DATE_FORMAT, SALES_TIME_FORMAT, parse_apple_csv  # Schema dei CSV originali
+from instrumentation import peak_rss_mb                                                 # Picco di memoria residente del processo
+
+BENCHMARK_SIZES = (10_000, 1_000_000, 10_000_000)                                       # Dimensioni di riferimento dei dataset sintetici
+BENCHMARK_DIR = os.path.join(DATA_DIR, 'benchmarks')                                    # Cartella dei dataset generati e dei risultati
+GENERATE_BLOCK_ROWS = 500_000                                                           # Righe generate e scritte per ogni blocco
+SALES_DIMENSIONS = ['Branch', 'City', 'Customer type', 'Gender', 'Product line', 'Payment']  # Ricampionate insieme dalle righe originali
+SALES_TAX_RATE = 0.05                                                                   # 'Tax 5%' = 5% di 'cogs'
+INVOICE_MULTIPLIER = 387_420_489                                                        # Dispari e non multiplo di 5: permuta i numeri da 0 a 10^9 - 1
+REGRESSION_TOLERANCE = 1.2                                                              # Rapporto di durata oltre il quale uno stadio è segnalato come regressione
+
+def dataset_path(kind, rows, seed, data_dir=None):
+    """
+    Restituisce il percorso del dataset sintetico di un tipo, una dimensione e un seme.
+
+    Args:
+        kind (str): 'sales' oppure 'apple'.
+        rows (int): Il numero di righe.
+        seed (int): Il seme della generazione.
+        data_dir (str | None): La cartella dei dataset (di default 'benchmarks/data' accanto allo script).
+
+    Returns:
+        str: Il percorso del CSV.
+    """
+    return os.path.join(data_dir or os.path.join(BENCHMARK_DIR, 'data'), f'{kind}_{rows}_{seed}.csv')
+
+def _invoice_ids(numbers):
+    """
+    Formatta numeri distinti come identificativi di fattura 'ddd-dd-dddd', in ordine apparentemente casuale.
+
+    Args:
+        numbers (np.ndarray): Numeri interi distinti tra 1 e 10^9 - 1.
+
+    Returns:
+        pd.Series: Gli identificativi, distinti come i numeri di partenza.
+    """
+    digits = pd.Series(np.char.mod('%09d', numbers * INVOICE_MULTIPLIER % 10 ** 9))     # Una permutazione: numeri distinti restano distinti.
+    return digits.str[:3] + '-' + digits.str[3:5] + '-' + digits.str[5:]
+
+def generate_sales(source_path, rows, path, seed=42, block_rows=GENERATE_BLOCK_ROWS):
+    """
+    Genera un CSV di vendite sintetiche con le stesse colonne e distribuzioni del CSV originale.
+
+    Args:
+        source_path (str): Il CSV delle vendite originale.
+        rows (int): Il numero di righe da generare.
+        path (str): Il CSV da scrivere.
+        seed (int): Il seme che rende la generazione riproducibile.
+        block_rows (int): Le righe generate e scritte per ogni blocco.
+
+    Returns:
+        str: Il percorso del CSV scritto.
+    """
+    source = pd.read_csv(source_path, dtype={'Invoice ID': str, 'Date': str, 'Time': str})
+    rng = np.random.default_rng(seed)
+    prices = source['Unit price'].to_numpy()
+    quantities = source['Quantity'].to_numpy()
+    ratings = source['Rating'].to_numpy()
+    dates = pd.to_datetime(source['Date'], format=SALES_DATE_FORMAT)
+    days = pd.date_range(dates.min(), dates.max(), freq='D')
+    day_labels = np.array([f'{day.month}/{day.day}/{day.year}' for day in days])       # Stesso formato dell'originale (es. 1/5/2019).
+    minutes = pd.to_datetime(source['Time'], format=SALES_TIME_FORMAT)
+    first, last = (minutes.dt.hour * 60 + minutes.dt.minute).agg(['min', 'max'])
+    time_labels = np.array([f'{minute // 60:02d}:{minute % 60:02d}' for minute in range(first, last + 1)])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = path + '.partial'                                                         # Un file interrotto non viene mai scambiato per un dataset completo.
+    with open(partial, 'w', encoding='utf-8', newline='') as handle:
+        for start in range(0, rows, block_rows):
+            n = min(block_rows, rows - start)
+            block = source[SALES_DIMENSIONS].iloc[rng.integers(0, len(source), n)].reset_index(drop=True)  # Combinazioni di categorie dell'originale.
+            unit_price = np.clip(prices[rng.integers(0, len(prices), n)] + rng.normal(0, 0.5, n), prices.min(), prices.max()).round(2)
+            quantity = quantities[rng.integers(0, len(quantities), n)]
+            cogs = (unit_price * quantity).round(2)
+            tax = (cogs * SALES_TAX_RATE).round(4)
+            block['Invoice ID'] = _invoice_ids(np.arange(start, start + n) + 1)
+            block['Unit price'] = unit_price
+            block['Quantity'] = quantity
+            block['Tax 5%'] = tax
+            block['Total'] = (cogs + tax).round(4)
+            block['Date'] = day_labels[rng.integers(0, len(day_labels), n)]
+            block['Time'] = time_labels[rng.integers(0, len(time_labels), n)]
+            block['cogs'] = cogs
+            block['gross margin percentage'] = source['gross margin percentage'].iloc[0]
+            block['gross income'] = tax
+            block['Rating'] = np.clip(ratings[rng.integers(0, len(ratings), n)] + rng.normal(0, 0.1, n), ratings.min(), ratings.max()).round(1)
+            block[source.columns].to_csv(handle, header=start == 0, index=False)             # Stesso ordine delle colonne dell'originale.
+    os.replace(partial, path)
+    return path
+
+def generate_apples(source_path, rows, path, seed=42, block_rows=GENERATE_BLOCK_ROWS):
+    """
+    Genera un CSV di mele sintetiche: una normale multivariata per qualità, stimata dal CSV originale.
+
+    Args:
+        source_path (str): Il CSV delle mele originale.
+        rows (int): Il numero di righe da generare.
+        path (str): Il CSV da scrivere.
+        seed (int): Il seme che rende la generazione riproducibile.
+        block_rows (int): Le righe generate e scritte per ogni blocco.
+
+    Returns:
+        str: Il percorso del CSV scritto.
+    """
+    source = parse_apple_csv(source_path)
+    rng = np.random.default_rng(seed)
+    classes = source['Quality'].astype(str)
+    labels = np.array(sorted(classes.unique()))
+    shares = classes.value_counts(normalize=True).reindex(labels).to_numpy()
+    features = source[APPLE_FEATURES].to_numpy(dtype=np.float64)
+    moments = [(features[classes == label].mean(axis=0), np.cov(features[classes == label], rowvar=False)) for label in labels]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = path + '.partial'
+    with open(partial, 'w', encoding='utf-8', newline='') as handle:
+        for start in range(0, rows, block_rows):
+            n = min(block_rows, rows - start)
+            quality = rng.choice(len(labels), size=n, p=shares)
+            values = np.empty((n, len(APPLE_FEATURES)))
+            for code, (mean, covariance) in enumerate(moments):
+                chosen = quality == code
+                values[chosen] = rng.multivariate_normal(mean, covariance, size=int(chosen.sum()))
+            block = pd.DataFrame(values, columns=APPLE_FEATURES)
+            block.insert(0, 'A_id', np.arange(start, start + n))
+            block['Quality'] = labels[quality]
+            block.to_csv(handle, header=start == 0, index=False, float_format='%.9f')
+    os.replace(partial, path)
+    return path
+
+def ensure_dataset(kind, source_path, rows, seed=42, data_dir=None):
+    """
+    Restituisce il percorso di un dataset sintetico, generandolo solo se non esiste già.
+
+    Args:
+        kind (str): 'sales' oppure 'apple'.
+        source_path (str): Il CSV originale da cui stimare le distribuzioni.
+        rows (int): Il numero di righe.
+        seed (int): Il seme della generazione.
+        data_dir (str | None): La cartella dei dataset.
+
+    Returns:
+        str: Il percorso del CSV.
+
+    Raises:
+        ValueError: Se il tipo di dataset non è supportato.
+    """
+    generators = {'sales': generate_sales, 'apple': generate_apples}
+    if kind not in generators:
+        raise ValueError(f"Tipo di dataset non supportato: {kind} (disponibili: {', '.join(generators)})")
+    path = dataset_path(kind, rows, seed, data_dir)
+    if not os.path.exists(path):
+        generators[kind](source_path, rows, path, seed)
+    return path
+
+def new_timer(memory=True):
+    """
+    Crea lo stato di una serie di misure; con 'memory' avvia tracemalloc per i picchi di memoria.
+
+    Args:
+        memory (bool): Se True misura il picco di memoria allocata da ogni stadio (rallenta un po' gli stadi).
+
+    Returns:
+        dict: Il flag della memoria ('memory') e le misure registrate ('stages').
+    """
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return {'memory': memory, 'stages': []}
+
+def measure(timer, stage, func, *args, **kwargs):
+    """
+    Esegue uno stadio e ne registra durata e picco di memoria.
+
+    Args:
+        timer (dict): Lo stato delle misure (vedi 'new_timer').
+        stage (str): Il nome dello stadio nei risultati.
+        func (callable): La funzione dello stadio.
+        *args, **kwargs: Gli argomenti della funzione.
+
+    Returns:
+        Il risultato della funzione.
+    """
+    if timer['memory']:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    entry = {'stage': stage, 'seconds': seconds, 'peak_mb': None, 'rss_peak_mb': peak_rss_mb()}
+    if timer['memory']:
+        entry['peak_mb'] = (tracemalloc.get_traced_memory()[1] - before) / 2 ** 20    # Memoria in più rispetto all'inizio dello stadio.
+    timer['stages'].append(entry)
+    return result
+
+def stop_timer(timer):
+    """
+    Chiude una serie di misure, fermando tracemalloc se era stato avviato.
+
+    Args:
+        timer (dict): Lo stato delle misure.
+
+    Returns:
+        list: Le misure registrate, una per stadio.
+    """
+    if timer['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return timer['stages']
+
+def environment():
+    """
+    Descrive la macchina e le versioni delle librerie, per interpretare i risultati di versioni diverse.
+
+    Returns:
+        dict: Python, piattaforma, numero di CPU e versioni delle librerie importabili.
+    """
+    versions = {}
+    for package in ('numpy', 'pandas', 'sklearn', 'matplotlib', 'seaborn'):
+        try:
+            versions[package] = __import__(package).__version__
+        except ImportError:
+            versions[package] = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'packages': versions}
+
+def default_results_path():
+    """
+    Restituisce il percorso predefinito dei risultati, con la data e l'ora dell'esecuzione.
+
+    Returns:
+        str: Es. 'benchmarks/results/20241017-153000.json'.
+    """
+    return os.path.join(BENCHMARK_DIR, 'results', f'{datetime.now():%Y%m%d-%H%M%S}.json')
+
+def save_results(results, path):
+    """
+    Salva i risultati del benchmark in JSON.
+
+    Args:
+        results (dict): I risultati (ambiente e misure per dimensione).
+        path (str): Il file da scrivere.
+
+    Returns:
+        str: Il percorso del file scritto.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(results, handle, indent=1)
+    return path
+
+def load_results(path):
+    """
+    Rilegge i risultati di un benchmark salvato.
+
+    Args:
+        path (str): Il file JSON.
+
+    Returns:
+        dict: I risultati.
+    """
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+def results_frame(results):
+    """
+    Appiattisce i risultati in una tabella: una riga per dimensione e stadio.
+
+    Args:
+        results (dict): I risultati del benchmark.
+
+    Returns:
+        pd.DataFrame: 'rows', 'stage', 'seconds', 'peak_mb' e 'rss_peak_mb'.
+    """
+    frames = [pd.DataFrame(run['stages']).assign(rows=run['rows']) for run in results['runs']]
+    if not frames:
+        return pd.DataFrame(columns=['rows', 'stage', 'seconds', 'peak_mb', 'rss_peak_mb'])
+    return pd.concat(frames, ignore_index=True)[['rows', 'stage', 'seconds', 'peak_mb', 'rss_peak_mb']]
+
+def compare_results(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Confronta due esecuzioni del benchmark stadio per stadio, alle dimensioni misurate da entrambe.
+
+    Args:
+        current (dict): I risultati della versione da valutare.
+        baseline (dict): I risultati della versione di riferimento.
+        tolerance (float): Il rapporto di durata oltre il quale uno stadio è una regressione.
+
+    Returns:
+        pd.DataFrame: Per ogni dimensione e stadio, durata e picco di memoria delle due esecuzioni, i rapporti
+            (attuale / riferimento) e se lo stadio è più lento della tolleranza ('regression').
+    """
+    columns = ['rows', 'stage', 'seconds', 'peak_mb']
+    merged = results_frame(current)[columns].merge(results_frame(baseline)[columns], on=['rows', 'stage'],
+                                                   suffixes=('', '_baseline'))
+    merged['time_ratio'] = merged['seconds'] / merged['seconds_baseline']
+    merged['memory_ratio'] = merged['peak_mb'].astype(float) / merged['peak_mb_baseline'].astype(float)
+    merged['regression'] = merged['time_ratio'] > tolerance
+    return merged
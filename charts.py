@@ -0,0 +1,322 @@
+# ###########################################################################################################
+# Grafici del report: descrizione dichiarativa e rendering su file in parallelo
+# ###########################################################################################################
+#
+# Ogni grafico del report è descritto da un "job": un dizionario con il tipo di grafico ('barh', 'heatmap' o
+# 'line'), il nome del file, i dati già aggregati e le opzioni di stile (titolo, etichette, palette, legenda...).
+# Gli stessi job possono essere:
+# - mostrati a video uno alla volta con 'show_chart' (il comportamento originale dello script, con plt.show());
+# - salvati su file con 'render_charts', senza display (backend Agg) e in parallelo su un pool di processi.
+#   Ogni figura viene chiusa subito dopo il salvataggio e i grafici con dati e stile invariati rispetto
+#   all'esecuzione precedente vengono saltati, confrontando l'impronta del job con quella nel manifest.
+#
+# Il tipo 'facet_barh' disegna dei "small multiples": un pannello per ogni valore di una colonna (es. una
+# categoria di prodotto) nella stessa figura, con assi condivisi. Le etichette delle barre vengono aggiunte
+# con una sola chiamata 'bar_label' per ogni gruppo di barre, invece di un 'annotate' per ogni barra, quindi
+# il tempo di disegno resta quasi costante al crescere di città e categorie.
+
+import hashlib                                                                          # Per l'impronta di dati e stile di ogni grafico
+import json                                                                             # Per il manifest dei grafici già renderizzati
+import os                                                                               # Per la gestione dei file di uscita
+import re                                                                               # Per ricavare nomi di file validi
+from concurrent.futures import ProcessPoolExecutor                                      # Pool di processi per il rendering in parallelo
+import numpy as np                                                                      # NumPy per le posizioni delle barre dei pannelli
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from report_format import format_thousands                                              # Formattazione vettorizzata con il punto come separatore delle migliaia
+
+CHART_FORMATS = ('png', 'svg')                                                          # Formati di file supportati
+CHART_STYLE_VERSION = 2                                                                 # Da incrementare quando cambia il codice di disegno: invalida il manifest
+MANIFEST_FILE = 'charts.json'                                                           # Manifest con l'impronta di ogni grafico già salvato
+
+def thousand_separator_for_plot(x, pos):                                                # Funzione per formattare i numeri per gli assi dei grafici
+    """
+    Formatta un numero per l'asse di un grafico con il punto come separatore delle migliaia.
+
+    Args:
+        x: Il numero da formattare.
+        pos (int): La posizione dell'etichetta sull'asse (richiesta da matplotlib, ma non usata direttamente).
+
+    Returns:
+        str: Il numero formattato con il punto come separatore delle migliaia.
+    """
+    return f'{int(x):,}'.replace(',', '.')                                              # Formatta il numero con il punto come separatore delle migliaia per i grafici.
+
+def etichetta(ax):                                                                      # Funzione per formattare l'etichetta dei grafici a barre
+    """
+    Aggiunge etichette su ciascuna barra di un grafico a barre.
+    Per ogni gruppo di barre (un gruppo per colore) formatta tutti i valori in un colpo solo, con il punto come
+    separatore delle migliaia, e li aggiunge con una sola chiamata a 'bar_label' alla fine delle barre.
+
+    Args:
+        ax: Gli assi del grafico a barre.
+
+    Returns:
+        None
+    """
+    for container in ax.containers:
+        values = pd.Series(container.datavalues, dtype='float64')
+        labels = format_thousands(values.fillna(0)).where(values.notna(), '')          # Le barre mancanti (NaN) restano senza etichetta.
+        ax.bar_label(container, labels=labels.tolist(), padding=3,                      # Un'unica operazione per tutte le barre del gruppo.
+                     color='black', fontsize=10, fontweight='bold')                     # Stile del testo dell'etichetta.
+
+def chart_filename(name, fmt):
+    """
+    Ricava un nome di file valido dal nome di un grafico.
+
+    Args:
+        name (str): Il nome del grafico (es. 'vendite_citta_genere_Health and beauty').
+        fmt (str): Il formato del file ('png' o 'svg').
+
+    Returns:
+        str: Il nome del file (es. 'vendite_citta_genere_health_and_beauty.png').
+    """
+    return re.sub(r'[^0-9a-z]+', '_', name.lower()).strip('_') + '.' + fmt
+
+def chart_fingerprint(job, fmt):
+    """
+    Calcola l'impronta di un grafico a partire dai suoi dati e dal suo stile.
+
+    Args:
+        job (dict): La descrizione del grafico.
+        fmt (str): Il formato del file.
+
+    Returns:
+        str: L'hash esadecimale di dati, opzioni di stile, formato e versione del codice di disegno.
+    """
+    digest = hashlib.sha256()
+    data = job['data']
+    if isinstance(data, pd.DataFrame):
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())  # Hash vettorizzato di tutte le righe.
+        digest.update(repr(list(data.columns)).encode())
+    else:
+        digest.update(repr(data).encode())
+    style = {key: value for key, value in job.items() if key != 'data'}
+    digest.update(repr(sorted(style.items())).encode())
+    digest.update(f'{fmt}-{CHART_STYLE_VERSION}'.encode())
+    return digest.hexdigest()
+
+def _draw_barh(ax, job):
+    """
+    Disegna un grafico a barre orizzontali con Seaborn, con etichette sulle barre e separatore delle migliaia.
+
+    Args:
+        ax: Gli assi su cui disegnare.
+        job (dict): La descrizione del grafico ('x', 'y', 'hue', 'palette', 'dodge', 'legend').
+
+    Returns:
+        None
+    """
+    import seaborn as sns                                                               # Seaborn per la visualizzazione avanzata dei dati
+    from matplotlib.ticker import FuncFormatter                                         # FuncFormatter per formattare gli assi dei grafici
+
+    data = job['data']
+    categorical = [column for column in data.columns if isinstance(data[column].dtype, pd.CategoricalDtype)]
+    data = data.astype({column: str for column in categorical})                         # Le barre seguono l'ordine delle righe, non quello delle categorie.
+    legend = job.get('legend')
+    sns.barplot(data=data, x=job['x'], y=job['y'], hue=job.get('hue'), palette=job.get('palette'),
+                dodge=job.get('dodge', 'auto'), legend='auto' if legend is not False else False, ax=ax)
+    etichetta(ax)                                                                       # Etichette con il valore di ogni barra.
+    ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))            # Separatore delle migliaia sull'asse X.
+    if legend:
+        ax.legend(**legend)                                                             # Legenda con titolo e posizione richiesti.
+
+def _draw_heatmap(ax, job):
+    """
+    Disegna una mappa di calore annotata (es. la matrice di confusione).
+
+    Args:
+        ax: Gli assi su cui disegnare.
+        job (dict): La descrizione del grafico ('data' è un DataFrame con etichette di righe e colonne, 'cmap';
+            facoltativi 'annot' e 'fmt' per i valori scritti nelle celle, di default interi).
+
+    Returns:
+        None
+    """
+    import seaborn as sns                                                               # Seaborn per la visualizzazione avanzata dei dati
+
+    sns.heatmap(job['data'], annot=job.get('annot', True), fmt=job.get('fmt', 'd'), cmap=job.get('cmap', 'Blues'), ax=ax)
+
+def _draw_line(ax, job):
+    """
+    Disegna un grafico a linea con marcatori ed etichette in grassetto sopra ogni punto.
+
+    Args:
+        ax: Gli assi su cui disegnare.
+        job (dict): La descrizione del grafico ('x', 'y', 'label', 'color').
+
+    Returns:
+        None
+    """
+    from matplotlib.ticker import FuncFormatter                                         # FuncFormatter per formattare gli assi dei grafici
+
+    data = job['data']
+    ax.plot(data[job['x']], data[job['y']], marker='o', label=job.get('label'), color=job.get('color', 'blue'), linestyle='-')
+    ax.tick_params(axis='x', labelrotation=45)                                          # Ruota le etichette dell'asse X.
+    ax.yaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))            # Separatore delle migliaia sull'asse Y.
+    ax.legend()
+    ax.grid()
+    for x, y in zip(data[job['x']], data[job['y']]):                                    # Etichetta sopra ogni punto, leggermente spostata verso il basso.
+        ax.text(x, y - y * 0.01, thousand_separator_for_plot(y, None), ha='center', va='bottom', fontsize=9, fontweight='bold')
+
+def _draw_small_multiples(job):
+    """
+    Disegna un grafico a barre orizzontali per ogni valore della colonna 'facet', tutti nella stessa figura.
+
+    I dati vengono ridisposti una sola volta in una tabella (pannello, categoria, colore); ogni pannello disegna
+    un gruppo di barre per colore con Matplotlib, con assi X e Y condivisi e una sola legenda per la figura.
+
+    Args:
+        job (dict): La descrizione del grafico ('facet', 'x', 'y', 'hue', 'palette', 'columns', 'legend').
+
+    Returns:
+        matplotlib.figure.Figure: La figura con tutti i pannelli.
+    """
+    import matplotlib.pyplot as plt                                                     # Matplotlib per la creazione di grafici
+    import seaborn as sns                                                               # Seaborn per la tavolozza dei colori
+    from matplotlib.ticker import FuncFormatter                                         # FuncFormatter per formattare gli assi dei grafici
+
+    data = job['data']
+    facet, x, y, hue = job['facet'], job['x'], job['y'], job['hue']
+    table = data.pivot_table(index=[facet, y], columns=hue, values=x,                   # Un solo rimodellamento per tutti i pannelli.
+                             aggfunc='sum', observed=True)
+    panels = table.index.get_level_values(facet).unique()
+    categories = table.index.get_level_values(y).unique()
+    table = table.reindex(pd.MultiIndex.from_product([panels, categories]))             # Stesse categorie (e stesse posizioni) in ogni pannello.
+    colors = sns.color_palette(job.get('palette'), len(table.columns))
+
+    columns = min(job.get('columns', 3), len(panels))
+    rows = -(-len(panels) // columns)                                                   # Divisione arrotondata per eccesso.
+    figsize = job.get('figsize') or (5 * columns, 1 + 0.8 * len(categories) * rows)
+    fig, axes = plt.subplots(rows, columns, figsize=figsize, sharex=True, sharey=True, squeeze=False)
+
+    height = 0.8 / len(table.columns)                                                   # Le barre di ogni categoria occupano l'80% dello spazio.
+    positions = np.arange(len(categories))
+    for ax, panel in zip(axes.flat, panels):
+        values = table.loc[panel]
+        for offset, (group, color) in enumerate(zip(table.columns, colors)):
+            ax.barh(positions + (offset - (len(table.columns) - 1) / 2) * height, values[group].to_numpy(),
+                    height=height, color=color, label=str(group))
+        etichetta(ax)                                                                   # Un 'bar_label' per colore, non un'etichetta per barra.
+        ax.set_title(str(panel))
+        ax.set_yticks(positions, [str(category) for category in categories])
+        ax.xaxis.set_major_formatter(FuncFormatter(thousand_separator_for_plot))
+        ax.tick_params(axis='x', labelrotation=30)
+    for ax in axes.flat[len(panels):]:
+        ax.set_visible(False)                                                           # Pannelli vuoti dell'ultima riga.
+    axes.flat[0].invert_yaxis()                                                         # Assi condivisi: basta invertirne uno per avere la prima categoria in alto.
+    axes.flat[0].margins(x=0.2)                                                         # Spazio a destra per le etichette delle barre più lunghe.
+
+    legend = job.get('legend')
+    if legend is not False:
+        handles, labels = axes.flat[0].get_legend_handles_labels()
+        fig.legend(handles, labels, loc='upper right', **(legend or {}))                # Una sola legenda per tutta la figura.
+    fig.suptitle(job.get('title', ''))
+    fig.supxlabel(job.get('xlabel', ''))
+    fig.supylabel(job.get('ylabel', ''))
+    width, height = fig.get_size_inches()                                               # Margini fissi in pollici invece di 'tight_layout',
+    fig.subplots_adjust(left=1.6 / width, right=1 - 0.3 / width,                        # il cui costo crescerebbe con il numero di pannelli.
+                        top=1 - 0.9 / height, bottom=1.1 / height, hspace=0.45, wspace=0.08)
+    return fig
+
+DRAWERS = {'barh': _draw_barh, 'heatmap': _draw_heatmap, 'line': _draw_line}            # Funzione di disegno per ogni tipo di grafico (un solo pannello)
+FIGURE_DRAWERS = {'facet_barh': _draw_small_multiples}                                  # Funzione di disegno per i tipi che creano da soli la figura
+
+def draw_chart(job):
+    """
+    Crea la figura di un grafico a partire dalla sua descrizione.
+
+    Args:
+        job (dict): La descrizione del grafico ('kind', 'data', 'figsize', 'title', 'xlabel', 'ylabel', ...).
+
+    Returns:
+        matplotlib.figure.Figure: La figura disegnata (da chiudere con plt.close quando non serve più).
+    """
+    import matplotlib.pyplot as plt                                                     # Matplotlib per la creazione di grafici
+
+    if job['kind'] in FIGURE_DRAWERS:
+        return FIGURE_DRAWERS[job['kind']](job)                                         # Più pannelli: la figura viene creata dal disegnatore stesso.
+
+    fig, ax = plt.subplots(figsize=job.get('figsize', (10, 6)))                         # Crea una nuova figura con la dimensione richiesta.
+    DRAWERS[job['kind']](ax, job)
+    ax.set_title(job.get('title', ''))
+    ax.set_xlabel(job.get('xlabel', ''))
+    ax.set_ylabel(job.get('ylabel', ''))
+    fig.tight_layout()                                                                  # Evita che titolo, etichette e legenda si sovrappongano.
+    return fig
+
+def show_chart(job):
+    """
+    Disegna un grafico e lo mostra a video (modalità interattiva, bloccante).
+
+    Args:
+        job (dict): La descrizione del grafico.
+
+    Returns:
+        None
+    """
+    import matplotlib.pyplot as plt                                                     # Matplotlib per la creazione di grafici
+
+    draw_chart(job)
+    plt.show()                                                                          # Mostra il grafico finale.
+
+def _render_job(job, path):
+    """
+    Disegna un grafico con il backend Agg, lo salva su file e chiude la figura (eseguita nei processi del pool).
+
+    Args:
+        job (dict): La descrizione del grafico.
+        path (str): Il percorso del file da scrivere.
+
+    Returns:
+        str: Il percorso del file scritto.
+    """
+    import matplotlib.pyplot as plt                                                     # Matplotlib per la creazione di grafici
+
+    plt.switch_backend('Agg')                                                           # Nessun display: rendering solo su file.
+    fig = draw_chart(job)
+    try:
+        fig.savefig(path)
+    finally:
+        plt.close(fig)                                                                  # Chiude la figura, così la memoria non cresce.
+    return path
+
+def render_charts(jobs, output_dir, fmt='png', processes=None):
+    """
+    Salva i grafici su file in parallelo, saltando quelli con dati e stile invariati.
+
+    Args:
+        jobs (list): Le descrizioni dei grafici.
+        output_dir (str): La cartella in cui salvare i file.
+        fmt (str): Il formato dei file: 'png' o 'svg'.
+        processes (int | None): Il numero di processi del pool (di default il numero di CPU).
+
+    Returns:
+        list: I percorsi dei file effettivamente (ri)scritti.
+    """
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"Formato dei grafici non supportato: {fmt} (disponibili: {', '.join(CHART_FORMATS)})")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as handle:
+            manifest = json.load(handle)
+
+    pending = []
+    for job in jobs:
+        filename = chart_filename(job['name'], fmt)
+        fingerprint = chart_fingerprint(job, fmt)
+        if manifest.get(filename) == fingerprint and os.path.exists(os.path.join(output_dir, filename)):
+            continue                                                                    # Grafico invariato: il file esistente è ancora valido.
+        manifest[filename] = fingerprint
+        pending.append((job, os.path.join(output_dir, filename)))
+
+    written = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_render_job, job, path) for job, path in pending]
+            written = [future.result() for future in futures]
+
+    with open(manifest_path, 'w', encoding='utf-8') as handle:                          # Il manifest viene aggiornato solo dopo il rendering riuscito.
+        json.dump(manifest, handle, indent=1, sort_keys=True)
+    return written
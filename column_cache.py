@@ -0,0 +1,216 @@
+# ###########################################################################################################
+# Cache colonnare dei dataset già puliti e tipizzati
+# ###########################################################################################################
+#
+# Ogni DataFrame viene salvato come una cartella di file '.npy' (uno per colonna) più un file 'meta.json' con
+# i nomi e i tipi delle colonne. La cartella è identificata dall'hash del contenuto del CSV di origine e dalla
+# versione dello schema: se il CSV cambia (o cambia lo schema) la chiave cambia e la cache viene ricostruita
+# automaticamente. Alla rilettura le colonne vengono aperte in memory-mapping, senza parsing: quelle numeriche,
+# di date e di durate restano mappate senza copie, mentre categorie e testo vengono ricostruiti in memoria.
+#
+# Ogni voce ricorda il CSV da cui deriva: quando il CSV cambia viene eliminata solo la voce superata dello stesso
+# file, così due CSV caricati con lo stesso nome logico (es. '--sales-csv' diversi) restano entrambi in cache.
+#
+# Tipi supportati:
+# - colonne numeriche, datetime64 e timedelta64: salvate così come sono;
+# - colonne 'category': salvate come codici interi, con le categorie nel file 'meta.json';
+# - colonne 'period' (es. il mese): salvate come ordinali interi, con la frequenza nel file 'meta.json';
+# - colonne di testo: salvate come array unicode a larghezza fissa, convertite in stringhe pandas alla rilettura.
+
+import hashlib                                                                          # Per calcolare l'hash del contenuto dei CSV
+import json                                                                             # Per i metadati delle colonne e l'indice degli hash
+import os                                                                               # Per la gestione di file e cartelle della cache
+import shutil                                                                           # Per eliminare le versioni superate della cache
+import tempfile                                                                         # Per scrivere la cache in modo atomico
+import numpy as np                                                                      # NumPy per il formato '.npy' e il memory-mapping
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+
+HASH_BLOCK_SIZE = 1 << 20                                                               # Il CSV viene letto a blocchi di 1 MB per calcolarne l'hash
+HASH_INDEX_FILE = 'hashes.json'                                                         # Indice (percorso, dimensione, data di modifica) -> hash già calcolato
+META_FILE = 'meta.json'                                                                 # Metadati delle colonne di ogni voce della cache
+
+def file_fingerprint(path, cache_dir=None):
+    """
+    Calcola l'hash SHA-256 del contenuto di un file.
+
+    Se viene indicata la cartella della cache, l'hash viene memorizzato insieme a dimensione e data di modifica
+    del file, così un file invariato non viene riletto a ogni esecuzione.
+
+    Args:
+        path (str): Il percorso del file.
+        cache_dir (str | None): La cartella della cache in cui memorizzare gli hash già calcolati.
+
+    Returns:
+        str: L'hash esadecimale del contenuto del file.
+    """
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]                                        # Se dimensione e data di modifica coincidono, il file è invariato.
+    index_path = os.path.join(cache_dir, HASH_INDEX_FILE) if cache_dir else None
+    index = {}
+    if index_path and os.path.exists(index_path):
+        with open(index_path, encoding='utf-8') as handle:
+            index = json.load(handle)
+        entry = index.get(os.path.abspath(path))
+        if entry and entry['signature'] == signature:
+            return entry['hash']                                                        # Hash già noto: il file non viene riletto.
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK_SIZE), b''):                   # Legge il file a blocchi per non caricarlo tutto in memoria.
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+
+    if index_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        index[os.path.abspath(path)] = {'signature': signature, 'hash': fingerprint}
+        _write_json_atomic(index_path, index)
+    return fingerprint
+
+def cache_key(name, fingerprint, schema_version):
+    """
+    Costruisce il nome della cartella di cache di un dataset.
+
+    Args:
+        name (str): Il nome logico del dataset (es. 'supermarket_sales').
+        fingerprint (str): L'hash del contenuto del CSV di origine.
+        schema_version (int): La versione dello schema usato per caricarlo.
+
+    Returns:
+        str: Il nome della cartella, nella forma '<nome>-<hash>-v<versione>'.
+    """
+    return f'{name}-{fingerprint[:16]}-v{schema_version}'
+
+def save_frame(frame, directory, source=None):
+    """
+    Salva un DataFrame come cartella di colonne '.npy', in modo atomico.
+
+    Args:
+        frame (pd.DataFrame): Il DataFrame da salvare.
+        directory (str): La cartella di destinazione (viene creata o sostituita).
+        source (str | None): Il percorso del file di origine, registrato nei metadati.
+
+    Returns:
+        None
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.tmp-')                              # Scrive in una cartella temporanea, poi la rinomina.
+
+    columns = []
+    for position, column in enumerate(frame.columns):
+        series = frame[column]
+        entry = {'name': column, 'file': f'{position}.npy'}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry['kind'] = 'category'
+            entry['categories'] = series.cat.categories.tolist()                        # Le categorie vanno nei metadati, i codici nel file.
+            values = series.cat.codes.to_numpy()
+        elif isinstance(series.dtype, pd.PeriodDtype):
+            entry['kind'] = 'period'
+            entry['dtype'] = str(series.dtype)                                          # Es. 'period[M]': la frequenza va nei metadati.
+            values = series.array.asi8                                                  # Gli ordinali interi dei periodi.
+        elif series.dtype.kind in 'biufmM':
+            entry['kind'] = 'array'                                                     # Numeri, date e durate: salvati così come sono.
+            values = series.to_numpy()
+        else:
+            entry['kind'] = 'string'
+            values = series.to_numpy(dtype=str)                                         # Testo a larghezza fissa: mappabile in memoria senza pickle.
+        np.save(os.path.join(staging, entry['file']), values, allow_pickle=False)
+        columns.append(entry)
+
+    _write_json_atomic(os.path.join(staging, META_FILE), {'columns': columns, 'rows': len(frame), 'source': source})
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+
+def load_frame(directory):
+    """
+    Rilegge un DataFrame salvato con 'save_frame', aprendo le colonne in memory-mapping.
+
+    Le colonne numeriche, di date e di durate restano mappate e vengono lette su richiesta, senza copie. Le colonne
+    'category' e 'period' vengono ricostruite dai codici e quelle di testo sono copiate in stringhe pandas
+    ('pd.array(..., dtype="str")'): per queste il costo della rilettura è proporzionale ai dati.
+
+    Args:
+        directory (str): La cartella della voce di cache.
+
+    Returns:
+        pd.DataFrame: Il DataFrame con gli stessi nomi e tipi di colonna di quello salvato.
+    """
+    with open(os.path.join(directory, META_FILE), encoding='utf-8') as handle:
+        meta = json.load(handle)
+
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode='r', allow_pickle=False)  # Nessuna lettura: le pagine vengono caricate su richiesta.
+        if entry['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=entry['categories'])
+        elif entry['kind'] == 'period':
+            values = pd.arrays.PeriodArray(np.asarray(values, dtype='int64'), dtype=pd.api.types.pandas_dtype(entry['dtype']))
+        elif entry['kind'] == 'string':
+            values = pd.array(values, dtype='str')
+        data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+def cached_load(name, path, loader, cache_dir, schema_version):
+    """
+    Carica un dataset dalla cache colonnare, oppure lo analizza con 'loader' e ne salva il risultato.
+
+    La voce di cache è valida solo per lo stesso contenuto del CSV e la stessa versione dello schema. Quando ne
+    viene scritta una nuova si eliminano solo le voci superate dello stesso CSV (stesso nome e stesso percorso,
+    letto da 'meta.json'): le voci di altri CSV con lo stesso nome logico restano valide.
+
+    Args:
+        name (str): Il nome logico del dataset.
+        path (str): Il percorso del CSV di origine.
+        loader (callable): La funzione che analizza il CSV e restituisce il DataFrame pulito.
+        cache_dir (str): La cartella della cache.
+        schema_version (int): La versione dello schema usato da 'loader'.
+
+    Returns:
+        pd.DataFrame: Il DataFrame pulito e tipizzato.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    directory = os.path.join(cache_dir, cache_key(name, file_fingerprint(path, cache_dir), schema_version))
+    if os.path.exists(os.path.join(directory, META_FILE)):
+        return load_frame(directory)                                                    # Cache valida: nessun parsing del CSV.
+
+    frame = loader(path)
+    source = os.path.abspath(path)
+    for entry in os.listdir(cache_dir):                                                 # Elimina le versioni superate dello stesso CSV.
+        if entry.startswith(f'{name}-') and _entry_source(os.path.join(cache_dir, entry)) in (source, None):
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    save_frame(frame, directory, source)
+    return frame
+
+def _entry_source(directory):
+    """
+    Legge il CSV di origine di una voce della cache.
+
+    Args:
+        directory (str): La cartella della voce di cache.
+
+    Returns:
+        str | None: Il percorso assoluto del CSV, oppure None per le voci senza origine (scritte dalle versioni
+            precedenti o incomplete), che vengono trattate come superate.
+    """
+    try:
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as handle:
+            return json.load(handle).get('source')
+    except (OSError, ValueError):
+        return None
+
+def _write_json_atomic(path, payload):
+    """
+    Scrive un file JSON in modo atomico (prima su un file temporaneo, poi con una rinomina).
+
+    Args:
+        path (str): Il percorso del file JSON.
+        payload: Il contenuto serializzabile in JSON.
+
+    Returns:
+        None
+    """
+    handle, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-', suffix='.json')
+    with os.fdopen(handle, 'w', encoding='utf-8') as output:
+        json.dump(payload, output)
+    os.replace(staging, path)
@@ -0,0 +1,124 @@
+# ###########################################################################################################
+# Previsioni a blocchi per migliaia di serie (es. Città x Categoria di prodotto)
+# ###########################################################################################################
+#
+# Il trend del report adatta una 'LinearRegression' a una sola serie mensile, con una divisione casuale dei
+# mesi tra training e test. Per prevedere ogni combinazione di negozio e categoria servono invece migliaia di
+# serie, e un modello di scikit-learn per serie in un ciclo Python è troppo lento.
+#
+# Qui tutte le serie (stessa granularità, stessi intervalli) vengono impilate in una matrice Y (intervalli x
+# serie). Trend e stagionalità sono descritti dalla stessa matrice di progetto X per tutte le serie (intercetta,
+# tempo, una variabile indicatrice per ogni fase del periodo stagionale), quindi un'unica chiamata a
+# 'np.linalg.lstsq' con Y come termine noto a più colonne risolve i minimi quadrati di tutte le serie insieme.
+#
+# La valutazione usa una divisione temporale: gli ultimi intervalli ('holdout') non vengono visti in
+# addestramento e su di essi si calcola l'MSE di ogni serie. La previsione finale viene poi riadattata su tutti
+# gli intervalli disponibili.
+
+import numpy as np                                                                      # NumPy per la matrice di progetto e i minimi quadrati
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+
+SEASONAL_PERIODS = {'hour': 24, 'day': 7, 'week': 52, 'month': 12}                      # Periodo stagionale di ogni granularità (es. settimanale per i giorni)
+FREQUENCY_OFFSETS = {'hour': 'h', 'day': 'D', 'week': '7D', 'month': 'MS'}              # Passo tra due intervalli consecutivi, per le date delle previsioni
+DEFAULT_HOLDOUT = 0.2                                                                   # Quota finale degli intervalli usata come test set
+DEFAULT_HORIZON = 7                                                                     # Intervalli previsti oltre l'ultimo osservato
+
+def design_matrix(steps, period=None, start=0):
+    """
+    Costruisce la matrice di progetto comune a tutte le serie: intercetta, tempo ed eventuale stagionalità.
+
+    Args:
+        steps (int): Il numero di intervalli (righe).
+        period (int | None): Il periodo stagionale; None = solo trend lineare.
+        start (int): L'indice del primo intervallo.
+
+    Returns:
+        np.ndarray: La matrice (intervalli x coefficienti), con 'period - 1' indicatrici per le fasi stagionali.
+    """
+    t = np.arange(start, start + steps, dtype=np.float64)
+    columns = [np.ones(steps), t]
+    if period:
+        phase = np.arange(start, start + steps) % period
+        columns += [(phase == k).astype(np.float64) for k in range(1, period)]          # La fase 0 è assorbita dall'intercetta.
+    return np.column_stack(columns)
+
+def fit_all(X, Y):
+    """
+    Risolve i minimi quadrati di tutte le serie con una sola decomposizione della matrice di progetto.
+
+    Args:
+        X (np.ndarray): La matrice di progetto (intervalli x coefficienti).
+        Y (np.ndarray): Le serie impilate (intervalli x serie).
+
+    Returns:
+        np.ndarray: I coefficienti (coefficienti x serie).
+    """
+    coefficients, *_ = np.linalg.lstsq(X, Y, rcond=None)
+    return coefficients
+
+def forecast_matrix(Y, period=None, holdout=DEFAULT_HOLDOUT, horizon=DEFAULT_HORIZON):
+    """
+    Valuta e prevede tutte le serie di una matrice con trend lineare e stagionalità, in forma vettorizzata.
+
+    La stagionalità viene usata solo se il training copre almeno due periodi; altrimenti il modello è il solo
+    trend lineare.
+
+    Args:
+        Y (np.ndarray): Le serie impilate (intervalli x serie), in ordine di tempo.
+        period (int | None): Il periodo stagionale.
+        holdout (float): La quota finale degli intervalli usata come test set (almeno un intervallo).
+        horizon (int): Il numero di intervalli da prevedere dopo l'ultimo osservato.
+
+    Returns:
+        dict: L'MSE di ogni serie sul test set ('mse'), i coefficienti riadattati su tutti gli intervalli
+            ('coefficients', serie x coefficienti), i valori adattati ('fitted'), le previsioni ('forecast',
+            horizon x serie), gli intervalli di training ('train_steps') e il periodo usato ('period').
+
+    Raises:
+        ValueError: Se 'horizon' è minore di 1 o se gli intervalli non bastano per un training e un test.
+    """
+    if horizon < 1:
+        raise ValueError(f"L'orizzonte delle previsioni deve essere di almeno 1 intervallo: {horizon}")
+    Y = np.asarray(Y, dtype=np.float64)
+    steps = len(Y)
+    test_steps = max(1, int(round(steps * holdout)))
+    train_steps = steps - test_steps
+    if train_steps < 2:
+        raise ValueError(f"Servono almeno 2 intervalli di training: {steps} intervalli, {test_steps} di test")
+    period = period if period and train_steps >= 2 * period else None
+    X = design_matrix(steps + horizon, period)
+
+    holdout_fit = fit_all(X[:train_steps], Y[:train_steps])                             # Il test set resta fuori dall'adattamento.
+    errors = Y[train_steps:] - X[train_steps:steps] @ holdout_fit
+    coefficients = fit_all(X[:steps], Y)                                                # Per le previsioni si usano tutti gli intervalli.
+    return {
+        'mse': (errors ** 2).mean(axis=0),
+        'coefficients': coefficients.T,
+        'fitted': X[:steps] @ coefficients,
+        'forecast': X[steps:] @ coefficients,
+        'train_steps': train_steps,
+        'period': period,
+    }
+
+def forecast_table(table, freq, holdout=DEFAULT_HOLDOUT, horizon=DEFAULT_HORIZON):
+    """
+    Prevede ogni colonna di una tabella ricampionata (es. 'timeseries.resample' con by=['City', 'Product line']).
+
+    Args:
+        table (pd.DataFrame): Una riga per intervallo, senza buchi, e una colonna per serie.
+        freq (str): La granularità della tabella ('hour', 'day', 'week' o 'month').
+        holdout (float): La quota finale degli intervalli usata come test set.
+        horizon (int): Il numero di intervalli da prevedere.
+
+    Returns:
+        dict: 'mse' (pd.Series per serie), 'forecast' (pd.DataFrame con le date future come indice), l'inizio
+            del test set ('holdout_start') e il periodo stagionale usato ('period').
+    """
+    result = forecast_matrix(table.to_numpy(), SEASONAL_PERIODS.get(freq), holdout, horizon)
+    future = pd.date_range(table.index[-1], periods=horizon + 1, freq=FREQUENCY_OFFSETS[freq])[1:]
+    return {
+        'mse': pd.Series(result['mse'], index=table.columns, name='mse'),
+        'forecast': pd.DataFrame(result['forecast'], index=pd.DatetimeIndex(future, name=table.index.name), columns=table.columns),
+        'holdout_start': table.index[result['train_steps']],
+        'period': result['period'],
+    }
@@ -0,0 +1,239 @@
+# ###########################################################################################################
+# Aggiornamento incrementale del cubo delle vendite
+# ###########################################################################################################
+#
+# I nuovi lotti di fatture arrivano ogni giorno: invece di ricaricare tutto e ricalcolare ogni raggruppamento,
+# lo stato aggregato (il cubo di 'sales_cube.py') viene salvato su disco insieme all'elenco ordinato degli
+# 'Invoice ID' già contati. A ogni aggiornamento vengono lette solo le nuove righe, scartate quelle con un
+# 'Invoice ID' già visto (un file riconsegnato non viene contato due volte) e il lotto viene ripiegato nel cubo.
+# I totali per città, genere e categoria e 'monthly_sales' si derivano poi dal cubo aggiornato con 'rollup'.
+#
+# Di ogni CSV già letto si ricorda fin dove è arrivata la lettura: se il file è solo cresciuto (stessa
+# intestazione, stessi byte prima di quel punto) si analizzano soltanto i byte aggiunti; un file nuovo o
+# riscritto viene letto per intero e gli 'Invoice ID' evitano i doppi conteggi. I nuovi ID vengono inseriti
+# nell'elenco ordinato con una ricerca binaria, senza riordinare lo storico: il costo dipende dalle righe nuove.
+#
+# Struttura della cartella di stato:
+# - 'cube/': il cubo salvato con 'column_cache.save_frame';
+# - 'invoices.npy': gli 'Invoice ID' già contati, ordinati per la ricerca binaria;
+# - 'sources.json': per ogni CSV, i byte già letti e le impronte di intestazione e ultimi byte letti.
+
+import hashlib                                                                          # Per riconoscere un CSV riscritto
+import io                                                                               # Per analizzare in memoria i soli byte aggiunti
+import json                                                                             # Per i byte già letti di ogni CSV
+import os                                                                               # Per la gestione della cartella di stato
+import numpy as np                                                                      # NumPy per l'elenco ordinato degli Invoice ID
+from column_cache import load_frame, save_frame                                         # Salvataggio colonnare del cubo
+from loaders import parse_sales_csv                                                     # Caricamento tipizzato dei nuovi lotti di fatture
+from sales_cube import CUBE_DIMENSIONS, CUBE_MEASURES, build_sales_cube, merge_cubes    # Cubo di aggregazione delle vendite
+
+CUBE_DIR = 'cube'                                                                       # Sottocartella con il cubo aggregato
+INVOICES_FILE = 'invoices.npy'                                                          # File con gli Invoice ID già contati
+SOURCES_FILE = 'sources.json'                                                           # File con i byte già letti di ogni CSV
+TAIL_BYTES = 4096                                                                       # Ultimi byte letti confrontati per riconoscere un file riscritto
+
+def load_state(state_dir):
+    """
+    Carica lo stato aggregato salvato: il cubo e gli 'Invoice ID' già contati.
+
+    Args:
+        state_dir (str): La cartella di stato.
+
+    Returns:
+        tuple: (cubo, invoice_ids). Se lo stato non esiste ancora il cubo è None e l'elenco è vuoto.
+    """
+    cube_dir = os.path.join(state_dir, CUBE_DIR)
+    invoices_path = os.path.join(state_dir, INVOICES_FILE)
+    if not os.path.exists(invoices_path):
+        return None, np.array([], dtype=str)                                            # Primo avvio: nessuna fattura ancora contata.
+    cube = load_frame(cube_dir) if os.path.exists(cube_dir) else None
+    return cube, np.load(invoices_path, allow_pickle=False)
+
+def state_fingerprint(state_dir, paths=()):
+    """
+    Calcola un'impronta economica dello stato salvato e dei CSV da ripiegare, senza leggerne il contenuto.
+
+    Args:
+        state_dir (str): La cartella di stato.
+        paths (list): I CSV di vendita da cui arrivano i nuovi lotti.
+
+    Returns:
+        list: Dimensione e data di modifica dell'elenco degli 'Invoice ID' (None se lo stato non esiste ancora) e di ogni CSV.
+    """
+    invoices_path = os.path.join(state_dir, INVOICES_FILE)
+    stats = [os.stat(invoices_path) if os.path.exists(invoices_path) else None]         # 'save_state' riscrive sempre questo file insieme al cubo.
+    stats += [os.stat(path) for path in paths]                                          # Un CSV che cresce cambia dimensione e data di modifica.
+    return [None if stat is None else [stat.st_size, stat.st_mtime_ns] for stat in stats]
+
+def save_state(state_dir, cube, invoice_ids):
+    """
+    Salva lo stato aggregato nella cartella di stato.
+
+    Args:
+        state_dir (str): La cartella di stato.
+        cube (pd.DataFrame | None): Il cubo aggiornato.
+        invoice_ids (np.ndarray): Gli 'Invoice ID' già contati, ordinati.
+
+    Returns:
+        None
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    if cube is not None:
+        save_frame(cube, os.path.join(state_dir, CUBE_DIR))
+    staging = os.path.join(state_dir, '.tmp-' + INVOICES_FILE)
+    np.save(staging, invoice_ids, allow_pickle=False)
+    os.replace(staging, os.path.join(state_dir, INVOICES_FILE))                         # Rinomina atomica: lo stato non resta mai a metà.
+
+def load_sources(state_dir):
+    """
+    Carica i byte già letti di ogni CSV.
+
+    Args:
+        state_dir (str): La cartella di stato.
+
+    Returns:
+        dict: Per percorso assoluto: 'offset' (byte letti), 'header' e 'tail' (impronte dell'intestazione e degli ultimi byte letti).
+    """
+    path = os.path.join(state_dir, SOURCES_FILE)
+    if not os.path.exists(path):
+        return {}                                                                       # Stato precedente senza offset: i CSV si rileggono una volta per intero.
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+def save_sources(state_dir, sources):
+    """
+    Salva i byte già letti di ogni CSV.
+
+    Args:
+        state_dir (str): La cartella di stato.
+        sources (dict): Le voci prodotte da 'read_new_rows', per percorso assoluto.
+
+    Returns:
+        None
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    staging = os.path.join(state_dir, '.tmp-' + SOURCES_FILE)
+    with open(staging, 'w', encoding='utf-8') as handle:
+        json.dump(sources, handle, indent=1)
+    os.replace(staging, os.path.join(state_dir, SOURCES_FILE))
+
+def read_new_rows(path, source=None, usecols=None):
+    """
+    Legge le righe aggiunte a un CSV dall'ultimo aggiornamento, oppure tutto il file se è nuovo o è stato riscritto.
+
+    Il file è "solo cresciuto" se è almeno lungo quanto i byte già letti e sia l'intestazione sia gli ultimi
+    'TAIL_BYTES' byte letti sono invariati: in quel caso si analizzano l'intestazione più i byte successivi.
+    Si consumano solo righe complete: una riga ancora in scrittura (senza a capo finale) resta per il prossimo
+    aggiornamento, e con lei l'ultima riga di un file che non termina con un a capo.
+
+    Args:
+        path (str): Il percorso del CSV.
+        source (dict | None): La voce del file in 'sources.json' (None se il file non è mai stato letto).
+        usecols (list | None): Le colonne da leggere.
+
+    Returns:
+        tuple: (righe lette o None se non ce ne sono, nuova voce del file o None se manca ancora l'intestazione).
+    """
+    digest = lambda data: hashlib.sha256(data).hexdigest()
+    with open(path, 'rb') as handle:
+        header = handle.readline()
+        if not header.endswith(b'\n'):
+            return None, source                                                         # Intestazione ancora incompleta: nulla da leggere.
+        size = os.fstat(handle.fileno()).st_size                                        # Righe scritte durante la lettura: al prossimo aggiornamento.
+
+        def tail(end):
+            handle.seek(max(len(header), end - TAIL_BYTES))
+            return digest(handle.read(end - handle.tell()))
+
+        start = len(header)
+        if source and digest(header) == source['header'] and start <= source['offset'] <= size and tail(source['offset']) == source['tail']:
+            start = source['offset']                                                    # Il file è solo cresciuto: si riparte da dove ci si era fermati.
+        handle.seek(start)
+        data = handle.read(size - start)
+        data = data[:data.rfind(b'\n') + 1]                                             # Solo righe complete: l'offset non cade mai a metà riga.
+        end = start + len(data)
+        entry = {'offset': end, 'header': digest(header), 'tail': tail(end)}
+    if not data.strip():
+        return None, entry                                                              # Nessuna riga nuova completa (o file vuoto).
+    return parse_sales_csv(io.BytesIO(header + data), usecols), entry
+
+def select_new_rows(batch, invoice_ids):
+    """
+    Seleziona le righe di un lotto il cui 'Invoice ID' non è ancora stato contato.
+
+    I duplicati all'interno del lotto vengono scartati tenendo la prima occorrenza; il confronto con le fatture
+    già contate è una ricerca binaria vettorizzata sull'elenco ordinato.
+
+    Args:
+        batch (pd.DataFrame): Il lotto di nuove righe di vendita.
+        invoice_ids (np.ndarray): Gli 'Invoice ID' già contati, ordinati.
+
+    Returns:
+        pd.DataFrame: Le sole righe nuove del lotto.
+    """
+    batch = batch.drop_duplicates(subset='Invoice ID')                                  # Un lotto può contenere la stessa fattura più volte.
+    ids = batch['Invoice ID'].to_numpy(dtype=str)
+    if len(invoice_ids) == 0:
+        return batch
+    positions = np.searchsorted(invoice_ids, ids).clip(max=len(invoice_ids) - 1)        # Posizione in cui ogni ID andrebbe inserito.
+    seen = invoice_ids[positions] == ids                                                # Se in quella posizione c'è lo stesso ID, è già stato contato.
+    return batch[~seen]
+
+def insert_invoice_ids(invoice_ids, new_ids):
+    """
+    Inserisce nell'elenco ordinato degli 'Invoice ID' quelli di un lotto, senza riordinare lo storico.
+
+    Args:
+        invoice_ids (np.ndarray): Gli 'Invoice ID' già contati, ordinati.
+        new_ids (np.ndarray): Gli 'Invoice ID' del lotto, distinti e non ancora contati (vedi 'select_new_rows').
+
+    Returns:
+        np.ndarray: L'elenco ordinato con i nuovi ID.
+    """
+    new_ids = np.sort(new_ids)                                                          # Si ordinano solo gli ID nuovi.
+    dtype = np.result_type(invoice_ids.dtype, new_ids.dtype)                            # Un ID più lungo dei precedenti allarga il tipo stringa.
+    return np.insert(invoice_ids.astype(dtype, copy=False), np.searchsorted(invoice_ids, new_ids), new_ids)
+
+def update_cube(state_dir, paths, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+    """
+    Ripiega uno o più nuovi file di fatture nel cubo salvato, contando ogni 'Invoice ID' una sola volta.
+
+    Il costo dipende dalle righe nuove: dei CSV già letti si analizzano solo i byte aggiunti e lo stato salvato
+    non viene ricalcolato, solo aggiornato.
+
+    Args:
+        state_dir (str): La cartella di stato (viene creata al primo aggiornamento).
+        paths (list | str): Il percorso o i percorsi dei nuovi CSV di vendita.
+        dimensions (list): Le colonne che definiscono il livello di dettaglio del cubo.
+        measures (list): Le colonne numeriche da sommare in ogni cella.
+
+    Returns:
+        tuple: (cubo aggiornato, numero di righe nuove effettivamente aggiunte).
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    cube, invoice_ids = load_state(state_dir)
+    stored = load_sources(state_dir)
+    sources = dict(stored)
+    columns = ['Invoice ID', 'Date'] + [dimension for dimension in dimensions if dimension != 'Month'] + list(measures)
+
+    added = 0
+    for path in paths:
+        source = os.path.abspath(path)
+        rows, entry = read_new_rows(path, stored.get(source), columns)                  # Solo le colonne e i byte che servono.
+        if entry is not None:
+            sources[source] = entry
+        if rows is None:
+            continue
+        batch = select_new_rows(rows, invoice_ids)
+        if batch.empty:
+            continue                                                                    # File già consegnato: nulla da aggiungere.
+        cube = merge_cubes([cube, build_sales_cube(batch, dimensions, measures)], dimensions)
+        invoice_ids = insert_invoice_ids(invoice_ids, batch['Invoice ID'].to_numpy(dtype=str))
+        added += len(batch)
+
+    if added:
+        save_state(state_dir, cube, invoice_ids)
+    if sources != stored:
+        save_sources(state_dir, sources)                                                # Dopo lo stato: i byte letti non precedono mai gli ID contati.
+    return cube, added
@@ -0,0 +1,272 @@
+# ###########################################################################################################
+# Strumentazione dell'analisi: tempo, CPU, righe e memoria di ogni stadio e sezione
+# ###########################################################################################################
+#
+# Quando un'esecuzione del report è lenta serve sapere dove va il tempo: lettura dei CSV, aggregazioni,
+# addestramento della foresta, stampa delle tabelle o disegno dei grafici. Ogni parte dell'analisi viene
+# racchiusa in uno 'span' con nome, che registra:
+# - il tempo reale e il tempo di CPU (compreso quello dei processi figli, es. il pool dei grafici);
+# - le righe elaborate e le righe al secondo;
+# - il picco di memoria residente del processo alla fine dello span.
+#
+# Lo stato è un dizionario ('new_tracer') con una di tre modalità:
+# - 'off': 'span' restituisce un contesto vuoto, senza letture di orologi né allocazioni di rilievo;
+# - 'summary': una riga per span, stampata alla fine ('print_summary');
+# - 'detailed': in più page fault, cambi di contesto, raccolte del garbage collector e crescita della memoria
+#   residente di ogni span, e le funzioni più costose dello stadio profilato.
+# Uno stadio può essere profilato con cProfile ('profile_stage'); le statistiche si possono salvare in un file
+# leggibile con 'pstats' o snakeviz. 'write_trace' scrive gli span nel formato Trace Event di Chrome (JSON),
+# apribile con chrome://tracing o Perfetto.
+
+import contextlib                                                                       # Per gli span come contesti 'with'
+import cProfile                                                                         # Per il profilo dello stadio scelto
+import gc                                                                               # Per il numero di raccolte del garbage collector
+import io                                                                               # Per il testo delle statistiche di cProfile
+import json                                                                             # Per il file di traccia
+import os                                                                               # Per i tempi di CPU del processo e dei figli
+import pstats                                                                           # Per ordinare e stampare le statistiche di cProfile
+import sys                                                                              # Per l'uscita di errore e la piattaforma
+import threading                                                                        # Per l'identificativo del thread nella traccia
+import time                                                                             # Per il tempo reale degli span
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+
+try:
+    import resource                                                                     # Picco di memoria residente e contatori del processo (non disponibile su Windows)
+except ImportError:
+    resource = None
+
+MODES = ('off', 'summary', 'detailed')                                                  # Modalità della strumentazione
+PROFILE_TOP = 25                                                                        # Funzioni stampate dal profilo dello stadio scelto
+DETAILED_COUNTERS = ('minor_faults', 'major_faults', 'context_switches', 'gc_collections')  # Contatori aggiuntivi della modalità 'detailed'
+
+def peak_rss_mb():
+    """
+    Restituisce il picco di memoria residente del processo in MB (None se la piattaforma non lo espone).
+
+    Returns:
+        float | None: Il picco dall'avvio del processo.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10              # Byte su macOS, kilobyte su Linux.
+
+def current_rss_mb():
+    """
+    Restituisce la memoria residente attuale del processo in MB (solo Linux; altrimenti None).
+
+    Returns:
+        float | None: La memoria residente.
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+def count_rows(value):
+    """
+    Conta le righe di un risultato o di un ingresso (DataFrame, Series, array o dizionario di questi).
+
+    Args:
+        value: Il valore da misurare.
+
+    Returns:
+        int | None: Il numero di righe (il massimo tra i valori di un dizionario), None se non ha righe.
+    """
+    if isinstance(value, dict):
+        counts = [count for count in map(count_rows, value.values()) if count is not None]
+        return max(counts) if counts else None
+    shape = getattr(value, 'shape', None)
+    return int(shape[0]) if shape else None
+
+def new_tracer(mode='off', profile_stage=None, profile_path=None):
+    """
+    Crea lo stato della strumentazione.
+
+    Args:
+        mode (str): 'off', 'summary' oppure 'detailed'.
+        profile_stage (str | None): Il nome dello span da profilare con cProfile.
+        profile_path (str | None): Il file in cui salvare le statistiche di cProfile (formato di 'pstats').
+
+    Returns:
+        dict: La modalità, gli span registrati ('spans'), i profili raccolti ('profiles') e l'origine dei tempi.
+
+    Raises:
+        ValueError: Se la modalità non è supportata.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modalità di strumentazione non supportata: {mode} (disponibili: {', '.join(MODES)})")
+    return {'mode': mode, 'profile_stage': profile_stage, 'profile_path': profile_path,
+            'origin': time.perf_counter(), 'depth': 0, 'spans': [], 'profiles': {}}
+
+def enabled(tracer):
+    """
+    Indica se la strumentazione registra qualcosa.
+
+    Args:
+        tracer (dict | None): Lo stato della strumentazione.
+
+    Returns:
+        bool: False se lo stato manca o la modalità è 'off'.
+    """
+    return tracer is not None and tracer['mode'] != 'off'
+
+def _counters(detailed):
+    """
+    Legge orologi e contatori del processo all'inizio o alla fine di uno span.
+
+    Args:
+        detailed (bool): Se True legge anche i contatori della modalità 'detailed'.
+
+    Returns:
+        dict: Tempo reale ('wall'), tempo di CPU ('cpu') ed eventuali contatori aggiuntivi.
+    """
+    children = os.times()
+    counters = {'wall': time.perf_counter(),
+                'cpu': time.process_time() + children.children_user + children.children_system}  # I figli contano solo dopo la loro chiusura.
+    if detailed:
+        if resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            counters.update(minor_faults=usage.ru_minflt, major_faults=usage.ru_majflt,
+                            context_switches=usage.ru_nvcsw + usage.ru_nivcsw)
+        counters['gc_collections'] = sum(stats['collections'] for stats in gc.get_stats())
+        counters['rss_mb'] = current_rss_mb()
+    return counters
+
+def span(tracer, name, rows=None):
+    """
+    Misura una parte dell'analisi: 'with span(tracer, 'aggregate') as record: ...'.
+
+    Il dizionario restituito dal contesto può ricevere le righe elaborate ('rows') o altre informazioni
+    (es. 'cached'), che finiscono nel riepilogo e nella traccia.
+
+    Args:
+        tracer (dict | None): Lo stato della strumentazione; None o modalità 'off' = nessuna misura.
+        name (str): Il nome dello span (es. il nome dello stadio della pipeline).
+        rows (int | None): Le righe elaborate, se già note.
+
+    Returns:
+        contextmanager: Il contesto che misura il blocco 'with'.
+    """
+    if not enabled(tracer):
+        return contextlib.nullcontext({})                                               # Modalità 'off': nessun orologio letto.
+    return _measured_span(tracer, name, rows)
+
+@contextlib.contextmanager
+def _measured_span(tracer, name, rows):
+    """
+    Registra uno span: orologi e contatori prima e dopo il blocco, ed eventuale profilo con cProfile.
+
+    Args:
+        tracer (dict): Lo stato della strumentazione.
+        name (str): Il nome dello span.
+        rows (int | None): Le righe elaborate, se già note.
+
+    Returns:
+        generator: Il contesto, che produce il dizionario dello span.
+    """
+    detailed = tracer['mode'] == 'detailed'
+    record = {'name': name, 'depth': tracer['depth'], 'rows': rows}
+    profiler = cProfile.Profile() if name == tracer['profile_stage'] else None
+    tracer['depth'] += 1
+    start = _counters(detailed)
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+        end = _counters(detailed)
+        tracer['depth'] -= 1
+        wall = end['wall'] - start['wall']
+        record.update(start_s=start['wall'] - tracer['origin'], wall_s=wall, cpu_s=end['cpu'] - start['cpu'],
+                      rows_per_s=record['rows'] / wall if record['rows'] and wall > 0 else None,
+                      peak_rss_mb=peak_rss_mb(), thread=threading.get_ident())
+        if detailed:
+            for counter in DETAILED_COUNTERS:
+                record[counter] = end[counter] - start[counter] if counter in start else None
+            record['rss_growth_mb'] = end['rss_mb'] - start['rss_mb'] if start['rss_mb'] is not None else None
+        if profiler:
+            tracer['profiles'][name] = pstats.Stats(profiler)
+            if tracer['profile_path']:
+                profiler.dump_stats(tracer['profile_path'])
+        tracer['spans'].append(record)
+
+def summary_frame(tracer):
+    """
+    Riassume gli span registrati in una tabella, in ordine di inizio.
+
+    Args:
+        tracer (dict): Lo stato della strumentazione.
+
+    Returns:
+        pd.DataFrame: Una riga per span (nome rientrato secondo l'annidamento) con tempo reale, CPU, righe,
+            righe al secondo e picco di memoria residente; in modalità 'detailed' anche i contatori aggiuntivi.
+    """
+    columns = ['span', 'wall_s', 'cpu_s', 'rows', 'rows_per_s', 'peak_rss_mb']
+    if tracer['mode'] == 'detailed':
+        columns += ['rss_growth_mb', *DETAILED_COUNTERS]
+    spans = sorted(tracer['spans'], key=lambda record: record['start_s'])
+    frame = pd.DataFrame(spans, columns=[column for column in columns if column != 'span'] + ['name', 'depth', 'cached'])
+    frame.insert(0, 'span', ['  ' * depth + name + (' (cache)' if cached is True else '')
+                             for name, depth, cached in zip(frame['name'], frame['depth'], frame['cached'])])
+    return frame[columns].astype({column: float for column in columns[1:]})           # Valori mancanti come NaN, anche nelle colonne tutte vuote.
+
+def print_summary(tracer, file=None):
+    """
+    Stampa il riepilogo degli span e, se raccolto, il profilo dello stadio scelto.
+
+    Args:
+        tracer (dict): Lo stato della strumentazione.
+        file (file | None): Dove stampare (di default l'uscita di errore, per non mescolarsi al report).
+
+    Returns:
+        None
+    """
+    file = file or sys.stderr
+    if not enabled(tracer):
+        return
+    frame = summary_frame(tracer)
+    blank = lambda format_value: lambda value: '-' if pd.isna(value) else format_value(value)
+    print(f"\nStrumentazione ({tracer['mode']}):", file=file)
+    print(frame.to_string(index=False, na_rep='-', formatters={'span': '{{:<{}}}'.format(frame['span'].str.len().max()).format,
+                                                   'wall_s': '{:.4f}'.format, 'cpu_s': '{:.4f}'.format,
+                                                   'rows': blank('{:.0f}'.format), 'rows_per_s': blank('{:,.0f}'.format),
+                                                   'peak_rss_mb': blank('{:.0f}'.format), 'rss_growth_mb': blank('{:+.1f}'.format),
+                                                   **{counter: blank('{:.0f}'.format) for counter in DETAILED_COUNTERS}}), file=file)
+    for name, stats in tracer['profiles'].items():
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP if tracer['mode'] == 'detailed' else PROFILE_TOP // 2)
+        print(f"\nProfilo di '{name}' (cProfile, per tempo cumulativo):", file=file)
+        print(text.getvalue().strip('\n'), file=file)
+        if tracer['profile_path']:
+            print(f"Statistiche complete in {tracer['profile_path']}", file=file)
+
+def write_trace(tracer, path, metadata=None):
+    """
+    Scrive gli span nel formato Trace Event di Chrome (JSON), apribile con chrome://tracing o Perfetto.
+
+    Args:
+        tracer (dict): Lo stato della strumentazione.
+        path (str): Il file da scrivere.
+        metadata (dict | None): Informazioni aggiuntive sull'esecuzione (es. gli argomenti della riga di comando).
+
+    Returns:
+        str: Il percorso del file scritto.
+    """
+    events = []
+    for record in sorted(tracer['spans'], key=lambda record: record['start_s']):
+        args = {key: value for key, value in record.items()
+                if key not in ('name', 'start_s', 'wall_s', 'thread') and value is not None}
+        events.append({'name': record['name'], 'cat': 'analytics', 'ph': 'X', 'pid': os.getpid(), 'tid': record['thread'],
+                       'ts': round(record['start_s'] * 1e6, 3), 'dur': round(record['wall_s'] * 1e6, 3), 'args': args})
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                   'otherData': {'mode': tracer['mode'], **(metadata or {})}}, handle, indent=1, default=str)
+    return path
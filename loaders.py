@@ -0,0 +1,189 @@
+# ###########################################################################################################
+# Caricamento tipizzato dei dataset
+# ###########################################################################################################
+#
+# Questo modulo dichiara lo schema dei due dataset ('supermarket_sales' e 'apple_quality') e li carica con i
+# tipi corretti fin dalla lettura del CSV:
+# - le colonne a bassa cardinalità (Città, Filiale, Genere, ...) diventano 'category', quindi i raggruppamenti
+#   lavorano su codici interi invece che su stringhe;
+# - le colonne numeriche usano float32 o int32, tranne le misure monetarie che vengono sommate nel report, che
+#   restano in float64 per non perdere precisione nei totali;
+# - Date e Time vengono convertiti in un solo passaggio con un formato esplicito.
+#
+# I percorsi dei file arrivano dagli argomenti delle funzioni oppure dalle variabili d'ambiente
+# 'ANALYTICS_SALES_CSV' e 'ANALYTICS_APPLE_CSV'; in mancanza di entrambi si usano i CSV accanto a questo file.
+#
+# I dataset puliti vengono salvati nella cache colonnare di 'column_cache.py' (cartella indicata da
+# 'ANALYTICS_CACHE_DIR', di default '.analytics_cache' accanto a questo file): le esecuzioni successive sugli
+# stessi CSV saltano completamente il parsing. Ogni modifica allo schema deve incrementare 'SCHEMA_VERSION'.
+
+import os                                                                               # Per leggere le variabili d'ambiente con i percorsi dei file
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from column_cache import cached_load                                                    # Cache colonnare dei dataset già puliti
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))                                   # Cartella in cui si trovano i CSV distribuiti con lo script
+SALES_CSV_ENV = 'ANALYTICS_SALES_CSV'                                                   # Variabile d'ambiente con il percorso del CSV delle vendite
+APPLE_CSV_ENV = 'ANALYTICS_APPLE_CSV'                                                   # Variabile d'ambiente con il percorso del CSV delle mele
+DEFAULT_SALES_CSV = os.path.join(DATA_DIR, 'supermarket_sales - Copia.csv')             # Percorso predefinito del CSV delle vendite
+DEFAULT_APPLE_CSV = os.path.join(DATA_DIR, 'apple_quality.csv')                         # Percorso predefinito del CSV delle mele
+CACHE_DIR_ENV = 'ANALYTICS_CACHE_DIR'                                                   # Variabile d'ambiente con la cartella della cache colonnare
+DEFAULT_CACHE_DIR = os.path.join(DATA_DIR, '.analytics_cache')                          # Cartella predefinita della cache colonnare
+SCHEMA_VERSION = 1                                                                      # Da incrementare a ogni modifica di schema o pulizia: invalida la cache
+
+# Schema di 'supermarket_sales': tipo di ogni colonna letta dal CSV
+SALES_SCHEMA = {
+    'Invoice ID': 'str',                                                                # Identificativo univoco della fattura
+    'Branch': 'category',
+    'City': 'category',
+    'Customer type': 'category',
+    'Gender': 'category',
+    'Product line': 'category',
+    'Unit price': 'float32',
+    'Quantity': 'int32',
+    'Tax 5%': 'float64',                                                                # Misure monetarie sommate nel report: restano in float64
+    'Total': 'float64',
+    'Date': 'str',                                                                      # Convertite in datetime dopo la lettura, con formato esplicito
+    'Time': 'str',
+    'Payment': 'category',
+    'cogs': 'float64',
+    'gross margin percentage': 'float32',
+    'gross income': 'float64',
+    'Rating': 'float32',
+}
+SALES_DATE_FORMAT = '%m/%d/%Y'                                                          # Formato della colonna 'Date' (es. 1/5/2019 = 5 gennaio 2019)
+SALES_TIME_FORMAT = '%H:%M'                                                             # Formato della colonna 'Time' (es. 13:08)
+
+# Schema di 'apple_quality': le caratteristiche delle mele usate dal classificatore
+APPLE_FEATURES = ['Size', 'Weight', 'Sweetness', 'Crunchiness', 'Juiciness', 'Ripeness', 'Acidity']
+APPLE_SCHEMA = {
+    'A_id': 'float64',                                                                  # Convertito in int32 dopo aver scartato le righe incomplete
+    **{feature: 'float32' for feature in APPLE_FEATURES if feature != 'Acidity'},
+    'Acidity': 'str',                                                                   # Contiene una riga di testo finale: viene convertita dopo la lettura
+    'Quality': 'category',
+}
+
+def resolve_path(path, env_var, default):
+    """
+    Determina il percorso di un file: argomento esplicito, poi variabile d'ambiente, poi percorso predefinito.
+
+    Args:
+        path (str | None): Il percorso passato esplicitamente (ha la precedenza).
+        env_var (str): Il nome della variabile d'ambiente da consultare.
+        default (str): Il percorso da usare se non è indicato altro.
+
+    Returns:
+        str: Il percorso del file da leggere.
+    """
+    return path or os.environ.get(env_var) or default
+
+def parse_sales_datetimes(sales_data):
+    """
+    Converte 'Date' e 'Time' in tipi temporali con un solo passaggio di parsing a formato esplicito.
+
+    Se entrambe le colonne sono presenti, viene aggiunta anche la colonna 'Datetime' (data e ora insieme),
+    'Date' diventa la data a mezzanotte e 'Time' la durata trascorsa dalla mezzanotte.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite con 'Date' (ed eventualmente 'Time') come stringhe.
+
+    Returns:
+        pd.DataFrame: Lo stesso DataFrame con le colonne temporali convertite.
+    """
+    if 'Date' not in sales_data.columns or pd.api.types.is_datetime64_any_dtype(sales_data['Date']):
+        return sales_data                                                               # Niente da convertire.
+
+    if 'Time' in sales_data.columns:
+        moment = pd.to_datetime(sales_data['Date'] + ' ' + sales_data['Time'],          # Un solo parsing per data e ora insieme.
+                                format=f'{SALES_DATE_FORMAT} {SALES_TIME_FORMAT}')
+        sales_data['Datetime'] = moment
+        sales_data['Date'] = moment.dt.normalize()                                      # La data a mezzanotte, senza un secondo parsing.
+        sales_data['Time'] = moment - sales_data['Date']                                # L'ora del giorno come durata.
+    else:
+        sales_data['Date'] = pd.to_datetime(sales_data['Date'], format=SALES_DATE_FORMAT)
+    return sales_data
+
+def parse_sales_csv(path, usecols=None):
+    """
+    Analizza il CSV delle vendite applicando lo schema dichiarato in 'SALES_SCHEMA', senza usare la cache.
+
+    Args:
+        path (str): Il percorso del CSV.
+        usecols (list | None): Le colonne da leggere (di default tutte).
+
+    Returns:
+        pd.DataFrame: Il DataFrame delle vendite con tipi categorici, numerici compatti e date convertite.
+    """
+    sales_data = pd.read_csv(path, usecols=usecols, dtype=SALES_SCHEMA)                 # Tipi applicati direttamente in lettura.
+    return parse_sales_datetimes(sales_data)
+
+def load_sales_data(path=None, usecols=None, use_cache=True, cache_dir=None):
+    """
+    Carica il CSV delle vendite, dalla cache colonnare se il file non è cambiato dall'ultima lettura.
+
+    Args:
+        path (str | None): Il percorso del CSV; se assente si usa la variabile d'ambiente o il file predefinito.
+        usecols (list | None): Le colonne da leggere (di default tutte; con un sottoinsieme la cache non è usata).
+        use_cache (bool): Se False il CSV viene sempre analizzato da capo.
+        cache_dir (str | None): La cartella della cache; se assente si usa la variabile d'ambiente o quella predefinita.
+
+    Returns:
+        pd.DataFrame: Il DataFrame delle vendite con tipi categorici, numerici compatti e date convertite.
+    """
+    path = resolve_path(path, SALES_CSV_ENV, DEFAULT_SALES_CSV)
+    if not use_cache or usecols is not None:
+        return parse_sales_csv(path, usecols)
+    return cached_load('supermarket_sales', path, parse_sales_csv,
+                       resolve_path(cache_dir, CACHE_DIR_ENV, DEFAULT_CACHE_DIR), SCHEMA_VERSION)
+
+def iter_sales_chunks(path=None, chunksize=100_000, usecols=None):
+    """
+    Legge il CSV delle vendite a blocchi di dimensione fissa, applicando lo schema a ogni blocco.
+
+    Args:
+        path (str | None): Il percorso del CSV; se assente si usa la variabile d'ambiente o il file predefinito.
+        chunksize (int): Il numero di righe di ogni blocco.
+        usecols (list | None): Le colonne da leggere (di default tutte).
+
+    Returns:
+        generator: I blocchi del file come DataFrame tipizzati.
+    """
+    path = resolve_path(path, SALES_CSV_ENV, DEFAULT_SALES_CSV)
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=SALES_SCHEMA, chunksize=chunksize):
+        yield parse_sales_datetimes(chunk)
+
+def parse_apple_csv(path):
+    """
+    Analizza il CSV delle mele applicando lo schema dichiarato in 'APPLE_SCHEMA', senza usare la cache.
+
+    La colonna 'Acidity' viene convertita in numero (i valori non numerici, come la riga di testo finale del
+    file, diventano mancanti) e le righe incomplete vengono scartate, come faceva lo script originale.
+
+    Args:
+        path (str): Il percorso del CSV.
+
+    Returns:
+        pd.DataFrame: Il DataFrame delle mele con caratteristiche in float32, 'A_id' in int32 e 'Quality' categorica.
+    """
+    apple_data = pd.read_csv(path, dtype=APPLE_SCHEMA)
+    apple_data['Acidity'] = pd.to_numeric(apple_data['Acidity'], errors='coerce').astype('float32')  # I valori non numerici diventano NaN.
+    apple_data = apple_data.dropna()                                                    # Elimina le righe con valori mancanti.
+    apple_data['A_id'] = apple_data['A_id'].astype('int32')                             # Senza valori mancanti l'identificativo può essere intero.
+    return apple_data.reset_index(drop=True)
+
+def load_apple_data(path=None, use_cache=True, cache_dir=None):
+    """
+    Carica il CSV delle mele, dalla cache colonnare se il file non è cambiato dall'ultima lettura.
+
+    Args:
+        path (str | None): Il percorso del CSV; se assente si usa la variabile d'ambiente o il file predefinito.
+        use_cache (bool): Se False il CSV viene sempre analizzato da capo.
+        cache_dir (str | None): La cartella della cache; se assente si usa la variabile d'ambiente o quella predefinita.
+
+    Returns:
+        pd.DataFrame: Il DataFrame delle mele pulito e tipizzato.
+    """
+    path = resolve_path(path, APPLE_CSV_ENV, DEFAULT_APPLE_CSV)
+    if not use_cache:
+        return parse_apple_csv(path)
+    return cached_load('apple_quality', path, parse_apple_csv,
+                       resolve_path(cache_dir, CACHE_DIR_ENV, DEFAULT_CACHE_DIR), SCHEMA_VERSION)
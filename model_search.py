@@ -0,0 +1,153 @@
+# ###########################################################################################################
+# Ricerca del modello della qualità delle mele con validazione incrociata in parallelo
+# ###########################################################################################################
+#
+# Invece di una sola divisione training/test con iperparametri fissi, ogni combinazione della griglia di
+# RandomForest (n_estimators, max_depth, max_features) viene valutata con una validazione incrociata a k fold
+# stratificati. Per contenere i tempi:
+# - fold e combinazioni vengono eseguiti in un pool di processi; i dati vengono inviati una sola volta a ogni
+#   processo (all'avvio), non a ogni compito;
+# - per ogni (max_depth, max_features) e fold si addestra una sola foresta con 'warm_start': gli alberi vengono
+#   aggiunti un po' alla volta (es. 50, poi 100, poi 200) invece di ripartire da zero per ogni n_estimators;
+# - dopo i primi fold le combinazioni nettamente peggiori della migliore vengono scartate e non completano gli
+#   altri fold.
+# Per ogni combinazione vengono riportati l'accuratezza media, il tempo di addestramento e il tempo di
+# previsione per record, così da scegliere il modello più accurato entro un budget di latenza.
+
+import itertools                                                                        # Per il prodotto cartesiano della griglia
+import time                                                                             # Per misurare i tempi di addestramento e previsione
+from concurrent.futures import ProcessPoolExecutor                                      # Pool di processi per fold e combinazioni in parallelo
+import numpy as np                                                                      # NumPy per le matrici delle caratteristiche
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+
+DEFAULT_GRID = {                                                                        # Griglia predefinita degli iperparametri di RandomForest
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 8, 16],
+    'max_features': ['sqrt', 0.5, None],                                                # Con 7 caratteristiche: 2, 3 o tutte per ogni divisione
+}
+DEFAULT_FOLDS = 5                                                                       # Numero di fold della validazione incrociata
+DEFAULT_MIN_FOLDS = 2                                                                   # Fold completati da tutte le combinazioni prima di scartare le peggiori
+DEFAULT_PRUNE_MARGIN = 0.02                                                             # Scarto massimo di accuratezza dalla migliore per restare in gara
+
+_worker_data = {}                                                                       # Dati della ricerca, inviati una sola volta a ogni processo del pool
+
+def _init_worker(X, y):
+    """
+    Inizializza un processo del pool con le caratteristiche e le etichette della ricerca.
+
+    Args:
+        X (np.ndarray): La matrice delle caratteristiche.
+        y (np.ndarray): Le etichette.
+
+    Returns:
+        None
+    """
+    _worker_data['X'] = X
+    _worker_data['y'] = y
+
+def evaluate_group(params, n_estimators, train_index, test_index, random_state):
+    """
+    Valuta su un fold tutte le combinazioni che differiscono solo per n_estimators, con una foresta 'warm_start'.
+
+    Args:
+        params (dict): Gli altri iperparametri (max_depth, max_features).
+        n_estimators (list): I numeri di alberi da valutare, in ordine crescente.
+        train_index (np.ndarray): Le righe di addestramento del fold.
+        test_index (np.ndarray): Le righe di validazione del fold.
+        random_state (int): Il seme della foresta.
+
+    Returns:
+        list: Per ogni n_estimators, accuratezza, tempo di addestramento cumulato e tempo di previsione per record.
+    """
+    from sklearn.ensemble import RandomForestClassifier                                 # Classificatore Random Forest per problemi di classificazione
+
+    X, y = _worker_data['X'], _worker_data['y']
+    X_train, y_train, X_test, y_test = X[train_index], y[train_index], X[test_index], y[test_index]
+    model = RandomForestClassifier(warm_start=True, random_state=random_state, n_jobs=1, **params)  # Il parallelismo è già dato dal pool.
+    fit_seconds = 0.0
+    scores = []
+    for trees in n_estimators:
+        model.set_params(n_estimators=trees)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)                                                     # Aggiunge solo gli alberi mancanti.
+        fit_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        accuracy = float((model.predict(X_test) == y_test).mean())
+        predict_seconds = time.perf_counter() - start
+        scores.append({'n_estimators': trees, 'accuracy': accuracy, 'fit_s': fit_seconds,
+                       'predict_us': predict_seconds / len(test_index) * 1e6})
+    return scores
+
+def search(X, y, grid=None, folds=DEFAULT_FOLDS, processes=None, min_folds=DEFAULT_MIN_FOLDS,
+           prune_margin=DEFAULT_PRUNE_MARGIN, random_state=42):
+    """
+    Valuta la griglia di iperparametri con una validazione incrociata a k fold, in parallelo e con potatura.
+
+    Args:
+        X (np.ndarray): La matrice delle caratteristiche.
+        y (np.ndarray): Le etichette.
+        grid (dict | None): I valori da provare per ogni iperparametro (di default 'DEFAULT_GRID').
+        folds (int): Il numero di fold.
+        processes (int | None): Il numero di processi del pool (di default uno per core).
+        min_folds (int): I fold completati da tutte le combinazioni prima di scartare quelle peggiori.
+        prune_margin (float): Le combinazioni con accuratezza media inferiore alla migliore meno questo margine
+            vengono scartate.
+        random_state (int): Il seme dei fold e delle foreste.
+
+    Returns:
+        pd.DataFrame: Una riga per combinazione, ordinate per accuratezza media decrescente, con i tempi medi
+            di addestramento e di previsione e il numero di fold completati ('pruned' = scartata in anticipo).
+    """
+    from sklearn.model_selection import StratifiedKFold                                 # Fold con la stessa proporzione di classi del dataset
+
+    grid = dict(DEFAULT_GRID if grid is None else grid)
+    n_estimators = sorted(grid.pop('n_estimators'))
+    names = list(grid)
+    groups = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state).split(X, y))
+
+    scores = {index: [] for index in range(len(groups))}                                # Risultati per fold di ogni gruppo di combinazioni
+    alive = list(range(len(groups)))
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(X, y)) as pool:
+        for fold_range in (range(min(min_folds, folds)), range(min(min_folds, folds), folds)):
+            futures = {(index, fold): pool.submit(evaluate_group, groups[index], n_estimators, *splits[fold], random_state)
+                       for index in alive for fold in fold_range}
+            for (index, fold), future in futures.items():
+                scores[index].append(future.result())
+            best = {index: max(np.mean([fold[step]['accuracy'] for fold in scores[index]])
+                               for step in range(len(n_estimators))) for index in alive}
+            leader = max(best.values())
+            alive = [index for index in alive if best[index] >= leader - prune_margin]  # Le combinazioni nettamente peggiori non completano i fold.
+
+    rows = []
+    for index, group in enumerate(groups):
+        for step, trees in enumerate(n_estimators):
+            fold_scores = [fold[step] for fold in scores[index]]
+            accuracy = [score['accuracy'] for score in fold_scores]
+            rows.append({'n_estimators': trees, **group,
+                         'accuracy': np.mean(accuracy), 'accuracy_std': np.std(accuracy),
+                         'fit_s': np.mean([score['fit_s'] for score in fold_scores]),
+                         'predict_us': np.mean([score['predict_us'] for score in fold_scores]),
+                         'folds': len(fold_scores), 'pruned': len(fold_scores) < folds})
+    results = pd.DataFrame(rows)
+    for name in names:
+        results[name] = pd.Series([row[name] for row in rows], dtype=object)           # Mantiene None (es. max_depth senza limite) invece di NaN.
+    return results.sort_values(['pruned', 'accuracy'], ascending=[True, False], kind='stable').reset_index(drop=True)
+
+def choose_model(results, latency_budget_us=None):
+    """
+    Sceglie la combinazione più accurata tra quelle che hanno completato tutti i fold e rispettano il budget.
+
+    Args:
+        results (pd.DataFrame): Il risultato di 'search'.
+        latency_budget_us (float | None): Il tempo di previsione massimo per record, in microsecondi.
+
+    Returns:
+        pd.Series | None: La combinazione scelta, oppure None se nessuna rispetta il budget.
+    """
+    eligible = results[~results['pruned']]
+    if latency_budget_us is not None:
+        eligible = eligible[eligible['predict_us'] <= latency_budget_us]
+    if eligible.empty:
+        return None
+    return eligible.loc[eligible['accuracy'].idxmax()]
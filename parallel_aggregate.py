@@ -0,0 +1,288 @@
+# ###########################################################################################################
+# Aggregazione map-reduce su più core: il cubo delle vendite calcolato a partizioni in un pool di processi
+# ###########################################################################################################
+#
+# 'build_sales_cube' esegue un solo groupby su un solo core. Qui la stessa aggregazione viene divisa:
+# - map: ogni processo del pool riceve un intervallo di righe e calcola, per ogni cella del cubo (Città x Tipo di
+#   cliente x Genere x Categoria di prodotto x Mese), la somma di ogni misura e il numero di righe, con un
+#   'np.bincount' sul codice misto delle dimensioni;
+# - reduce: i parziali sono array piccoli (una posizione per cella) e vengono semplicemente sommati.
+# Il risultato è un DataFrame nello stesso formato di 'build_sales_cube', quindi 'rollup' e il report non
+# cambiano.
+#
+# Le colonne non vengono inviate ai processi come DataFrame serializzati: il processo principale le traduce in
+# codici interi (le categorie sono già codici) e le copia una sola volta in un blocco di memoria condivisa
+# ('multiprocessing.shared_memory'); ogni processo le legge direttamente da lì, senza copie. I compiti sono solo
+# coppie (inizio, fine).
+#
+# Le righe possono essere partizionate per intervalli ('rows') oppure raggruppate per 'Branch' o 'City': in quel
+# caso le righe di ogni filiale o città vengono rese contigue durante la copia e ogni compito cade dentro una sola
+# partizione. Le partizioni grandi vengono a loro volta divise in più compiti, così tutti i processi restano
+# occupati anche con tre sole filiali.
+
+import os                                                                               # Per il numero di core disponibili
+from concurrent.futures import ProcessPoolExecutor                                      # Pool di processi per i parziali in parallelo
+from multiprocessing import shared_memory                                               # Blocco di memoria condivisa con le colonne
+import numpy as np                                                                      # NumPy per i codici delle dimensioni e le somme vettorizzate
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from sales_cube import COUNT_COLUMN, CUBE_DIMENSIONS, CUBE_MEASURES                     # Stesse dimensioni e misure del cubo seriale
+
+PARTITION_MODES = ('rows', 'Branch', 'City')                                            # Modi di partizionare le righe tra i compiti
+TASKS_PER_PROCESS = 4                                                                   # Compiti per processo: bilanciano partizioni di dimensioni diverse
+MIN_TASK_ROWS = 65_536                                                                  # Righe minime per compito: sotto questa soglia il pool costa più del calcolo
+
+_worker_columns = {}                                                                    # Colonne lette dalla memoria condivisa, in ogni processo del pool
+
+def dimension_codes(sales_data, dimension):
+    """
+    Traduce una dimensione in codici interi ordinati, come li ordina il groupby del cubo seriale.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite.
+        dimension (str): La dimensione ('Month' viene ricavata da 'Date' se non è presente).
+
+    Returns:
+        tuple: (codici int32, -1 per i valori mancanti; funzione che traduce un array di codici nei valori della
+            colonna, con lo stesso tipo del cubo seriale).
+    """
+    if dimension == 'Month' and 'Month' not in sales_data.columns:
+        months = pd.to_datetime(sales_data['Date']).to_numpy().astype('datetime64[M]').astype(np.int64)  # Ordinale del mese, come quello dei periodi mensili.
+        first = months.min() if len(months) else 0
+        return (months - first).astype(np.int32), lambda codes: pd.PeriodIndex.from_ordinals(codes + first, freq='M')
+    column = sales_data[dimension]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(np.int32), lambda codes: pd.Categorical.from_codes(codes, dtype=column.dtype)
+    codes, uniques = pd.factorize(column, sort=True)
+    return codes.astype(np.int32), lambda codes: uniques.take(codes)
+
+def _columns(buffer, layout):
+    """
+    Costruisce le viste NumPy delle colonne sopra un blocco di memoria, senza copiarle.
+
+    Args:
+        buffer (memoryview): Il contenuto del blocco di memoria condivisa.
+        layout (dict): Per ogni colonna (posizione in byte, tipo, numero di righe).
+
+    Returns:
+        dict: Le colonne, per nome.
+    """
+    return {name: np.ndarray((rows,), dtype=dtype, buffer=buffer, offset=offset) for name, (offset, dtype, rows) in layout.items()}
+
+def share_columns(sales_data, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, partition_by='rows', hashed=()):
+    """
+    Copia codici delle dimensioni e misure in un blocco di memoria condivisa, raggruppando le righe se richiesto.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite.
+        dimensions (list): Le dimensioni del cubo.
+        measures (list): Le misure da sommare.
+        partition_by (str): 'rows', 'Branch' oppure 'City'.
+        hashed (iterable): Colonne condivise come hash a 64 bit dei valori (es. 'Invoice ID' per i conteggi distinti).
+
+    Returns:
+        tuple: (blocco di memoria condivisa, disposizione delle colonne, traduttori dei codici per dimensione,
+            numero di valori di ogni dimensione, confini delle partizioni come array di posizioni).
+
+    Raises:
+        ValueError: Se il modo di partizionamento non è supportato.
+    """
+    if partition_by not in PARTITION_MODES:
+        raise ValueError(f"Partizionamento non supportato: {partition_by} (disponibili: {', '.join(PARTITION_MODES)})")
+    columns, decoders, sizes = {}, {}, {}
+    for dimension in dimensions:
+        codes, decoders[dimension] = dimension_codes(sales_data, dimension)
+        columns[dimension] = codes
+        sizes[dimension] = int(codes.max()) + 1 if len(codes) else 0
+    for measure in measures:
+        columns[measure] = sales_data[measure].to_numpy(dtype=np.float64)
+    for column in hashed:
+        columns[column] = pd.util.hash_array(sales_data[column].to_numpy())             # Lo stesso valore ha lo stesso hash in ogni processo.
+
+    rows = len(sales_data)
+    order, bounds = None, np.array([0, rows])
+    if partition_by != 'rows':
+        keys, _ = dimension_codes(sales_data, partition_by)
+        order = np.argsort(keys, kind='stable')                                        # Le righe di ogni filiale o città diventano contigue.
+        bounds = np.r_[0, np.flatnonzero(np.diff(keys[order])) + 1, rows]
+
+    layout, offset = {}, 0
+    for name, values in columns.items():
+        layout[name] = (offset, values.dtype.str, rows)
+        offset += -(-values.nbytes // 8) * 8                                            # Ogni colonna allineata a 8 byte.
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    shared = _columns(block.buf, layout)
+    for name, values in columns.items():
+        shared[name][:] = values if order is None else values[order]                   # L'unica copia delle colonne.
+    del shared                                                                          # Le viste devono sparire prima di chiudere il blocco.
+    return block, layout, decoders, sizes, bounds
+
+def plan_tasks(bounds, processes, min_rows=MIN_TASK_ROWS):
+    """
+    Divide le partizioni in compiti (inizio, fine), abbastanza numerosi da occupare tutti i processi.
+
+    Args:
+        bounds (np.ndarray): I confini delle partizioni (la prima posizione è 0, l'ultima il numero di righe).
+        processes (int): Il numero di processi del pool.
+        min_rows (int): Le righe minime di un compito.
+
+    Returns:
+        list: I compiti, ciascuno dentro una sola partizione.
+    """
+    rows = int(bounds[-1])
+    target = max(min_rows, -(-rows // (processes * TASKS_PER_PROCESS)))                 # Righe per compito, arrotondate per eccesso.
+    tasks = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        pieces = max(1, -(-(int(stop) - int(start)) // target))
+        edges = np.linspace(start, stop, pieces + 1).astype(np.int64)
+        tasks += [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+    return tasks
+
+def cell_codes(columns, start, stop, dimensions, sizes):
+    """
+    Calcola il codice misto della cella del cubo di ogni riga di un intervallo.
+
+    Args:
+        columns (dict): Le colonne condivise.
+        start (int): La prima riga.
+        stop (int): La riga successiva all'ultima.
+        dimensions (list): Le dimensioni del cubo, nell'ordine del codice misto.
+        sizes (dict): Il numero di valori di ogni dimensione.
+
+    Returns:
+        tuple: (codici delle celle delle righe valide, maschera delle righe valide, numero di celle possibili).
+    """
+    cells = np.zeros(stop - start, dtype=np.int64)
+    valid = np.ones(stop - start, dtype=bool)
+    for dimension in dimensions:                                                        # Codice misto: (città, tipo, genere, ...) -> un solo intero.
+        codes = columns[dimension][start:stop]
+        valid &= codes >= 0                                                             # Come il groupby: le righe con una dimensione mancante non contano.
+        cells = cells * sizes[dimension] + codes
+    return cells[valid], valid, int(np.prod([sizes[dimension] for dimension in dimensions], dtype=np.int64))
+
+def _init_worker(name, layout):
+    """
+    Inizializza un processo del pool: apre il blocco di memoria condivisa e ne ricava le colonne.
+
+    Args:
+        name (str): Il nome del blocco.
+        layout (dict): La disposizione delle colonne.
+
+    Returns:
+        None
+    """
+    _worker_columns['block'] = shared_memory.SharedMemory(name=name)                    # Il riferimento tiene aperto il blocco per tutta la vita del processo.
+    _worker_columns['columns'] = _columns(_worker_columns['block'].buf, layout)
+
+def _run_task(func, start, stop, args):
+    """
+    Esegue un compito in un processo del pool, sulle colonne in memoria condivisa.
+
+    Args:
+        func (callable): La funzione 'map', chiamata come func(colonne, inizio, fine, *args).
+        start (int): La prima riga.
+        stop (int): La riga successiva all'ultima.
+        args (tuple): Gli altri argomenti della funzione.
+
+    Returns:
+        Il risultato parziale del compito.
+    """
+    return func(_worker_columns['columns'], start, stop, *args)
+
+def map_partitions(block, layout, tasks, func, args, processes):
+    """
+    Applica una funzione 'map' a ogni compito, in un pool di processi che legge le colonne dalla memoria condivisa.
+
+    Args:
+        block (shared_memory.SharedMemory): Il blocco con le colonne (vedi 'share_columns').
+        layout (dict): La disposizione delle colonne.
+        tasks (list): I compiti (inizio, fine).
+        func (callable): La funzione di livello di modulo chiamata come func(colonne, inizio, fine, *args).
+        args (tuple): Gli altri argomenti della funzione, uguali per tutti i compiti.
+        processes (int): Il numero di processi del pool.
+
+    Returns:
+        list: I risultati parziali, nell'ordine dei compiti.
+    """
+    if processes == 1 or len(tasks) <= 1:                                               # Un solo compito: il pool costerebbe più del calcolo.
+        return [func(_columns(block.buf, layout), start, stop, *args) for start, stop in tasks]
+    with ProcessPoolExecutor(max_workers=min(processes, len(tasks)), initializer=_init_worker,
+                             initargs=(block.name, layout)) as pool:
+        futures = [pool.submit(_run_task, func, start, stop, args) for start, stop in tasks]
+        return [future.result() for future in futures]
+
+def partial_cube(columns, start, stop, dimensions, measures, sizes):
+    """
+    Calcola somme e conteggi di ogni cella del cubo su un intervallo di righe (la fase 'map').
+
+    Args:
+        columns (dict): Le colonne condivise.
+        start (int): La prima riga.
+        stop (int): La riga successiva all'ultima.
+        dimensions (list): Le dimensioni del cubo, nell'ordine del codice misto.
+        measures (list): Le misure da sommare.
+        sizes (dict): Il numero di valori di ogni dimensione.
+
+    Returns:
+        tuple: (conteggi per cella, matrice misure x celle delle somme).
+    """
+    cells, valid, size = cell_codes(columns, start, stop, dimensions, sizes)
+    counts = np.bincount(cells, minlength=size)
+    sums = np.empty((len(measures), size))
+    for position, measure in enumerate(measures):
+        values = columns[measure][start:stop][valid]
+        sums[position] = np.bincount(cells, weights=np.nan_to_num(values), minlength=size)  # I valori mancanti valgono 0, come in 'sum'.
+    return counts, sums
+
+def cube_from_cells(counts, sums, dimensions, measures, sizes, decoders):
+    """
+    Converte somme e conteggi per cella nel DataFrame del cubo, con le sole celle osservate (la fase 'reduce').
+
+    Args:
+        counts (np.ndarray): Il numero di righe di ogni cella.
+        sums (np.ndarray): Le somme (misure x celle).
+        dimensions (list): Le dimensioni del cubo.
+        measures (list): Le misure sommate.
+        sizes (dict): Il numero di valori di ogni dimensione.
+        decoders (dict): Per ogni dimensione, la funzione che traduce i codici nei valori.
+
+    Returns:
+        pd.DataFrame: Il cubo, nello stesso formato (colonne, tipi e ordine) di 'build_sales_cube'.
+    """
+    observed = np.flatnonzero(counts)                                                   # Come 'observed=True': solo le combinazioni presenti.
+    codes = np.unravel_index(observed, [sizes[dimension] for dimension in dimensions]) if dimensions else ()
+    cube = pd.DataFrame({dimension: decoders[dimension](code) for dimension, code in zip(dimensions, codes)})
+    for position, measure in enumerate(measures):
+        cube[measure] = sums[position][observed]
+    cube[COUNT_COLUMN] = counts[observed].astype(np.int64)
+    return cube
+
+def build_sales_cube_parallel(sales_data, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, partition_by='rows', processes=None):
+    """
+    Costruisce il cubo di aggregazione in un pool di processi, con le colonne in memoria condivisa.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite.
+        dimensions (list): Le colonne che definiscono il livello di dettaglio del cubo.
+        measures (list): Le colonne numeriche da sommare in ogni cella.
+        partition_by (str): 'rows' (intervalli di righe), 'Branch' oppure 'City'.
+        processes (int | None): Il numero di processi del pool (di default uno per core).
+
+    Returns:
+        pd.DataFrame: Il cubo, con le stesse celle, somme e conteggi di 'build_sales_cube'.
+    """
+    dimensions, measures = list(dimensions), list(measures)
+    processes = processes or os.cpu_count() or 1
+    block, layout, decoders, sizes, bounds = share_columns(sales_data, dimensions, measures, partition_by)
+    try:
+        tasks = plan_tasks(bounds, processes)
+        size = int(np.prod([sizes[dimension] for dimension in dimensions], dtype=np.int64))
+        counts, sums = np.zeros(size, dtype=np.int64), np.zeros((len(measures), size))
+        parts = map_partitions(block, layout, tasks, partial_cube, (dimensions, measures, sizes), processes)
+        for part_counts, part_sums in parts:                                            # I parziali sono additivi: basta sommarli.
+            counts += part_counts
+            sums += part_sums
+        del parts
+    finally:
+        block.close()
+        block.unlink()                                                                  # Il blocco è del processo principale: viene eliminato qui.
+    return cube_from_cells(counts, sums, dimensions, measures, sizes, decoders)
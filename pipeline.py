@@ -0,0 +1,274 @@
+# ###########################################################################################################
+# Pipeline a stadi con memorizzazione su disco dei risultati intermedi
+# ###########################################################################################################
+#
+# Il lavoro dello script è dichiarato come un grafo di stadi con nome (caricamento, pulizia, aggregazione,
+# addestramento, valutazione, previsione, ...). Ogni stadio è un dizionario con:
+# - 'run': la funzione che calcola il risultato, chiamata con i risultati degli stadi in ingresso e i parametri;
+# - 'inputs': i nomi degli stadi da cui dipende (di default nessuno);
+# - 'params': i parametri dello stadio, serializzabili in JSON (es. il percorso del CSV, il seme casuale);
+# - 'key': valori aggiuntivi che entrano nella chiave ma non vengono passati a 'run' (es. l'hash del CSV letto);
+#   può essere una funzione, chiamata solo se lo stadio serve davvero;
+# - 'persist': se False il risultato non viene salvato su disco (stadi già economici, es. letture dalla cache
+#   colonnare di 'loaders.py');
+# - 'rows': facoltativa, la funzione che conta le righe elaborate a partire dagli ingressi, per la
+#   strumentazione (di default le righe del primo ingresso, o del risultato per gli stadi senza ingressi).
+#
+# La chiave di ogni stadio è l'hash del suo nome, dei parametri, del codice della funzione 'run' e delle chiavi
+# degli stadi in ingresso: se cambia qualcosa a monte cambiano le chiavi di tutti gli stadi a valle, e solo
+# quelli vengono ricalcolati. Il codice comprende le funzioni di questo progetto chiamate da 'run', a qualsiasi
+# profondità (es. 'rollup' o 'build_sales_cube'), e le costanti semplici che usano (es. 'CUBE_DIMENSIONS'); le
+# librerie esterne (pandas, scikit-learn, ...) non ne fanno parte: dopo un loro aggiornamento serve
+# '--no-stage-cache'. Gli stadi con una voce valida in cache non caricano nemmeno i propri ingressi.
+#
+# La cache su disco ha una dimensione massima: quando viene superata, le voci usate meno di recente vengono
+# eliminate (LRU). La data di modifica della cartella di ogni voce fa da orologio dell'ultimo utilizzo.
+
+import hashlib                                                                          # Per le chiavi degli stadi
+import json                                                                             # Per serializzare in modo stabile i parametri
+import os                                                                               # Per la gestione delle cartelle della cache
+import pickle                                                                           # Per i risultati che non sono DataFrame (modelli, report)
+import shutil                                                                           # Per eliminare le voci meno usate
+import sys                                                                              # Per i moduli importati dentro le funzioni degli stadi
+import tempfile                                                                         # Per scrivere le voci in modo atomico
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from column_cache import META_FILE, load_frame, save_frame                              # I DataFrame vengono salvati come colonne '.npy' in memory-mapping
+from loaders import CACHE_DIR_ENV, DEFAULT_CACHE_DIR, resolve_path                      # Cartella predefinita della cache
+from instrumentation import count_rows, span                                            # Tempo, CPU, righe e memoria di ogni stadio (se la strumentazione è attiva)
+
+STAGES_DIR = 'stages'                                                                   # Sottocartella della cache con i risultati degli stadi
+VALUE_FILE = 'value.pkl'                                                                # File con i risultati che non sono DataFrame
+DEFAULT_MAX_BYTES = 256 << 20                                                           # Dimensione massima predefinita della cache degli stadi (256 MB)
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))                                # Le funzioni definite qui fanno parte dell'impronta del codice
+SIMPLE_CONSTANTS = (bool, int, float, str, bytes, tuple, list, dict, frozenset)         # Costanti globali il cui valore entra nell'impronta
+
+def default_stage_cache_dir():
+    """
+    Restituisce la cartella predefinita della cache degli stadi, dentro la cache colonnare dei dataset.
+
+    Returns:
+        str: Il percorso della cartella.
+    """
+    return os.path.join(resolve_path(None, CACHE_DIR_ENV, DEFAULT_CACHE_DIR), STAGES_DIR)
+
+def _in_project(value):
+    """
+    Indica se un valore è una funzione o un modulo di questo progetto (non di una libreria esterna).
+
+    Args:
+        value: Il valore da controllare.
+
+    Returns:
+        bool: True per le funzioni e i moduli definiti nella cartella del progetto.
+    """
+    path = getattr(getattr(value, '__code__', None), 'co_filename', None) or getattr(value, '__file__', None)
+    return isinstance(path, str) and os.path.dirname(os.path.abspath(path)) == PROJECT_DIR
+
+def code_fingerprint(func):
+    """
+    Calcola un'impronta del codice di una funzione e delle funzioni del progetto che chiama, indipendente dai numeri di riga.
+
+    Modificare il corpo di uno stadio o di un suo helper (anche indiretto) ne cambia quindi la chiave, senza dover
+    incrementare una versione a mano. Lo stesso vale per le costanti globali semplici usate (liste, dizionari, numeri).
+
+    Args:
+        func (callable): La funzione dello stadio.
+
+    Returns:
+        str: L'hash esadecimale del bytecode e delle costanti della funzione e dei suoi helper.
+    """
+    digest = hashlib.sha256()
+    seen = set()
+    functions = [func]
+    while functions:
+        function = functions.pop()
+        if function in seen:
+            continue
+        seen.add(function)
+        namespace = getattr(function, '__globals__', {})
+        digest.update(repr((function.__defaults__, function.__kwdefaults__)).encode())  # Es. 'dimensions=CUBE_DIMENSIONS' di 'build_sales_cube'.
+        pending = [function.__code__]
+        while pending:
+            code = pending.pop()
+            digest.update(code.co_code)
+            digest.update(repr(code.co_names).encode())
+            for constant in code.co_consts:
+                if hasattr(constant, 'co_code'):
+                    pending.append(constant)                                            # Funzioni annidate e comprensioni: il loro codice conta.
+                else:
+                    digest.update(repr(constant).encode())
+            modules = [module for module in (namespace.get(name, sys.modules.get(name)) for name in code.co_names)
+                       if _in_project(module) and not callable(module)]                 # Moduli del progetto, anche importati dentro la funzione.
+            for name in code.co_names:
+                candidates = [namespace.get(name)] + [getattr(module, name, None) for module in modules]
+                for value in candidates:
+                    if callable(value) and _in_project(value) and hasattr(value, '__code__'):
+                        functions.append(value)                                         # Helper del progetto: il suo codice entra nell'impronta.
+                    elif isinstance(value, SIMPLE_CONSTANTS) and value is candidates[0]:
+                        digest.update(f'{name}={value!r}'.encode())                     # Es. 'CUBE_DIMENSIONS': cambiarla cambia i risultati.
+    return digest.hexdigest()
+
+def stage_keys(stages, targets=None):
+    """
+    Calcola la chiave di ogni stadio senza eseguire nulla.
+
+    Args:
+        stages (dict): Gli stadi, per nome.
+        targets (list | None): Se indicati, solo questi stadi e quelli da cui dipendono (di default tutti).
+
+    Returns:
+        dict: La chiave esadecimale di ogni stadio, per nome.
+
+    Raises:
+        KeyError: Se uno stadio dipende da uno stadio non dichiarato.
+        ValueError: Se il grafo contiene un ciclo.
+    """
+    keys = {}
+    visiting = set()
+
+    def visit(name):
+        if name in keys:
+            return keys[name]
+        if name not in stages:
+            raise KeyError(f"Stadio non dichiarato: {name}")
+        if name in visiting:
+            raise ValueError(f"Ciclo nel grafo degli stadi in corrispondenza di: {name}")
+        visiting.add(name)
+        stage = stages[name]
+        extra = stage.get('key')
+        payload = {
+            'name': name,
+            'params': stage.get('params', {}),
+            'key': extra() if callable(extra) else extra,
+            'code': code_fingerprint(stage['run']),
+            'inputs': [visit(dependency) for dependency in stage.get('inputs', ())],
+        }
+        visiting.discard(name)
+        keys[name] = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        return keys[name]
+
+    for name in stages if targets is None else targets:
+        visit(name)
+    return keys
+
+def run_pipeline(stages, targets, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, status=None, tracer=None):
+    """
+    Calcola gli stadi richiesti, riusando i risultati memorizzati su disco quando le chiavi coincidono.
+
+    Args:
+        stages (dict): Gli stadi, per nome.
+        targets (list | str): Lo stadio o gli stadi di cui servono i risultati.
+        cache_dir (str | None): La cartella della cache degli stadi; None = nessuna memorizzazione su disco.
+        max_bytes (int): La dimensione massima della cache: oltre questa soglia si eliminano le voci meno usate.
+        status (dict | None): Se indicato, riceve per ogni stadio toccato 'cached' oppure 'computed'.
+        tracer (dict | None): Lo stato della strumentazione (vedi 'instrumentation.py'): uno span per stadio.
+
+    Returns:
+        dict: I risultati degli stadi richiesti (e di quelli calcolati per arrivarci), per nome.
+    """
+    if isinstance(targets, str):
+        targets = [targets]
+    keys = stage_keys(stages, targets)
+    results = {}
+    status = {} if status is None else status
+
+    def resolve(name):
+        if name in results:
+            return results[name]
+        stage = stages[name]
+        persist = cache_dir is not None and stage.get('persist', True)
+        entry = os.path.join(cache_dir, f'{name}-{keys[name][:16]}') if persist else None
+        if entry and os.path.isdir(entry):
+            with span(tracer, name) as record:
+                results[name] = _load_value(entry)
+                record.update(cached=True, rows=count_rows(results[name]))
+            os.utime(entry)                                                             # Aggiorna l'orologio LRU della voce.
+            status[name] = 'cached'
+            return results[name]
+
+        inputs = [resolve(dependency) for dependency in stage.get('inputs', ())]       # Solo ora servono gli ingressi: la cache dello stadio non è valida.
+        with span(tracer, name) as record:                                              # Gli ingressi sono già pronti: lo span misura solo questo stadio.
+            results[name] = stage['run'](*inputs, **stage.get('params', {}))
+            if 'rows' in stage:
+                record['rows'] = stage['rows'](*inputs)
+            else:
+                record['rows'] = count_rows(inputs[0] if inputs else results[name])
+        status[name] = 'computed'
+        if entry:
+            _save_value(results[name], entry)
+            evict_lru(cache_dir, max_bytes, keep=entry)
+        return results[name]
+
+    for target in targets:
+        resolve(target)
+    return results
+
+def evict_lru(cache_dir, max_bytes, keep=None):
+    """
+    Elimina le voci usate meno di recente finché la cache non rientra nella dimensione massima.
+
+    Args:
+        cache_dir (str): La cartella della cache degli stadi.
+        max_bytes (int): La dimensione massima della cache.
+        keep (str | None): Una voce da non eliminare (es. quella appena scritta).
+
+    Returns:
+        list: Le voci eliminate.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith('.tmp-') or not os.path.isdir(path):
+            continue
+        size = sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+        entries.append((os.stat(path).st_mtime_ns, path, size))
+
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, path, size in sorted(entries):                                               # Dalla voce usata meno di recente.
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed.append(path)
+    return removed
+
+def _save_value(value, entry):
+    """
+    Salva il risultato di uno stadio: i DataFrame come colonne '.npy', il resto con pickle.
+
+    Args:
+        value: Il risultato dello stadio.
+        entry (str): La cartella della voce di cache.
+
+    Returns:
+        None
+    """
+    if isinstance(value, pd.DataFrame):
+        save_frame(value, entry)
+        return
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.tmp-')                              # Scrive in una cartella temporanea, poi la rinomina.
+    with open(os.path.join(staging, VALUE_FILE), 'wb') as handle:
+        pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    if os.path.exists(entry):
+        shutil.rmtree(entry)
+    os.replace(staging, entry)
+
+def _load_value(entry):
+    """
+    Rilegge il risultato di uno stadio salvato con '_save_value'.
+
+    Args:
+        entry (str): La cartella della voce di cache.
+
+    Returns:
+        Il risultato dello stadio.
+    """
+    if os.path.exists(os.path.join(entry, META_FILE)):
+        return load_frame(entry)
+    with open(os.path.join(entry, VALUE_FILE), 'rb') as handle:
+        return pickle.load(handle)
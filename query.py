@@ -0,0 +1,251 @@
+# ###########################################################################################################
+# Interrogazioni ad hoc sulle vendite: raggruppamenti, filtri e misure a richiesta, con cache dei risultati
+# ###########################################################################################################
+#
+# I raggruppamenti del report sono scritti nel codice: una domanda nuova (es. "margine lordo per metodo di
+# pagamento e città a marzo") richiederebbe di modificare lo script. Qui una interrogazione è descritta da:
+# - le dimensioni del raggruppamento (anche nessuna: un solo totale);
+# - i filtri, come valori ammessi per colonna (es. {'Month': ['2019-03']});
+# - le misure ('Total', 'cogs', 'gross income', 'Quantity', 'Rating'), ciascuna sommata, mediata o contata.
+#
+# Le risposte vengono calcolate dal cubo delle interrogazioni: lo stesso cubo di 'sales_cube' con più dimensioni
+# (anche filiale e metodo di pagamento) e tutte le misure, poche centinaia di celle anche con milioni di righe.
+# Le medie derivano da somme e conteggi, quindi anche 'Rating' si ricava esattamente dalle celle. Solo le
+# interrogazioni su colonne che il cubo non contiene (es. 'Date') tornano alle righe, caricate una sola volta.
+#
+# I risultati restano in una cache LRU in memoria, limitata in byte e protetta da un lock: le interrogazioni
+# ripetute (es. quelle di una dashboard) non ricalcolano nulla. La cache si svuota quando cambiano i dati.
+
+import threading                                                                        # Lock della cache: il motore può servire più thread
+from collections import OrderedDict                                                     # Ordine d'uso dei risultati, per l'eliminazione LRU
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from sales_cube import COUNT_COLUMN, add_month_column, build_sales_cube                 # Lo stesso cubo del report, con più dimensioni e misure
+
+QUERY_DIMENSIONS = ['Branch', 'City', 'Customer type', 'Gender', 'Product line', 'Payment', 'Month']  # Dimensioni del cubo delle interrogazioni
+QUERY_MEASURES = ['Total', 'cogs', 'gross income', 'Quantity', 'Rating']                # Misure interrogabili
+AGGREGATIONS = ('sum', 'mean', 'count')                                                 # Aggregazioni di una misura, tutte derivabili da somme e conteggi
+DEFAULT_AGGREGATION = {'Rating': 'mean'}                                                # Il voto si media; le altre misure si sommano
+DEFAULT_RESULT_CACHE_BYTES = 64 << 20                                                   # Dimensione massima predefinita della cache dei risultati (64 MB)
+
+def build_query_cube(sales_data):
+    """
+    Costruisce il cubo delle interrogazioni: somme di tutte le misure e conteggi per ogni combinazione delle dimensioni.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite.
+
+    Returns:
+        pd.DataFrame: Il cubo, nel formato di 'build_sales_cube'.
+    """
+    sales_data = sales_data.astype({'Quantity': 'int64', 'Rating': 'float64'})          # Somme esatte anche su milioni di righe (niente int32 né float32).
+    return build_sales_cube(sales_data, QUERY_DIMENSIONS, QUERY_MEASURES)
+
+def parse_filters(conditions):
+    """
+    Converte le condizioni della riga di comando in filtri.
+
+    Args:
+        conditions (list): Condizioni 'COLONNA=VALORE', con più valori ammessi separati da virgole (es. 'City=Yangon,Mandalay').
+
+    Returns:
+        dict: I valori ammessi di ogni colonna (es. {'City': ['Yangon', 'Mandalay']}).
+
+    Raises:
+        ValueError: Se una condizione non ha la forma 'COLONNA=VALORE'.
+    """
+    filters = {}
+    for condition in conditions:
+        column, separator, values = condition.partition('=')
+        if not separator or not column:
+            raise ValueError(f"Condizione non valida: {condition!r} (forma attesa: COLONNA=VALORE)")
+        filters.setdefault(column.strip(), []).extend(value.strip() for value in values.split(','))
+    return filters
+
+def new_query_engine(query_cube, load_rows=None, fingerprint=None, max_bytes=DEFAULT_RESULT_CACHE_BYTES):
+    """
+    Crea il motore delle interrogazioni: il cubo, l'eventuale accesso alle righe e la cache LRU dei risultati.
+
+    Args:
+        query_cube (pd.DataFrame): Il cubo prodotto da 'build_query_cube'.
+        load_rows (callable | None): Funzione senza argomenti che restituisce le righe delle vendite, chiamata solo
+            dalla prima interrogazione che il cubo non può soddisfare (None = solo interrogazioni sul cubo).
+        fingerprint (str | None): L'impronta dei dati, parte della chiave di ogni risultato.
+        max_bytes (int): La dimensione massima della cache dei risultati.
+
+    Returns:
+        dict: Lo stato del motore.
+    """
+    return {
+        'cube': query_cube,
+        'load_rows': load_rows,
+        'rows': None,
+        'fingerprint': fingerprint,
+        'results': OrderedDict(),                                                       # Chiave dell'interrogazione -> (risultato, byte).
+        'bytes': 0,
+        'max_bytes': max_bytes,
+        'hits': 0,
+        'misses': 0,
+        'lock': threading.Lock(),
+    }
+
+def refresh_engine(engine, query_cube, load_rows=None, fingerprint=None):
+    """
+    Sostituisce i dati del motore; la cache dei risultati si svuota solo se l'impronta è cambiata.
+
+    Args:
+        engine (dict): Il motore delle interrogazioni.
+        query_cube (pd.DataFrame): Il nuovo cubo.
+        load_rows (callable | None): Il nuovo accesso alle righe.
+        fingerprint (str | None): L'impronta dei nuovi dati.
+
+    Returns:
+        dict: Lo stesso motore.
+    """
+    with engine['lock']:
+        if fingerprint is None or fingerprint != engine['fingerprint']:
+            engine['results'].clear()
+            engine['bytes'] = 0
+        engine.update(cube=query_cube, load_rows=load_rows, rows=None, fingerprint=fingerprint)
+    return engine
+
+def query_key(by=(), measures=('Total',), filters=None, how=None):
+    """
+    Normalizza un'interrogazione in una chiave: lo stesso raggruppamento scritto in modi diversi ha la stessa chiave.
+
+    Args:
+        by (list | str): Le dimensioni del raggruppamento.
+        measures (list | str): Le misure.
+        filters (dict | None): I valori ammessi per colonna.
+        how (str | dict | None): L'aggregazione di tutte le misure o di ciascuna (di default 'DEFAULT_AGGREGATION', poi 'sum').
+
+    Returns:
+        tuple: (dimensioni, misure con la loro aggregazione, filtri ordinati).
+
+    Raises:
+        KeyError: Se una misura non è interrogabile.
+        ValueError: Se un'aggregazione non è supportata.
+    """
+    by = (by,) if isinstance(by, str) else tuple(dict.fromkeys(by))                     # Senza duplicati, nell'ordine dato.
+    measures = (measures,) if isinstance(measures, str) else tuple(dict.fromkeys(measures))
+    unknown = [measure for measure in measures if measure not in QUERY_MEASURES]
+    if unknown:
+        raise KeyError(f"Misure non interrogabili: {unknown} (disponibili: {', '.join(QUERY_MEASURES)})")
+    if not isinstance(how, dict):
+        how = {measure: how or DEFAULT_AGGREGATION.get(measure, 'sum') for measure in measures}
+    aggregations = tuple((measure, how.get(measure) or DEFAULT_AGGREGATION.get(measure, 'sum')) for measure in measures)
+    invalid = [aggregation for _, aggregation in aggregations if aggregation not in AGGREGATIONS]
+    if invalid:
+        raise ValueError(f"Aggregazioni non supportate: {invalid} (disponibili: {', '.join(AGGREGATIONS)})")
+    filters = tuple(sorted((column, tuple(sorted({str(value) for value in values})))
+                           for column, values in (filters or {}).items()))
+    return by, aggregations, filters
+
+def _source(engine, columns):
+    """
+    Sceglie la tabella da cui rispondere: il cubo se contiene tutte le colonne, altrimenti le righe.
+
+    Args:
+        engine (dict): Il motore delle interrogazioni.
+        columns (set): Le colonne usate da raggruppamento e filtri.
+
+    Returns:
+        tuple: (tabella, True se è il cubo).
+
+    Raises:
+        KeyError: Se le colonne non sono nel cubo e le righe non sono disponibili o non le contengono.
+    """
+    if columns <= set(engine['cube'].columns):
+        return engine['cube'], True
+    if engine['load_rows'] is None:
+        raise KeyError(f"Colonne non presenti nel cubo delle interrogazioni: {sorted(columns - set(engine['cube'].columns))}")
+    with engine['lock']:
+        if engine['rows'] is None:
+            engine['rows'] = add_month_column(engine['load_rows']())                    # Le righe si caricano una sola volta, alla prima necessità.
+    rows = engine['rows']
+    missing = sorted(columns - set(rows.columns))
+    if missing:
+        raise KeyError(f"Colonne non presenti nelle vendite: {missing}")
+    return rows, False
+
+def compute_query(engine, key):
+    """
+    Calcola il risultato di un'interrogazione normalizzata, senza usare la cache.
+
+    Args:
+        engine (dict): Il motore delle interrogazioni.
+        key (tuple): L'interrogazione prodotta da 'query_key'.
+
+    Returns:
+        tuple: (il risultato, True se è stato calcolato dal cubo).
+    """
+    by, aggregations, filters = key
+    table, from_cube = _source(engine, set(by) | {column for column, _ in filters})
+    for column, values in filters:
+        table = table[table[column].astype(str).isin(values)]                          # Confronto come testo: vale per categorie, mesi ('2019-03') e date.
+
+    measures = list(dict.fromkeys(measure for measure, _ in aggregations))
+    counts = table[COUNT_COLUMN] if from_cube else pd.Series(1, index=table.index, dtype='int64')  # Una riga delle vendite conta 1.
+    frame = table[list(by) + measures].assign(**{COUNT_COLUMN: counts})
+    if by:
+        grouped = frame.groupby(list(by), observed=True, sort=True).sum().reset_index()
+    else:
+        grouped = frame[measures + [COUNT_COLUMN]].sum().to_frame().T                   # Nessun raggruppamento: un solo totale.
+
+    result = grouped[list(by)].copy()
+    for measure, aggregation in aggregations:
+        if aggregation == 'sum':
+            result[measure] = grouped[measure]
+        elif aggregation == 'mean':
+            result[measure] = grouped[measure] / grouped[COUNT_COLUMN].where(grouped[COUNT_COLUMN] > 0)  # Media = somma / conteggio, esatta anche dal cubo.
+        else:
+            result[measure] = grouped[COUNT_COLUMN].astype('int64')
+    result[COUNT_COLUMN] = grouped[COUNT_COLUMN].astype('int64')
+    return result.reset_index(drop=True), from_cube
+
+def run_query(engine, by=(), measures=('Total',), filters=None, how=None):
+    """
+    Risponde a un'interrogazione dalla cache dei risultati o, se manca, dal cubo (o dalle righe).
+
+    Args:
+        engine (dict): Il motore delle interrogazioni.
+        by (list | str): Le dimensioni del raggruppamento (vuoto = un solo totale).
+        measures (list | str): Le misure da riportare.
+        filters (dict | None): I valori ammessi per colonna (es. {'City': ['Yangon'], 'Month': ['2019-03']}).
+        how (str | dict | None): L'aggregazione ('sum', 'mean' o 'count') di tutte le misure o di ciascuna.
+
+    Returns:
+        pd.DataFrame: Una riga per gruppo: le dimensioni, le misure aggregate e il numero di righe ('Count').
+    """
+    key = (engine['fingerprint'], query_key(by, measures, filters, how))
+    with engine['lock']:
+        cached = engine['results'].get(key)
+        if cached is not None:
+            engine['results'].move_to_end(key)                                          # Aggiorna l'ordine LRU.
+            engine['hits'] += 1
+            return cached[0].copy()                                                     # Una copia: chi la modifica non altera la cache.
+        engine['misses'] += 1
+
+    result, _ = compute_query(engine, key[1])
+    size = int(result.memory_usage(deep=True).sum())
+    with engine['lock']:
+        if size <= engine['max_bytes'] and key not in engine['results']:                # Un risultato più grande dell'intera cache non viene conservato.
+            engine['results'][key] = (result, size)
+            engine['bytes'] += size
+            while engine['bytes'] > engine['max_bytes']:
+                _, (_, evicted) = engine['results'].popitem(last=False)                 # Elimina il risultato usato meno di recente.
+                engine['bytes'] -= evicted
+    return result.copy()
+
+def cache_info(engine):
+    """
+    Riassume lo stato della cache dei risultati.
+
+    Args:
+        engine (dict): Il motore delle interrogazioni.
+
+    Returns:
+        dict: Risultati conservati ('entries'), byte occupati e massimi, risposte dalla cache ('hits') e calcolate ('misses').
+    """
+    with engine['lock']:
+        return {'entries': len(engine['results']), 'bytes': engine['bytes'], 'max_bytes': engine['max_bytes'],
+                'hits': engine['hits'], 'misses': engine['misses']}
@@ -0,0 +1,107 @@
+# ###########################################################################################################
+# Formattazione vettorizzata delle sezioni del report
+# ###########################################################################################################
+#
+# Le sezioni del report vengono formattate colonna per colonna con operazioni vettorizzate sulle stringhe
+# (niente 'iterrows' e niente chiamate a 'thousand_separator' per ogni valore) e scritte con una sola
+# operazione di scrittura per sezione. Sono supportati tre formati di uscita:
+# - 'text': una riga 'Etichetta (dettagli): 1.234.567' per ogni gruppo, come le stampe originali dello script;
+# - 'csv': le colonne del raggruppamento e il valore arrotondato, senza separatori (leggibile da altri programmi);
+# - 'markdown': una tabella Markdown con il valore formattato con il punto come separatore delle migliaia.
+
+import sys                                                                              # Per scrivere sullo standard output di default
+
+REPORT_FORMATS = ('text', 'csv', 'markdown')                                            # Formati di uscita supportati
+THOUSANDS_PATTERN = r'\B(?=(\d{3})+(?!\d))'                                             # Posizioni in cui inserire il separatore delle migliaia
+
+def format_thousands(values):
+    """
+    Formatta un'intera colonna di numeri con il punto come separatore delle migliaia, in modo vettorizzato.
+
+    I valori vengono arrotondati all'unità, come faceva 'thousand_separator(round(x, 0))' per ogni riga.
+
+    Args:
+        values (pd.Series): La colonna di numeri da formattare.
+
+    Returns:
+        pd.Series: La colonna di stringhe formattate (es. 1234567 -> '1.234.567').
+    """
+    digits = values.round(0).astype('int64').astype(str)                                # Arrotonda e converte l'intera colonna in testo.
+    return digits.str.replace(THOUSANDS_PATTERN, '.', regex=True)                       # Inserisce i punti in un solo passaggio su tutta la colonna.
+
+def format_labels(table, label_columns):
+    """
+    Costruisce le etichette delle righe: la prima colonna, seguita dalle altre tra parentesi.
+
+    Args:
+        table (pd.DataFrame): La tabella del raggruppamento.
+        label_columns (list): Le colonne che compongono l'etichetta (es. ['City', 'Customer type']).
+
+    Returns:
+        pd.Series: Le etichette (es. 'Yangon (Member)' oppure 'Yangon (Female, Health and beauty)').
+    """
+    labels = table[label_columns[0]].astype(str)
+    if len(label_columns) == 1:
+        return labels
+    details = table[label_columns[1]].astype(str)
+    for column in label_columns[2:]:
+        details = details.str.cat(table[column].astype(str), sep=', ')                  # Concatena le colonne di dettaglio senza cicli sulle righe.
+    return labels + ' (' + details + ')'
+
+def render_table(table, label_columns, value_column='Total', fmt='text'):
+    """
+    Formatta un raggruppamento come testo, CSV o Markdown.
+
+    Args:
+        table (pd.DataFrame): La tabella del raggruppamento (es. prodotta da 'rollup').
+        label_columns (list | str): La colonna o le colonne che identificano ogni riga.
+        value_column (str): La colonna con il valore da riportare (di default 'Total').
+        fmt (str): Il formato di uscita: 'text', 'csv' o 'markdown'.
+
+    Returns:
+        str: Il testo della tabella, una riga per gruppo, terminato da un a capo.
+    """
+    if isinstance(label_columns, str):
+        label_columns = [label_columns]
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Formato del report non supportato: {fmt} (disponibili: {', '.join(REPORT_FORMATS)})")
+    if table.empty:
+        return ''
+
+    if fmt == 'csv':
+        output = table[label_columns].copy()
+        output[value_column] = table[value_column].round(0).astype('int64')            # Valori arrotondati, senza separatori.
+        return output.to_csv(index=False, lineterminator='\n')
+
+    values = format_thousands(table[value_column])
+    if fmt == 'markdown':
+        cells = table[label_columns[0]].astype(str)
+        for column in label_columns[1:]:
+            cells = cells.str.cat(table[column].astype(str), sep=' | ')
+        rows = '| ' + cells + ' | ' + values + ' |'
+        header = '| ' + ' | '.join(label_columns + [value_column]) + ' |\n'
+        separator = '|' + '---|' * len(label_columns) + '---:|\n'                       # La colonna dei valori è allineata a destra.
+        return header + separator + '\n'.join(rows) + '\n'
+
+    rows = format_labels(table, label_columns) + ': ' + values                          # Formato 'text': 'Etichetta: valore'.
+    return '\n'.join(rows) + '\n'
+
+def write_section(title, table, label_columns, value_column='Total', fmt='text', stream=None):
+    """
+    Scrive una sezione del report (titolo e tabella) con una sola operazione di scrittura.
+
+    Args:
+        title (str): Il titolo della sezione (es. 'Vendite per genere:').
+        table (pd.DataFrame): La tabella del raggruppamento.
+        label_columns (list | str): La colonna o le colonne che identificano ogni riga.
+        value_column (str): La colonna con il valore da riportare (di default 'Total').
+        fmt (str): Il formato di uscita: 'text', 'csv' o 'markdown'.
+        stream: Il file su cui scrivere (di default lo standard output).
+
+    Returns:
+        None
+    """
+    stream = stream or sys.stdout
+    if fmt == 'markdown':
+        title = '\n### ' + title.strip().rstrip(':') + '\n'                             # In Markdown il titolo diventa un'intestazione.
+    stream.write(title + '\n' + render_table(table, label_columns, value_column, fmt))
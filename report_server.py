@@ -0,0 +1,286 @@
+# ###########################################################################################################
+# Server HTTP locale del report: aggregati, modelli e grafici in memoria, serviti come JSON e PNG
+# ###########################################################################################################
+#
+# Lo script stampa il report sulla console e mostra i grafici in finestre bloccanti. In modalità server i dati
+# vengono caricati all'avvio (gli stadi della pipeline, con la loro cache su disco) e aggregati, modelli e
+# descrizioni dei grafici restano in memoria; un 'ThreadingHTTPServer' risponde a ogni richiesta in un thread:
+# - '/sales.json', '/apple-quality.json', '/trend.json': i risultati delle sezioni del report;
+# - '/sales.txt', ...: il testo delle sezioni, come lo stampa lo script;
+# - '/charts/<nome>.png': i grafici, disegnati alla prima richiesta e poi serviti dalla memoria;
+# - '/query.json?by=City&measure=Total&where=Month=2019-03': le interrogazioni ad hoc di 'query.py'.
+#
+# Ogni risposta ha un ETag derivato dall'impronta dei dati (le chiavi degli stadi: contenuto dei CSV e codice)
+# e, per i grafici, dall'impronta del grafico stesso: un client che rimanda l'ETag in 'If-None-Match' riceve
+# '304 Not Modified' senza corpo. Matplotlib non è thread-safe, quindi i grafici si disegnano uno alla volta
+# sotto un lock; chi chiede un grafico mentre un altro thread lo sta disegnando attende e riceve lo stesso PNG,
+# senza un secondo rendering.
+#
+# Al più ogni 'DEFAULT_CHECK_INTERVAL' secondi una richiesta ricalcola l'impronta dei dati (con la cache degli
+# hash costa solo una 'stat' dei CSV): se è cambiata, il report viene ricaricato e sostituito in blocco, la cache
+# delle interrogazioni si svuota e gli ETag cambiano. Le richieste già in corso terminano sul report precedente.
+
+import hashlib                                                                          # Per gli ETag dei documenti
+import io                                                                               # Per salvare i PNG in memoria
+import json                                                                             # Per le risposte JSON
+import sys                                                                              # Per gli avvisi sullo standard error
+import threading                                                                        # Lock dei grafici, della cache dei PNG e del ricaricamento
+import time                                                                             # Per l'intervallo tra i controlli dei dati
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer                     # Server HTTP con un thread per richiesta
+from urllib.parse import parse_qs, urlsplit                                             # Per il percorso e i parametri delle richieste
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from charts import chart_filename, chart_fingerprint, draw_chart                        # Descrizione, impronta e disegno dei grafici
+from query import parse_filters, refresh_engine, run_query                              # Interrogazioni ad hoc con cache LRU dei risultati
+
+DEFAULT_HOST = '127.0.0.1'                                                              # Solo connessioni locali
+DEFAULT_PORT = 8765                                                                     # Porta predefinita del server
+DEFAULT_CHECK_INTERVAL = 5.0                                                            # Secondi tra due controlli dell'impronta dei dati
+
+def to_json(value):
+    """
+    Converte un risultato del report in valori serializzabili in JSON (DataFrame come liste di righe).
+
+    Args:
+        value: Il valore (DataFrame, Series, array NumPy, dizionari, liste, numeri o testo).
+
+    Returns:
+        Il valore convertito.
+    """
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient='records', date_format='iso', default_handler=str))  # Periodi, categorie e date diventano testo.
+    if isinstance(value, pd.Series):
+        return to_json(value.reset_index())
+    if hasattr(value, 'tolist'):
+        return value.tolist()                                                           # Array e scalari NumPy.
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    return value
+
+def new_report(fingerprint, documents, texts, chart_jobs):
+    """
+    Prepara un report da servire: documenti e testi già codificati, grafici da disegnare alla prima richiesta.
+
+    Args:
+        fingerprint (str): L'impronta dei dati e del codice da cui derivano le risposte.
+        documents (dict): I risultati delle sezioni, per nome (es. 'sales'), già convertibili in JSON.
+        texts (dict): Il testo di ogni sezione, per nome.
+        chart_jobs (list): Le descrizioni dei grafici (vedi 'charts.py').
+
+    Returns:
+        dict: Il report.
+    """
+    charts = {chart_filename(job['name'], 'png'): job for job in chart_jobs}
+    return {
+        'fingerprint': fingerprint,
+        'documents': {name: json.dumps(to_json(document), ensure_ascii=False).encode() for name, document in documents.items()},
+        'texts': {name: text.encode() for name, text in texts.items()},
+        'charts': charts,
+        'chart_etags': {filename: '"' + chart_fingerprint(job, 'png')[:32] + '"' for filename, job in charts.items()},
+        'pngs': {},                                                                     # Nome del file -> PNG già disegnato.
+    }
+
+def new_report_state(report, engine, check=None, load=None, interval=DEFAULT_CHECK_INTERVAL):
+    """
+    Crea lo stato del server: il report corrente, il motore delle interrogazioni e come accorgersi dei dati nuovi.
+
+    Args:
+        report (dict): Il report prodotto da 'new_report'.
+        engine (dict): Il motore delle interrogazioni (vedi 'query.py').
+        check (callable | None): Funzione senza argomenti che restituisce l'impronta attuale dei dati, senza
+            ricalcolare nulla (None = il report non viene mai ricaricato).
+        load (callable | None): Funzione senza argomenti che restituisce (report, cubo delle interrogazioni,
+            accesso alle righe) per i dati attuali.
+        interval (float): I secondi minimi tra due controlli dell'impronta.
+
+    Returns:
+        dict: Lo stato del server.
+    """
+    return {
+        'report': report,
+        'engine': engine,
+        'check': check,
+        'load': load,
+        'interval': interval,
+        'checked': time.monotonic(),                                                    # Istante dell'ultimo controllo.
+        'render_lock': threading.Lock(),
+        'refresh_lock': threading.Lock(),
+    }
+
+def refresh_report(state):
+    """
+    Restituisce il report corrente, ricaricandolo se l'impronta dei dati è cambiata dall'ultimo controllo.
+
+    L'impronta si ricalcola al più ogni 'interval' secondi e da un solo thread alla volta. Il motore delle
+    interrogazioni viene aggiornato prima di sostituire il report: nel frattempo una risposta con i dati nuovi
+    può avere il vecchio ETag, che il client riconvaliderà alla richiesta successiva, mai il contrario.
+
+    Args:
+        state (dict): Lo stato del server.
+
+    Returns:
+        dict: Il report da usare per la richiesta.
+    """
+    if state['check'] is None or time.monotonic() - state['checked'] < state['interval']:
+        return state['report']
+    with state['refresh_lock']:
+        if time.monotonic() - state['checked'] >= state['interval']:                    # Un altro thread potrebbe aver appena controllato.
+            try:
+                if state['check']() != state['report']['fingerprint']:
+                    report, query_cube, load_rows = state['load']()
+                    refresh_engine(state['engine'], query_cube, load_rows, report['fingerprint'])
+                    state['report'] = report
+            except Exception as error:                                                  # Es. un CSV a metà scrittura: si riprova al prossimo controllo.
+                print(f"Report non aggiornato, restano i dati precedenti: {error}", file=sys.stderr)
+            state['checked'] = time.monotonic()
+    return state['report']
+
+def document_etag(report, name):
+    """
+    Calcola l'ETag di un documento o di un'interrogazione: cambia solo se cambiano i dati, il codice o la richiesta.
+
+    Args:
+        report (dict): Il report corrente.
+        name (str): Il percorso e i parametri della richiesta.
+
+    Returns:
+        str: L'ETag, tra virgolette.
+    """
+    return '"' + hashlib.sha256(f"{report['fingerprint']}:{name}".encode()).hexdigest()[:32] + '"'
+
+def render_png(state, report, filename):
+    """
+    Restituisce il PNG di un grafico, disegnandolo solo alla prima richiesta.
+
+    Args:
+        state (dict): Lo stato del server.
+        report (dict): Il report a cui appartiene il grafico.
+        filename (str): Il nome del file del grafico (es. 'vendite_citta.png').
+
+    Returns:
+        bytes: Il contenuto del PNG.
+    """
+    png = report['pngs'].get(filename)
+    if png is not None:
+        return png
+    with state['render_lock']:                                                          # Un grafico alla volta: pyplot non è thread-safe.
+        png = report['pngs'].get(filename)
+        if png is None:                                                                 # Un altro thread potrebbe averlo appena disegnato.
+            import matplotlib.pyplot as plt                                             # Matplotlib per la creazione di grafici
+
+            plt.switch_backend('Agg')                                                   # Nessun display: rendering solo in memoria.
+            fig = draw_chart(report['charts'][filename])
+            buffer = io.BytesIO()
+            try:
+                fig.savefig(buffer, format='png')
+            finally:
+                plt.close(fig)                                                          # Chiude la figura, così la memoria non cresce.
+            png = report['pngs'][filename] = buffer.getvalue()
+    return png
+
+def index_document(report):
+    """
+    Elenca le risorse disponibili.
+
+    Args:
+        report (dict): Il report corrente.
+
+    Returns:
+        dict: I percorsi dei documenti, dei testi, dei grafici e delle interrogazioni.
+    """
+    return {
+        'documents': [f'/{name}.json' for name in report['documents']],
+        'texts': [f'/{name}.txt' for name in report['texts']],
+        'charts': [f'/charts/{filename}' for filename in report['charts']],
+        'query': '/query.json?by=City&by=Gender&measure=Total&how=sum&where=Month=2019-03',
+    }
+
+def make_handler(state):
+    """
+    Crea la classe che gestisce le richieste, legata allo stato del server.
+
+    Args:
+        state (dict): Lo stato del server.
+
+    Returns:
+        type: La sottoclasse di 'BaseHTTPRequestHandler'.
+    """
+    class ReportHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'                                                   # Connessioni persistenti: i grafici di una pagina riusano la stessa.
+
+        def send_body(self, status, body, content_type, etag=None):
+            if etag and etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)                                                 # Il client ha già questa versione: nessun corpo.
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')                           # Il client può conservarla, ma la riconvalida con l'ETag.
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_json(self, status, value, etag=None):
+            self.send_body(status, json.dumps(to_json(value), ensure_ascii=False).encode(), 'application/json; charset=utf-8', etag)
+
+        def do_GET(self):
+            report = refresh_report(state)                                              # Lo stesso report per tutta la richiesta.
+            url = urlsplit(self.path)
+            path = url.path.rstrip('/') or '/'
+            if path == '/':
+                self.send_json(200, index_document(report), document_etag(report, path))
+            elif path == '/query.json':
+                self.answer_query(report, url.query)
+            elif path.startswith('/charts/') and path[len('/charts/'):] in report['charts']:
+                filename = path[len('/charts/'):]
+                etag = report['chart_etags'][filename]
+                if etag in self.headers.get('If-None-Match', ''):
+                    self.send_body(304, b'', 'image/png', etag)                         # Nemmeno il rendering serve.
+                else:
+                    self.send_body(200, render_png(state, report, filename), 'image/png', etag)
+            elif path.endswith('.json') and path[1:-len('.json')] in report['documents']:
+                self.send_body(200, report['documents'][path[1:-len('.json')]], 'application/json; charset=utf-8', document_etag(report, path))
+            elif path.endswith('.txt') and path[1:-len('.txt')] in report['texts']:
+                self.send_body(200, report['texts'][path[1:-len('.txt')]], 'text/plain; charset=utf-8', document_etag(report, path))
+            else:
+                self.send_json(404, {'error': f"Risorsa non trovata: {url.path}"})
+
+        def answer_query(self, report, query_string):
+            params = parse_qs(query_string)
+            etag = document_etag(report, '/query.json?' + query_string)
+            if etag in self.headers.get('If-None-Match', ''):
+                self.send_body(304, b'', 'application/json', etag)                      # Stessa interrogazione sugli stessi dati: nessun calcolo.
+                return
+            try:
+                table = run_query(state['engine'], params.get('by', []), params.get('measure', ['Total']),
+                                  parse_filters(params.get('where', [])), (params.get('how') or [None])[0])
+            except (KeyError, ValueError) as error:
+                self.send_json(400, {'error': str(error.args[0] if error.args else error)})
+                return
+            self.send_json(200, table, etag)
+
+        def log_message(self, format, *args):
+            pass                                                                        # Nessuna riga di log per richiesta sulla console.
+
+    return ReportHandler
+
+def make_server(state, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Crea il server HTTP del report (una porta 0 sceglie una porta libera).
+
+    Args:
+        state (dict): Lo stato del server.
+        host (str): L'indirizzo su cui ascoltare.
+        port (int): La porta.
+
+    Returns:
+        ThreadingHTTPServer: Il server, da avviare con 'serve_forever'.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True                                                        # I thread delle richieste non impediscono la chiusura.
+    return server
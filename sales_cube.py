@@ -0,0 +1,133 @@
+# ###########################################################################################################
+# Cubo di aggregazione delle vendite
+# ###########################################################################################################
+#
+# Invece di scansionare 'sales_data' una volta per ogni raggruppamento richiesto dal report, il cubo calcola
+# una sola volta le somme al livello di dettaglio più fine (Città x Tipo di cliente x Genere x Categoria di
+# prodotto x Mese). Tutti i raggruppamenti più grossolani vengono poi derivati da questa piccola tabella,
+# senza tornare alle righe originali: ogni dimensione aggiuntiva del report costa quasi zero.
+#
+# Il cubo può essere costruito anche in modalità streaming: il CSV viene letto a blocchi di dimensione fissa e
+# ogni blocco viene ripiegato nelle somme e nei conteggi correnti, quindi la memoria di picco dipende dalla
+# dimensione del blocco e non da quella del file.
+
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from loaders import iter_sales_chunks                                                   # Lettura a blocchi del CSV delle vendite con lo schema dichiarato
+
+CUBE_DIMENSIONS = ['City', 'Customer type', 'Gender', 'Product line', 'Month']          # Dimensioni del livello di dettaglio più fine del cubo
+CUBE_MEASURES = ['Total']                                                               # Misure additive sommate in ogni cella del cubo
+COUNT_COLUMN = 'Count'                                                                  # Colonna con il numero di righe (fatture) aggregate in ogni cella
+DEFAULT_CHUNKSIZE = 100_000                                                             # Numero di righe lette per blocco nella modalità streaming
+
+def add_month_column(sales_data):
+    """
+    Aggiunge la colonna 'Month' (periodo mensile) ricavata dalla colonna 'Date', se non è già presente.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite con la colonna 'Date'.
+
+    Returns:
+        pd.DataFrame: Il DataFrame con la colonna 'Month' di tipo periodo mensile.
+    """
+    if 'Month' in sales_data.columns:                                                   # Se il mese è già stato calcolato non serve rifarlo.
+        return sales_data
+    return sales_data.assign(Month=pd.to_datetime(sales_data['Date']).dt.to_period('M')) # Converte 'Date' in datetime ed estrae il periodo mensile.
+
+def build_sales_cube(sales_data, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+    """
+    Costruisce il cubo di aggregazione con una sola scansione delle righe di vendita.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite.
+        dimensions (list): Le colonne che definiscono il livello di dettaglio del cubo.
+        measures (list): Le colonne numeriche da sommare in ogni cella.
+
+    Returns:
+        pd.DataFrame: Una riga per ogni combinazione osservata delle dimensioni, con la somma di ogni misura
+        e il numero di righe aggregate nella colonna 'Count'.
+    """
+    if 'Month' in dimensions:
+        sales_data = add_month_column(sales_data)                                       # Il mese serve solo se fa parte delle dimensioni richieste.
+
+    aggregations = {measure: (measure, 'sum') for measure in measures}                  # Una somma per ogni misura...
+    aggregations[COUNT_COLUMN] = (measures[0], 'size')                                  # ...e il conteggio delle righe, tutto nello stesso passaggio.
+    return (sales_data.groupby(list(dimensions), observed=True, sort=True)
+                      .agg(**aggregations)
+                      .reset_index())
+
+def rollup(cube, dimensions, measure='Total'):
+    """
+    Deriva un raggruppamento più grossolano sommando le celle del cubo, senza tornare ai dati originali.
+
+    Args:
+        cube (pd.DataFrame): Il cubo prodotto da 'build_sales_cube'.
+        dimensions (list | str): La dimensione o le dimensioni del raggruppamento desiderato.
+        measure (str): La misura da sommare (di default 'Total').
+
+    Returns:
+        pd.DataFrame: Il raggruppamento con le dimensioni richieste e la misura sommata, con indice resettato,
+        nello stesso formato di 'sales_data.groupby(dimensions)[measure].sum().reset_index()'.
+    """
+    if isinstance(dimensions, str):
+        dimensions = [dimensions]                                                       # Accetta sia una singola colonna sia una lista di colonne.
+
+    missing = [dimension for dimension in dimensions if dimension not in cube.columns]
+    if missing:
+        raise KeyError(f"Dimensioni non presenti nel cubo: {missing}")                  # Non è possibile derivare dimensioni che il cubo non contiene.
+
+    return cube.groupby(list(dimensions), observed=True, sort=True)[measure].sum().reset_index()
+
+def merge_cubes(cubes, dimensions=CUBE_DIMENSIONS):
+    """
+    Unisce più cubi parziali (ad esempio calcolati su blocchi diversi dello stesso file) in un unico cubo.
+
+    Le misure e i conteggi sono additivi, quindi le celle con le stesse dimensioni vengono semplicemente sommate.
+
+    Args:
+        cubes (list): I cubi parziali prodotti da 'build_sales_cube', tutti con le stesse dimensioni.
+        dimensions (list): Le colonne che definiscono il livello di dettaglio dei cubi.
+
+    Returns:
+        pd.DataFrame: Il cubo risultante, nello stesso formato dei cubi in ingresso.
+    """
+    cubes = [cube for cube in cubes if cube is not None]
+    if len(cubes) == 1:
+        return cubes[0]                                                                 # Un solo cubo: non c'è nulla da unire.
+
+    cells = pd.concat(cubes, ignore_index=True)                                         # Le celle dei cubi parziali sono poche: concatenarle costa poco.
+    for dimension in dimensions:
+        if isinstance(cubes[0][dimension].dtype, pd.CategoricalDtype) and not isinstance(cells[dimension].dtype, pd.CategoricalDtype):
+            cells[dimension] = cells[dimension].astype('category')                      # Categorie diverse tra i cubi: la dimensione resta categorica.
+    return (cells.groupby(list(dimensions), observed=True, sort=True)
+                 .sum()
+                 .reset_index())
+
+def build_sales_cube_streaming(path, chunksize=DEFAULT_CHUNKSIZE, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+    """
+    Costruisce il cubo di aggregazione leggendo il CSV delle vendite a blocchi di dimensione fissa.
+
+    Ogni blocco viene ridotto a un cubo parziale e subito ripiegato nel cubo corrente, quindi in memoria
+    restano solo un blocco di righe e le celle aggregate: il risultato è identico a 'build_sales_cube'
+    applicato all'intero file, anche per file più grandi della RAM.
+
+    Args:
+        path (str | None): Il percorso del file CSV delle vendite (se assente si usa quello configurato).
+        chunksize (int): Il numero di righe lette per ogni blocco.
+        dimensions (list): Le colonne che definiscono il livello di dettaglio del cubo.
+        measures (list): Le colonne numeriche da sommare in ogni cella.
+
+    Returns:
+        pd.DataFrame: Il cubo di aggregazione dell'intero file.
+    """
+    columns = [dimension for dimension in dimensions if dimension != 'Month'] + list(measures)
+    if 'Month' in dimensions:
+        columns.append('Date')                                                          # Il mese viene ricavato dalla data di ogni blocco.
+
+    cube = None
+    for chunk in iter_sales_chunks(path, chunksize=chunksize, usecols=columns):         # Legge solo le colonne necessarie, un blocco alla volta.
+        partial = build_sales_cube(chunk, dimensions, measures)                         # Riduce il blocco alle sue celle aggregate.
+        cube = partial if cube is None else merge_cubes([cube, partial], dimensions)    # Ripiega il blocco nelle somme e nei conteggi correnti.
+
+    if cube is None:
+        raise ValueError(f"Il file {path} non contiene righe di vendita")
+    return cube
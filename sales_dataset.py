@@ -0,0 +1,315 @@
+# ###########################################################################################################
+# Dataset delle vendite su più file: manifest delle partizioni e lettura dei soli file utili
+# ###########################################################################################################
+#
+# In produzione le fatture arrivano in un file per filiale e per mese, non in un unico CSV. Un dataset è una
+# cartella (tutti i '*.csv', anche nelle sottocartelle), un pattern glob (es. 'vendite/2019-*/*.csv') o un
+# singolo file.
+#
+# Per ogni file il manifest conserva città, filiali, prima e ultima data e numero di righe, insieme a
+# dimensione e data di modifica del file: all'apertura del dataset vengono riletti (solo le colonne 'City',
+# 'Branch' e 'Date') i soli file nuovi o modificati. Il manifest è un piccolo JSON nella cache dei dataset.
+#
+# Una richiesta per una città, una filiale o un mese apre solo i file il cui intervallo può contenere righe
+# utili ('select_files'); dentro i file aperti le righe vengono poi filtrate. I file vengono letti in parallelo
+# da un pool di thread: il parser CSV di pandas rilascia il GIL per buona parte del lavoro. Il risultato ha lo
+# stesso schema di 'load_sales_data' (le categorie dei diversi file vengono unite), quindi il resto del
+# report non cambia.
+
+import glob                                                                             # Per i file di una cartella o di un pattern
+import hashlib                                                                          # Per il nome del manifest e l'impronta delle partizioni lette
+import json                                                                             # Per il manifest delle partizioni
+import os                                                                               # Per i percorsi e le date di modifica dei file
+import tempfile                                                                         # Per scrivere il manifest in modo atomico
+from concurrent.futures import ThreadPoolExecutor                                       # Thread di lettura dei file in parallelo
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from loaders import CACHE_DIR_ENV, DEFAULT_CACHE_DIR, SALES_DATE_FORMAT, SALES_SCHEMA, parse_sales_csv, resolve_path  # Schema e lettura delle vendite
+
+DATASETS_DIR = 'datasets'                                                               # Sottocartella della cache con i manifest dei dataset
+MANIFEST_VERSION = 1                                                                    # Da incrementare se cambia il contenuto delle voci del manifest
+PARTITION_COLUMNS = ['City', 'Branch', 'Date']                                          # Colonne lette per descrivere ogni file nel manifest
+DEFAULT_READERS = min(8, os.cpu_count() or 1)                                           # Thread di lettura predefiniti
+
+def dataset_files(source):
+    """
+    Elenca i file di un dataset: i CSV di una cartella (anche nelle sottocartelle), di un pattern glob o un file.
+
+    Args:
+        source (str): La cartella, il pattern o il file.
+
+    Returns:
+        list: I percorsi dei file, in ordine.
+
+    Raises:
+        FileNotFoundError: Se il dataset non contiene file.
+    """
+    if os.path.isdir(source):
+        files = glob.glob(os.path.join(source, '**', '*.csv'), recursive=True)
+    elif glob.has_magic(source):
+        files = glob.glob(source, recursive=True)
+    else:
+        files = [source] if os.path.isfile(source) else []
+    if not files:
+        raise FileNotFoundError(f"Nessun file di vendite trovato in {source}")
+    return sorted(os.path.abspath(path) for path in files)
+
+def dataset_name(source):
+    """
+    Restituisce un nome leggibile del dataset (es. per il file di quarantena): la cartella o il file di origine.
+
+    Args:
+        source (str): La cartella, il pattern o il file.
+
+    Returns:
+        str: Il nome, senza caratteri jolly.
+    """
+    root = source
+    while glob.has_magic(root):
+        root = os.path.dirname(root)                                                    # Risale fino alla prima parte senza caratteri jolly.
+    return os.path.splitext(os.path.basename(os.path.normpath(root or '.')))[0]
+
+def _signature(path):
+    """
+    Restituisce dimensione e data di modifica di un file: se coincidono, la voce del manifest è ancora valida.
+
+    Args:
+        path (str): Il percorso del file.
+
+    Returns:
+        list: [dimensione in byte, data di modifica in nanosecondi].
+    """
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def describe_file(path):
+    """
+    Legge le sole colonne di partizione di un file e ne ricava la voce del manifest.
+
+    Args:
+        path (str): Il percorso del file.
+
+    Returns:
+        dict: Firma del file, righe, città e filiali presenti, prima e ultima data (ISO; None se il file è vuoto).
+    """
+    signature = _signature(path)                                                        # Letta prima del contenuto: una modifica durante la lettura rende la voce vecchia.
+    partition = pd.read_csv(path, usecols=PARTITION_COLUMNS, dtype={column: SALES_SCHEMA[column] for column in PARTITION_COLUMNS})
+    dates = pd.to_datetime(partition['Date'], format=SALES_DATE_FORMAT)
+    return {
+        'signature': signature,
+        'rows': len(partition),
+        'cities': sorted(partition['City'].dropna().unique().tolist()),
+        'branches': sorted(partition['Branch'].dropna().unique().tolist()),
+        'first_date': dates.min().date().isoformat() if len(dates) else None,
+        'last_date': dates.max().date().isoformat() if len(dates) else None,
+    }
+
+def manifest_path(source, cache_dir=None):
+    """
+    Restituisce il percorso del manifest di un dataset nella cache.
+
+    Args:
+        source (str): La cartella, il pattern o il file del dataset.
+        cache_dir (str | None): La cartella della cache; se assente si usa la variabile d'ambiente o quella predefinita.
+
+    Returns:
+        str: Il percorso del file JSON del manifest.
+    """
+    cache_dir = resolve_path(cache_dir, CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    digest = hashlib.sha256(os.path.abspath(source).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, DATASETS_DIR, f'{dataset_name(source)}-{digest}.json')
+
+def load_manifest(source, cache_dir=None, readers=DEFAULT_READERS):
+    """
+    Apre il manifest di un dataset, descrivendo in parallelo i soli file nuovi o modificati.
+
+    Args:
+        source (str): La cartella, il pattern o il file del dataset.
+        cache_dir (str | None): La cartella della cache.
+        readers (int): Il numero di thread di lettura.
+
+    Returns:
+        dict: Il dataset ('source') e le voci dei suoi file ('files', per percorso).
+    """
+    path = manifest_path(source, cache_dir)
+    stored = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as handle:
+            payload = json.load(handle)
+        if payload.get('version') == MANIFEST_VERSION:
+            stored = payload['files']
+
+    files = dataset_files(source)
+    stale = [file for file in files if file not in stored or stored[file]['signature'] != _signature(file)]
+    with ThreadPoolExecutor(max_workers=max(1, readers)) as pool:
+        described = dict(zip(stale, pool.map(describe_file, stale)))
+    manifest = {'source': source, 'files': {file: described.get(file) or stored[file] for file in files}}
+    if stale or len(stored) != len(files):                                              # File nuovi, modificati o eliminati: il manifest va riscritto.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-', suffix='.json')
+        with os.fdopen(handle, 'w', encoding='utf-8') as output:
+            json.dump({'version': MANIFEST_VERSION, 'source': source, 'files': manifest['files']}, output, indent=1)
+        os.replace(staging, path)
+    return manifest
+
+def month_range(month):
+    """
+    Converte un mese 'YYYY-MM' nel suo primo e ultimo giorno.
+
+    Args:
+        month (str | None): Il mese (es. '2019-01').
+
+    Returns:
+        tuple: (primo giorno, ultimo giorno) come pd.Timestamp, oppure (None, None) senza mese.
+    """
+    if not month:
+        return None, None
+    period = pd.Period(month, freq='M')
+    return period.start_time.normalize(), period.end_time.normalize()
+
+def select_files(manifest, city=None, branch=None, month=None):
+    """
+    Sceglie i file che possono contenere righe della città, della filiale e del mese richiesti (pruning).
+
+    Args:
+        manifest (dict): Il manifest del dataset.
+        city (str | None): La città richiesta; None = tutte.
+        branch (str | None): La filiale richiesta; None = tutte.
+        month (str | None): Il mese richiesto ('YYYY-MM'); None = tutti.
+
+    Returns:
+        list: I percorsi dei file da aprire.
+    """
+    start, end = month_range(month)
+    selected = []
+    for path, entry in manifest['files'].items():
+        if not entry['rows']:
+            continue                                                                    # File senza righe: niente da leggere.
+        if city is not None and city not in entry['cities']:
+            continue
+        if branch is not None and branch not in entry['branches']:
+            continue
+        if start is not None and (pd.Timestamp(entry['last_date']) < start or pd.Timestamp(entry['first_date']) > end):
+            continue                                                                    # L'intervallo di date del file non tocca il mese richiesto.
+        selected.append(path)
+    return selected
+
+def dataset_selection(source, city=None, branch=None, month=None, cache_dir=None, readers=DEFAULT_READERS):
+    """
+    Sceglie i file del dataset da aprire per i filtri richiesti, usando il manifest (nessuna riga viene letta).
+
+    Args:
+        source (str): La cartella, il pattern o il file del dataset.
+        city (str | None): La città richiesta; None = tutte.
+        branch (str | None): La filiale richiesta; None = tutte.
+        month (str | None): Il mese richiesto ('YYYY-MM'); None = tutti.
+        cache_dir (str | None): La cartella della cache dei manifest.
+        readers (int): Il numero di thread di lettura.
+
+    Returns:
+        list: I percorsi dei file da aprire, almeno uno.
+
+    Raises:
+        FileNotFoundError: Se il dataset non contiene file.
+        ValueError: Se il mese non è valido o nessun file può contenere vendite con i filtri richiesti.
+    """
+    paths = select_files(load_manifest(source, cache_dir, readers), city, branch, month)
+    if not paths:
+        raise ValueError(f"Nessun file di {source} contiene vendite con i filtri richiesti "
+                         f"(città: {city or 'tutte'}, filiale: {branch or 'tutte'}, mese: {month or 'tutti'})")
+    return paths
+
+def dataset_fingerprint(source, city=None, branch=None, month=None, cache_dir=None):
+    """
+    Calcola un'impronta dei file che una richiesta leggerebbe (percorsi, dimensioni e date di modifica) e dei filtri.
+
+    Serve come chiave dello stadio di caricamento: cambia solo se cambia un file che la richiesta apre davvero.
+
+    Args:
+        source (str): La cartella, il pattern o il file del dataset.
+        city (str | None): Il filtro sulla città.
+        branch (str | None): Il filtro sulla filiale.
+        month (str | None): Il filtro sul mese.
+        cache_dir (str | None): La cartella della cache.
+
+    Returns:
+        str: L'hash esadecimale.
+    """
+    manifest = load_manifest(source, cache_dir)
+    selected = select_files(manifest, city, branch, month)
+    payload = [MANIFEST_VERSION, city, branch, month, [(path, manifest['files'][path]['signature']) for path in selected]]
+    return hashlib.sha256(json.dumps(payload).encode('utf-8')).hexdigest()
+
+def _read_partition(path, city, branch, start, end, usecols):
+    """
+    Legge un file del dataset con lo schema delle vendite e tiene le sole righe che rispettano i filtri.
+
+    Args:
+        path (str): Il percorso del file.
+        city (str | None): Il filtro sulla città.
+        branch (str | None): Il filtro sulla filiale.
+        start (pd.Timestamp | None): Il primo giorno richiesto.
+        end (pd.Timestamp | None): L'ultimo giorno richiesto.
+        usecols (list | None): Le colonne da leggere (di default tutte).
+
+    Returns:
+        pd.DataFrame: Le righe del file che rispettano i filtri.
+    """
+    frame = parse_sales_csv(path, usecols)
+    mask = pd.Series(True, index=frame.index)
+    if city is not None:
+        mask &= frame['City'] == city
+    if branch is not None:
+        mask &= frame['Branch'] == branch
+    if start is not None:
+        mask &= frame['Date'].between(start, end)
+    return frame if mask.all() else frame[mask]
+
+def concat_partitions(frames):
+    """
+    Unisce i DataFrame dei file, con le stesse categorie (in ordine) per ogni colonna categorica.
+
+    Args:
+        frames (list): I DataFrame dei file, con le stesse colonne.
+
+    Returns:
+        pd.DataFrame: Il dataset unito, con indice da 0 e senza categorie inutilizzate.
+    """
+    if len(frames) == 1:
+        combined = frames[0].reset_index(drop=True)
+    else:
+        categorical = [column for column in frames[0].columns if isinstance(frames[0][column].dtype, pd.CategoricalDtype)]
+        dtypes = {column: pd.CategoricalDtype(sorted(set().union(*(frame[column].cat.categories for frame in frames))))
+                  for column in categorical}                                            # Stesse categorie ordinate di una lettura da un solo file.
+        combined = pd.concat([frame.astype(dtypes) for frame in frames], ignore_index=True)
+    for column in combined.columns:
+        if isinstance(combined[column].dtype, pd.CategoricalDtype):
+            combined[column] = combined[column].cat.remove_unused_categories()          # Es. con un filtro sulla città restano solo le sue filiali.
+    return combined
+
+def read_sales_dataset(source, city=None, branch=None, month=None, usecols=None, cache_dir=None, readers=DEFAULT_READERS):
+    """
+    Carica le vendite di un dataset su più file, aprendo solo i file che possono rispettare i filtri.
+
+    Args:
+        source (str): La cartella, il pattern o il file del dataset.
+        city (str | None): Solo le vendite di questa città.
+        branch (str | None): Solo le vendite di questa filiale.
+        month (str | None): Solo le vendite di questo mese ('YYYY-MM').
+        usecols (list | None): Le colonne da leggere (di default tutte; quelle dei filtri vengono aggiunte se servono).
+        cache_dir (str | None): La cartella della cache dei manifest.
+        readers (int): Il numero di thread di lettura.
+
+    Returns:
+        pd.DataFrame: Le vendite, con lo stesso schema di 'load_sales_data'.
+
+    Raises:
+        ValueError: Se nessun file del dataset può contenere vendite con i filtri richiesti.
+    """
+    paths = dataset_selection(source, city, branch, month, cache_dir, readers)
+    if usecols is not None:
+        needed = [column for column, value in (('City', city), ('Branch', branch), ('Date', month)) if value is not None]
+        usecols = list(dict.fromkeys(list(usecols) + needed))                           # Le colonne dei filtri servono per filtrare le righe.
+    start, end = month_range(month)
+    with ThreadPoolExecutor(max_workers=max(1, min(readers, len(paths)))) as pool:
+        frames = list(pool.map(lambda path: _read_partition(path, city, branch, start, end, usecols), paths))
+    return concat_partitions(frames)
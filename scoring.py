@@ -0,0 +1,91 @@
+# ###########################################################################################################
+# Classificazione in streaming di grandi file di ispezione delle mele
+# ###########################################################################################################
+#
+# I file prodotti dalle macchine di selezione possono avere decine di milioni di righe: invece di caricarli per
+# intero (con le copie di 'drop' e 'dropna'), il file viene letto a blocchi di dimensione fissa. Ogni blocco
+# diventa una matrice float32 contigua, viene classificato con il modello salvato ('apple_model.py') e le
+# previsioni vengono aggiunte subito al file di uscita. La memoria resta limitata a pochi blocchi, qualunque
+# sia la dimensione del file.
+#
+# La lettura del blocco successivo avviene in un thread mentre il blocco corrente viene classificato: il parser
+# CSV di pandas e la previsione degli alberi di scikit-learn rilasciano il GIL per buona parte del lavoro,
+# quindi lettura e calcolo si sovrappongono. Alla fine viene riportato il throughput in righe al secondo.
+#
+# Se il file contiene anche la qualità reale ('Quality'), le previsioni di ogni blocco aggiornano le metriche
+# incrementali di 'streaming_metrics.py': il file viene valutato senza tenere in memoria tutte le etichette.
+
+import sys                                                                              # Per scrivere sullo standard output di default
+import time                                                                             # Per misurare il throughput
+from concurrent.futures import ThreadPoolExecutor                                       # Thread di lettura anticipata dei blocchi
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from apple_model import DEFAULT_BATCH_SIZE, RECORD_EXTRAS, clean_records, load_model, predict  # Modello salvato e previsione a lotti
+from streaming_metrics import new_metrics, update                                       # Matrice di confusione aggiornata blocco per blocco
+
+DEFAULT_CHUNKSIZE = 250_000                                                             # Righe lette e classificate per ogni blocco
+
+def iter_record_chunks(path, features, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Legge un CSV di mele a blocchi, restituendo per ogni blocco i soli record completi e tipizzati.
+
+    Args:
+        path (str): Il percorso del CSV.
+        features (list): Lo schema delle caratteristiche del modello.
+        chunksize (int): Il numero di righe di ogni blocco.
+
+    Returns:
+        generator: Coppie (righe lette, record completi) per ogni blocco.
+    """
+    columns = lambda column: column in features or column in RECORD_EXTRAS             # Solo le colonne che servono: meno parsing e meno memoria.
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+        yield len(chunk), clean_records(chunk, features)
+
+def score_file(path, output=None, model_path=None, chunksize=DEFAULT_CHUNKSIZE, batch_size=DEFAULT_BATCH_SIZE,
+               engine='sklearn'):
+    """
+    Classifica un CSV di mele a blocchi e scrive le previsioni man mano che vengono calcolate.
+
+    Args:
+        path (str): Il CSV delle mele da classificare.
+        output (str | None): Il CSV di uscita ('A_id', se presente, e 'Quality'); di default lo standard output.
+        model_path (str | None): Il file del modello; se assente si usa la variabile d'ambiente o il percorso predefinito.
+        chunksize (int): Il numero di righe lette per ogni blocco.
+        batch_size (int): Il numero di record classificati per ogni chiamata al modello.
+        engine (str): La modalità di inferenza, 'sklearn' oppure 'compiled' (vedi 'apple_model.predict').
+
+    Returns:
+        dict: Righe lette ('rows'), classificate ('scored') e scartate perché incomplete ('skipped'), secondi
+            trascorsi ('seconds'), throughput in righe lette al secondo ('rows_per_s') e, se il file contiene la
+            colonna 'Quality', lo stato delle metriche di classificazione ('metrics', altrimenti None).
+    """
+    features = load_model(model_path)['features']                                       # Il modello viene caricato una sola volta.
+    stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+    start = time.perf_counter()
+    rows = scored = 0
+    metrics = None
+    try:
+        chunks = iter_record_chunks(path, features, chunksize)
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            pending = reader.submit(next, chunks, None)
+            header = True
+            while True:
+                item = pending.result()
+                if item is None:
+                    break
+                pending = reader.submit(next, chunks, None)                             # Legge il blocco successivo mentre classifica questo.
+                read, records = item
+                predictions = pd.DataFrame({'Quality': predict(records, model_path, batch_size, engine)})
+                if 'A_id' in records.columns:
+                    predictions.insert(0, 'A_id', records['A_id'].to_numpy())
+                if 'Quality' in records.columns:
+                    metrics = update(new_metrics() if metrics is None else metrics, records['Quality'], predictions['Quality'])
+                predictions.to_csv(stream, header=header, index=False, lineterminator='\n')  # Scrittura incrementale: il file cresce blocco per blocco.
+                header = False
+                rows += read
+                scored += len(records)
+    finally:
+        if output:
+            stream.close()
+    seconds = time.perf_counter() - start
+    return {'rows': rows, 'scored': scored, 'skipped': rows - scored, 'seconds': seconds,
+            'rows_per_s': rows / seconds if seconds else 0.0, 'metrics': metrics}
@@ -0,0 +1,517 @@
+# ###########################################################################################################
+# Sketch a memoria limitata: quantili e conteggi distinti per ogni cella del cubo delle vendite
+# ###########################################################################################################
+#
+# Il cubo conserva solo somme e conteggi: bastano per totali e medie, ma non per la mediana o il 95° percentile
+# dello scontrino, per la distribuzione dei voti ('Rating') o per il numero di fatture distinte. Questi valori
+# non sono additivi e calcolarli esattamente richiede tutte le righe di ogni gruppo.
+#
+# Qui ogni cella del cubo conserva, accanto a somme e conteggi, due riassunti di dimensione fissa e unibili:
+# - per i quantili, uno sketch a bucket logaritmici (lo schema di DDSketch): ogni valore positivo finisce nel
+#   bucket ceil(log_gamma(x)), con gamma = (1 + a) / (1 - a), e ogni quantile viene stimato con un errore
+#   relativo di al massimo 'a' (es. 1%). I bucket sono semplici conteggi: due sketch si uniscono sommandoli;
+# - per i conteggi distinti, un HyperLogLog: 2^p registri da un byte con il massimo numero di zeri iniziali
+#   degli hash visti; l'errore tipico è 1.04 / sqrt(2^p) (1.6% con p = 12) e due sketch si uniscono con il
+#   massimo registro per registro.
+# Al posto di t-digest o KLL si usa lo sketch a bucket logaritmici perché, come l'HyperLogLog, si aggiorna con
+# operazioni vettoriali su tutte le celle insieme ('np.bincount', 'np.maximum.at') e l'errore è garantito.
+#
+# Essendo unibili, gli sketch si calcolano come il cubo: su tutte le righe, a blocchi in streaming o a partizioni
+# in un pool di processi ('parallel_aggregate'); i raggruppamenti più grossolani si derivano unendo le celle.
+
+import numpy as np                                                                      # NumPy per bucket, registri e aggiornamenti vettorizzati
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from loaders import iter_sales_chunks                                                   # Lettura a blocchi del CSV delle vendite con lo schema dichiarato
+from parallel_aggregate import cell_codes, map_partitions, plan_tasks, share_columns  # Codici delle celle e pool in memoria condivisa
+from sales_cube import COUNT_COLUMN, CUBE_DIMENSIONS, DEFAULT_CHUNKSIZE                 # Stesse dimensioni del cubo seriale
+
+SKETCH_MEASURES = ['Total', 'Rating']                                                   # Misure di cui si stimano i quantili (scontrino e voto)
+DISTINCT_COLUMN = 'Invoice ID'                                                          # Colonna di cui si stimano i valori distinti
+DEFAULT_QUANTILES = (0.5, 0.95)                                                         # Mediana e 95° percentile
+DEFAULT_RELATIVE_ERROR = 0.01                                                           # Errore relativo massimo dei quantili
+DEFAULT_PRECISION = 12                                                                  # 2^12 registri dell'HyperLogLog: errore tipico dell'1.6%
+HLL_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}                                           # Costante di correzione per i registri pochi; oltre si usa la formula
+
+def new_quantile_sketch(groups, relative_error=DEFAULT_RELATIVE_ERROR):
+    """
+    Crea uno sketch dei quantili vuoto per un certo numero di gruppi (es. le celle del cubo).
+
+    Args:
+        groups (int): Il numero di gruppi.
+        relative_error (float): L'errore relativo massimo dei quantili stimati, tra 0 e 1.
+
+    Returns:
+        dict: Lo stato dello sketch: errore, base dei logaritmi, indice del primo bucket, conteggi (gruppi x bucket)
+            e conteggio dei valori nulli di ogni gruppo.
+
+    Raises:
+        ValueError: Se l'errore relativo non è tra 0 e 1.
+    """
+    if not 0 < relative_error < 1:
+        raise ValueError(f"L'errore relativo deve essere tra 0 e 1: {relative_error}")
+    return {
+        'relative_error': relative_error,
+        'gamma': (1 + relative_error) / (1 - relative_error),
+        'offset': 0,
+        'counts': np.zeros((groups, 0), dtype=np.int64),
+        'zeros': np.zeros(groups, dtype=np.int64),
+    }
+
+def _widen(sketch, offset, width):
+    """
+    Estende i bucket di uno sketch dei quantili all'intervallo [offset, offset + width), senza cambiare i conteggi.
+
+    Args:
+        sketch (dict): Lo sketch dei quantili.
+        offset (int): L'indice del primo bucket, non maggiore di quello dello sketch.
+        width (int): Il numero di bucket, sufficiente a contenere quelli dello sketch.
+
+    Returns:
+        np.ndarray: I conteggi (gruppi x width).
+    """
+    counts = sketch['counts']
+    if sketch['offset'] == offset and counts.shape[1] == width:
+        return counts
+    wide = np.zeros((len(counts), width), dtype=np.int64)
+    start = sketch['offset'] - offset
+    wide[:, start:start + counts.shape[1]] = counts
+    return wide
+
+def update_quantile_sketch(sketch, groups, values):
+    """
+    Aggiunge dei valori agli sketch dei loro gruppi; i valori mancanti vengono ignorati.
+
+    Args:
+        sketch (dict): Lo sketch dei quantili, aggiornato sul posto.
+        groups (np.ndarray): Il gruppo di ogni valore (da 0 al numero di gruppi - 1).
+        values (np.ndarray): I valori, non negativi.
+
+    Returns:
+        dict: Lo stesso sketch.
+
+    Raises:
+        ValueError: Se ci sono valori negativi.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    known = ~np.isnan(values)
+    groups, values = np.asarray(groups)[known], values[known]
+    if (values < 0).any():
+        raise ValueError("Lo sketch dei quantili accetta solo valori non negativi")
+    size = len(sketch['zeros'])
+    sketch['zeros'] += np.bincount(groups[values == 0], minlength=size)
+    positive = values > 0
+    if not positive.any():
+        return sketch
+    groups = groups[positive]
+    buckets = np.ceil(np.log(values[positive]) / np.log(sketch['gamma'])).astype(np.int64)  # Bucket logaritmico: x cade in (gamma^(i-1), gamma^i].
+    low, high = int(buckets.min()), int(buckets.max()) + 1
+    if sketch['counts'].shape[1]:
+        low, high = min(low, sketch['offset']), max(high, sketch['offset'] + sketch['counts'].shape[1])
+    counts = _widen(sketch, low, high - low)
+    width = high - low
+    counts += np.bincount(groups * width + (buckets - low), minlength=size * width).reshape(size, width)
+    sketch['offset'], sketch['counts'] = low, counts
+    return sketch
+
+def concat_quantile_sketches(sketches):
+    """
+    Mette uno dopo l'altro i gruppi di più sketch dei quantili, allineandone i bucket.
+
+    Args:
+        sketches (list): Gli sketch, con lo stesso errore relativo.
+
+    Returns:
+        dict: Uno sketch con i gruppi di tutti gli sketch, nell'ordine.
+
+    Raises:
+        ValueError: Se gli sketch hanno errori relativi diversi.
+    """
+    if len({sketch['relative_error'] for sketch in sketches}) > 1:
+        raise ValueError("Non si possono unire sketch dei quantili con errori relativi diversi")
+    filled = [sketch for sketch in sketches if sketch['counts'].shape[1]]
+    low = min((sketch['offset'] for sketch in filled), default=0)
+    high = max((sketch['offset'] + sketch['counts'].shape[1] for sketch in filled), default=0)
+    merged = new_quantile_sketch(0, sketches[0]['relative_error'])
+    merged['offset'] = low
+    merged['counts'] = np.vstack([_widen(sketch, low, high - low) for sketch in sketches])
+    merged['zeros'] = np.concatenate([sketch['zeros'] for sketch in sketches])
+    return merged
+
+def regroup_quantile_sketch(sketch, keys, groups):
+    """
+    Unisce gli sketch di più gruppi sommando i bucket (es. dalle celle del cubo a un raggruppamento più grossolano).
+
+    Args:
+        sketch (dict): Lo sketch dei quantili.
+        keys (np.ndarray): Per ogni gruppo dello sketch, il gruppo del risultato.
+        groups (int): Il numero di gruppi del risultato.
+
+    Returns:
+        dict: Il nuovo sketch.
+    """
+    merged = new_quantile_sketch(groups, sketch['relative_error'])
+    merged['offset'] = sketch['offset']
+    merged['counts'] = np.zeros((groups, sketch['counts'].shape[1]), dtype=np.int64)
+    np.add.at(merged['counts'], keys, sketch['counts'])
+    np.add.at(merged['zeros'], keys, sketch['zeros'])
+    return merged
+
+def quantile_values(sketch, quantiles=DEFAULT_QUANTILES):
+    """
+    Stima i quantili di ogni gruppo.
+
+    Il quantile q è il valore di posizione q * (n - 1) nei valori ordinati del gruppo, stimato con un errore relativo
+    di al massimo quello dello sketch.
+
+    Args:
+        sketch (dict): Lo sketch dei quantili.
+        quantiles (iterable): I quantili richiesti, tra 0 e 1.
+
+    Returns:
+        np.ndarray: I quantili stimati (gruppi x quantili); NaN per i gruppi vuoti.
+    """
+    gamma = sketch['gamma']
+    counts = np.column_stack([sketch['zeros'], sketch['counts']])                       # La prima colonna è il bucket dei valori nulli.
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1]
+    buckets = np.arange(sketch['offset'], sketch['offset'] + sketch['counts'].shape[1])
+    representative = np.r_[0.0, 2 * gamma ** buckets / (gamma + 1)]                     # Valore centrale del bucket: errore relativo al più (gamma - 1) / (gamma + 1).
+    result = np.full((len(total), len(tuple(quantiles))), np.nan)
+    for position, quantile in enumerate(quantiles):
+        rank = np.floor(quantile * (total - 1))
+        bucket = (cumulative > rank[:, None]).argmax(axis=1)                            # Il primo bucket che supera la posizione cercata.
+        result[:, position] = np.where(total > 0, representative[bucket], np.nan)
+    return result
+
+def new_distinct_sketch(groups, precision=DEFAULT_PRECISION):
+    """
+    Crea un HyperLogLog vuoto per un certo numero di gruppi.
+
+    Args:
+        groups (int): Il numero di gruppi.
+        precision (int): Il logaritmo in base 2 del numero di registri, tra 4 e 16.
+
+    Returns:
+        dict: Lo stato dello sketch: precisione e registri (gruppi x 2^precision).
+
+    Raises:
+        ValueError: Se la precisione non è tra 4 e 16.
+    """
+    if not 4 <= precision <= 16:
+        raise ValueError(f"La precisione dell'HyperLogLog deve essere tra 4 e 16: {precision}")
+    return {'precision': precision, 'registers': np.zeros((groups, 1 << precision), dtype=np.uint8)}
+
+def _leading_zeros(words):
+    """
+    Conta gli zeri iniziali di ogni intero senza segno a 64 bit.
+
+    Args:
+        words (np.ndarray): Gli interi (uint64).
+
+    Returns:
+        np.ndarray: Il numero di zeri iniziali (64 per lo zero).
+    """
+    words = words.copy()
+    zeros = np.zeros(len(words), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):                                                  # Ricerca binaria, vettorizzata su tutti gli interi.
+        empty = (words >> np.uint64(64 - shift)) == 0
+        zeros[empty] += shift
+        words[empty] <<= np.uint64(shift)
+    zeros[words == 0] += 1                                                              # Solo lo zero arriva qui ancora nullo: 63 + 1 = 64.
+    return zeros
+
+def hash_values(values):
+    """
+    Calcola un hash a 64 bit di ogni valore, uguale in ogni processo e in ogni esecuzione.
+
+    Args:
+        values (array-like): I valori (es. la colonna 'Invoice ID').
+
+    Returns:
+        np.ndarray: Gli hash (uint64).
+    """
+    return pd.util.hash_array(np.asarray(values))
+
+def update_distinct_sketch(sketch, groups, hashes):
+    """
+    Aggiunge degli hash agli HyperLogLog dei loro gruppi.
+
+    Args:
+        sketch (dict): L'HyperLogLog, aggiornato sul posto.
+        groups (np.ndarray): Il gruppo di ogni hash.
+        hashes (np.ndarray): Gli hash a 64 bit dei valori (vedi 'hash_values').
+
+    Returns:
+        dict: Lo stesso sketch.
+    """
+    precision = sketch['precision']
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    register = (hashes >> np.uint64(64 - precision)).astype(np.int64)                   # I primi bit scelgono il registro...
+    rank = np.minimum(_leading_zeros(hashes << np.uint64(precision)), 64 - precision) + 1  # ...gli altri danno la posizione del primo 1.
+    registers = sketch['registers']
+    np.maximum.at(registers.reshape(-1), np.asarray(groups, dtype=np.int64) * registers.shape[1] + register, rank)
+    return sketch
+
+def regroup_distinct_sketch(sketch, keys, groups):
+    """
+    Unisce gli HyperLogLog di più gruppi con il massimo registro per registro.
+
+    Args:
+        sketch (dict): L'HyperLogLog.
+        keys (np.ndarray): Per ogni gruppo dello sketch, il gruppo del risultato.
+        groups (int): Il numero di gruppi del risultato.
+
+    Returns:
+        dict: Il nuovo sketch.
+    """
+    merged = new_distinct_sketch(groups, sketch['precision'])
+    np.maximum.at(merged['registers'], keys, sketch['registers'])
+    return merged
+
+def distinct_counts(sketch):
+    """
+    Stima il numero di valori distinti di ogni gruppo, con la correzione per i conteggi piccoli.
+
+    Args:
+        sketch (dict): L'HyperLogLog.
+
+    Returns:
+        np.ndarray: I conteggi stimati, uno per gruppo.
+    """
+    registers = sketch['registers']
+    m = registers.shape[1]
+    alpha = HLL_ALPHA.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=1)
+    empty = (registers == 0).sum(axis=1)
+    small = (raw <= 2.5 * m) & (empty > 0)                                              # Pochi valori: il conteggio lineare dei registri vuoti è più preciso.
+    linear = m * np.log(m / np.maximum(empty, 1))
+    return np.where(small, linear, raw)
+
+def partial_sketches(columns, start, stop, dimensions, measures, distinct, sizes, relative_error, precision):
+    """
+    Calcola conteggi e sketch delle celle del cubo presenti in un intervallo di righe (la fase 'map').
+
+    Gli sketch vengono allocati solo per le celle osservate nell'intervallo, non per tutte le combinazioni
+    possibili delle dimensioni: la memoria dipende dalle celle presenti, non dal prodotto delle cardinalità.
+
+    Args:
+        columns (dict): Le colonne condivise (codici delle dimensioni, misure e hash della colonna dei distinti).
+        start (int): La prima riga.
+        stop (int): La riga successiva all'ultima.
+        dimensions (list): Le dimensioni del cubo.
+        measures (list): Le misure di cui stimare i quantili.
+        distinct (str | None): La colonna di cui stimare i valori distinti.
+        sizes (dict): Il numero di valori di ogni dimensione.
+        relative_error (float): L'errore relativo degli sketch dei quantili.
+        precision (int): La precisione degli HyperLogLog.
+
+    Returns:
+        tuple: (codici misti delle celle osservate, ordinati; conteggi per cella; sketch dei quantili per misura;
+            HyperLogLog o None), con un gruppo per ogni cella osservata.
+    """
+    cells, valid, _ = cell_codes(columns, start, stop, dimensions, sizes)
+    observed, groups = np.unique(cells, return_inverse=True)                            # Celle compatte: 0 .. numero di celle presenti - 1.
+    counts = np.bincount(groups, minlength=len(observed))
+    quantiles = {measure: update_quantile_sketch(new_quantile_sketch(len(observed), relative_error), groups, columns[measure][start:stop][valid])
+                 for measure in measures}
+    hll = None
+    if distinct:
+        hll = update_distinct_sketch(new_distinct_sketch(len(observed), precision), groups, columns[distinct][start:stop][valid])
+    return observed, counts, quantiles, hll
+
+def build_sketch_cube(sales_data, dimensions=CUBE_DIMENSIONS, measures=SKETCH_MEASURES, distinct=DISTINCT_COLUMN,
+                      relative_error=DEFAULT_RELATIVE_ERROR, precision=DEFAULT_PRECISION, partition_by='rows', processes=1):
+    """
+    Costruisce gli sketch di ogni cella del cubo, su un solo core oppure a partizioni in un pool di processi.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite.
+        dimensions (list): Le colonne che definiscono il livello di dettaglio del cubo.
+        measures (list): Le misure di cui stimare i quantili.
+        distinct (str | None): La colonna di cui stimare i valori distinti (None = nessuna).
+        relative_error (float): L'errore relativo massimo dei quantili.
+        precision (int): La precisione degli HyperLogLog.
+        partition_by (str): 'rows', 'Branch' oppure 'City' (vedi 'parallel_aggregate').
+        processes (int | None): Il numero di processi (1 = nessun pool, None o 0 = uno per core).
+
+    Returns:
+        dict: Le celle osservate ('cells', con le dimensioni e il conteggio delle righe), gli sketch dei quantili di
+            ogni misura ('quantiles') e l'HyperLogLog ('distinct'), con un gruppo per ogni cella, nello stesso ordine.
+    """
+    import os                                                                           # Per il numero di core disponibili
+
+    dimensions, measures = list(dimensions), list(measures)
+    new_quantile_sketch(0, relative_error)                                              # Controlla i parametri prima di copiare le colonne.
+    if distinct:
+        new_distinct_sketch(0, precision)
+    processes = processes or os.cpu_count() or 1
+    block, layout, decoders, sizes, bounds = share_columns(sales_data, dimensions, measures, partition_by,
+                                                           hashed=[distinct] if distinct else [])
+    try:
+        tasks = plan_tasks(bounds, processes)
+        parts = map_partitions(block, layout, tasks, partial_sketches,
+                               (dimensions, measures, distinct, sizes, relative_error, precision), processes)
+    finally:
+        block.close()
+        block.unlink()                                                                  # Il blocco è del processo principale: viene eliminato qui.
+
+    # Fase 'reduce': le celle uguali dei diversi compiti diventano una sola, unendo i loro sketch
+    observed, keys = np.unique(np.concatenate([part[0] for part in parts] or [np.zeros(0, dtype=np.int64)]), return_inverse=True)
+    counts = np.zeros(len(observed), dtype=np.int64)
+    np.add.at(counts, keys, np.concatenate([part[1] for part in parts] or [np.zeros(0, dtype=np.int64)]))
+    quantiles = {measure: regroup_quantile_sketch(concat_quantile_sketches([part[2][measure] for part in parts] or [new_quantile_sketch(0, relative_error)]),
+                                                  keys, len(observed))
+                 for measure in measures}
+    hll = None
+    if distinct:
+        stacked = new_distinct_sketch(0, precision)
+        stacked['registers'] = np.vstack([stacked['registers']] + [part[3]['registers'] for part in parts])
+        hll = regroup_distinct_sketch(stacked, keys, len(observed))
+    del parts
+
+    codes = np.unravel_index(observed, [sizes[dimension] for dimension in dimensions]) if dimensions else ()
+    cells = pd.DataFrame({dimension: decoders[dimension](code) for dimension, code in zip(dimensions, codes)})  # Stessi valori e tipi del cubo.
+    cells[COUNT_COLUMN] = counts
+    return {
+        'dimensions': dimensions,
+        'cells': cells,
+        'quantiles': quantiles,
+        'distinct': hll,
+        'distinct_column': distinct,
+    }
+
+def regroup_sketch_cube(sketch_cube, dimensions):
+    """
+    Deriva gli sketch di un raggruppamento più grossolano unendo quelli delle celle, senza tornare alle righe.
+
+    Args:
+        sketch_cube (dict): Gli sketch prodotti da 'build_sketch_cube' (o da 'merge_sketch_cubes').
+        dimensions (list | str): La dimensione o le dimensioni del raggruppamento.
+
+    Returns:
+        dict: Gli sketch del raggruppamento, nello stesso formato di quelli delle celle.
+
+    Raises:
+        KeyError: Se una dimensione non fa parte degli sketch.
+    """
+    if isinstance(dimensions, str):
+        dimensions = [dimensions]                                                       # Accetta sia una singola colonna sia una lista di colonne.
+    cells = sketch_cube['cells']
+    missing = [dimension for dimension in dimensions if dimension not in cells.columns]
+    if missing:
+        raise KeyError(f"Dimensioni non presenti negli sketch: {missing}")
+
+    grouped = cells.groupby(list(dimensions), observed=True, sort=True)
+    keys = grouped.ngroup().to_numpy()
+    groups = grouped.ngroups
+    distinct = sketch_cube['distinct']
+    return {
+        'dimensions': list(dimensions),
+        'cells': grouped[COUNT_COLUMN].sum().reset_index(),
+        'quantiles': {measure: regroup_quantile_sketch(sketch, keys, groups) for measure, sketch in sketch_cube['quantiles'].items()},
+        'distinct': regroup_distinct_sketch(distinct, keys, groups) if distinct else None,
+        'distinct_column': sketch_cube['distinct_column'],
+    }
+
+def merge_sketch_cubes(sketch_cubes):
+    """
+    Unisce gli sketch di più parti dei dati (es. blocchi dello stesso file), cella per cella.
+
+    Args:
+        sketch_cubes (list): Gli sketch prodotti da 'build_sketch_cube', con le stesse dimensioni e gli stessi parametri.
+
+    Returns:
+        dict: Gli sketch di tutti i dati.
+    """
+    sketch_cubes = [sketch_cube for sketch_cube in sketch_cubes if sketch_cube is not None]
+    if len(sketch_cubes) == 1:
+        return sketch_cubes[0]                                                          # Un solo cubo: non c'è nulla da unire.
+    first = sketch_cubes[0]
+    cells = pd.concat([sketch_cube['cells'] for sketch_cube in sketch_cubes], ignore_index=True)
+    for dimension in first['dimensions']:
+        if isinstance(first['cells'][dimension].dtype, pd.CategoricalDtype) and not isinstance(cells[dimension].dtype, pd.CategoricalDtype):
+            cells[dimension] = cells[dimension].astype('category')                      # Categorie diverse tra i blocchi: la dimensione resta categorica.
+    distinct = None
+    if first['distinct']:
+        distinct = dict(first['distinct'], registers=np.vstack([sketch_cube['distinct']['registers'] for sketch_cube in sketch_cubes]))
+    stacked = {
+        'dimensions': first['dimensions'],
+        'cells': cells,
+        'quantiles': {measure: concat_quantile_sketches([sketch_cube['quantiles'][measure] for sketch_cube in sketch_cubes])
+                      for measure in first['quantiles']},
+        'distinct': distinct,
+        'distinct_column': first['distinct_column'],
+    }
+    return regroup_sketch_cube(stacked, first['dimensions'])                            # Le celle uguali dei diversi blocchi diventano una sola.
+
+def build_sketch_cube_streaming(path, chunksize=DEFAULT_CHUNKSIZE, dimensions=CUBE_DIMENSIONS, measures=SKETCH_MEASURES,
+                                distinct=DISTINCT_COLUMN, relative_error=DEFAULT_RELATIVE_ERROR, precision=DEFAULT_PRECISION):
+    """
+    Costruisce gli sketch di ogni cella leggendo il CSV delle vendite a blocchi di dimensione fissa.
+
+    In memoria restano solo un blocco di righe e gli sketch, la cui dimensione non dipende dal numero di righe.
+
+    Args:
+        path (str | None): Il percorso del CSV delle vendite (se assente si usa quello configurato).
+        chunksize (int): Il numero di righe lette per ogni blocco.
+        dimensions (list): Le dimensioni del cubo.
+        measures (list): Le misure di cui stimare i quantili.
+        distinct (str | None): La colonna di cui stimare i valori distinti.
+        relative_error (float): L'errore relativo massimo dei quantili.
+        precision (int): La precisione degli HyperLogLog.
+
+    Returns:
+        dict: Gli sketch dell'intero file, come 'build_sketch_cube'.
+
+    Raises:
+        ValueError: Se il file non contiene righe.
+    """
+    columns = [dimension for dimension in dimensions if dimension != 'Month'] + list(measures) + ([distinct] if distinct else [])
+    if 'Month' in dimensions:
+        columns.append('Date')                                                          # Il mese viene ricavato dalla data di ogni blocco.
+
+    sketch_cube = None
+    for chunk in iter_sales_chunks(path, chunksize=chunksize, usecols=columns):
+        partial = build_sketch_cube(chunk, dimensions, measures, distinct, relative_error, precision)
+        sketch_cube = partial if sketch_cube is None else merge_sketch_cubes([sketch_cube, partial])
+
+    if sketch_cube is None:
+        raise ValueError(f"Il file {path} non contiene righe di vendita")
+    return sketch_cube
+
+def sketch_rollup(sketch_cube, dimensions, quantiles=DEFAULT_QUANTILES):
+    """
+    Stima quantili e valori distinti di un raggruppamento, unendo gli sketch delle celle.
+
+    Args:
+        sketch_cube (dict): Gli sketch prodotti da 'build_sketch_cube'.
+        dimensions (list | str): La dimensione o le dimensioni del raggruppamento.
+        quantiles (iterable): I quantili da stimare per ogni misura.
+
+    Returns:
+        pd.DataFrame: Una riga per gruppo: le dimensioni, il numero di righe, una colonna per misura e quantile
+            (es. 'Total p50') e il numero stimato di valori distinti (es. 'Invoice ID distinct').
+    """
+    quantiles = tuple(quantiles)
+    grouped = regroup_sketch_cube(sketch_cube, dimensions)
+    table = grouped['cells']
+    for measure, sketch in grouped['quantiles'].items():
+        values = quantile_values(sketch, quantiles)
+        for position, quantile in enumerate(quantiles):
+            table[f'{measure} p{quantile * 100:g}'] = values[:, position]
+    if grouped['distinct']:
+        table[f"{grouped['distinct_column']} distinct"] = distinct_counts(grouped['distinct']).round().astype(np.int64)
+    return table
+
+def sketch_bytes(sketch_cube):
+    """
+    Calcola la memoria occupata dagli sketch.
+
+    Args:
+        sketch_cube (dict): Gli sketch prodotti da 'build_sketch_cube'.
+
+    Returns:
+        int: I byte dei bucket e dei registri.
+    """
+    total = sum(sketch['counts'].nbytes + sketch['zeros'].nbytes for sketch in sketch_cube['quantiles'].values())
+    return total + (sketch_cube['distinct']['registers'].nbytes if sketch_cube['distinct'] else 0)
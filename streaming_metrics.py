@@ -0,0 +1,172 @@
+# ###########################################################################################################
+# Metriche di classificazione incrementali: matrice di confusione aggiornata a lotti
+# ###########################################################################################################
+#
+# 'classification_report' e 'confusion_matrix' di scikit-learn richiedono tutte le etichette reali e previste
+# in memoria. Qui lo stato della valutazione è solo la matrice di confusione (più le etichette delle classi):
+# - 'update' la aggiorna con un lotto di previsioni, senza conservare le etichette;
+# - 'merge' somma gli stati calcolati separatamente (es. da processi diversi o da parti di un file);
+# - precisione, richiamo, F1 e supporto di ogni classe si ricavano dalla matrice ('class_metrics').
+# 'classification_report' restituisce lo stesso testo della funzione di scikit-learn e 'confusion_frame' la
+# tabella usata per la mappa di calore, quindi il report non cambia.
+#
+# Lo stato è un dizionario di array NumPy: si può inviare tra processi o salvare con pickle.
+
+import numpy as np                                                                      # NumPy per la matrice di confusione
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+
+def new_metrics(labels=()):
+    """
+    Crea uno stato vuoto della valutazione.
+
+    Args:
+        labels (iterable): Le classi già note (le altre vengono aggiunte quando compaiono nei lotti).
+
+    Returns:
+        dict: Le classi in ordine ('labels') e la matrice di confusione ('matrix', righe = reali, colonne = previste).
+    """
+    labels = np.unique(np.asarray(list(labels)))
+    return {'labels': labels, 'matrix': np.zeros((len(labels), len(labels)), dtype=np.int64)}
+
+def _with_labels(metrics, labels):
+    """
+    Estende la matrice di confusione a un insieme di classi più ampio, mantenendo i conteggi.
+
+    Args:
+        metrics (dict): Lo stato della valutazione.
+        labels (np.ndarray): Le classi da aggiungere.
+
+    Returns:
+        dict: Lo stato con le classi unite, in ordine.
+    """
+    merged = np.union1d(metrics['labels'], labels) if len(metrics['labels']) else np.unique(labels)  # Uno stato vuoto prende il tipo delle etichette.
+    if len(merged) == len(metrics['labels']):
+        return metrics
+    position = np.searchsorted(merged, metrics['labels'])
+    matrix = np.zeros((len(merged), len(merged)), dtype=np.int64)
+    matrix[np.ix_(position, position)] = metrics['matrix']
+    return {'labels': merged, 'matrix': matrix}
+
+def update(metrics, y_true, y_pred):
+    """
+    Aggiunge un lotto di previsioni allo stato della valutazione.
+
+    Args:
+        metrics (dict): Lo stato della valutazione (aggiornato sul posto).
+        y_true (array-like): Le etichette reali del lotto.
+        y_pred (array-like): Le etichette previste del lotto.
+
+    Returns:
+        dict: Lo stesso stato, aggiornato.
+
+    Raises:
+        ValueError: Se le etichette reali e previste hanno lunghezze diverse.
+    """
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    if y_true.shape != y_pred.shape:
+        raise ValueError(f"Etichette reali e previste di lunghezza diversa: {len(y_true)} e {len(y_pred)}")
+    if len(metrics['labels']):
+        dtype = np.result_type(metrics['labels'], y_true, y_pred)                       # Il tipo comune: etichette più lunghe allargano le stringhe.
+        metrics['labels'] = metrics['labels'].astype(dtype, copy=False)
+        y_true, y_pred = y_true.astype(dtype, copy=False), y_pred.astype(dtype, copy=False)
+    metrics.update(_with_labels(metrics, np.union1d(y_true, y_pred)))                   # Nuove classi: la matrice cresce.
+    n = len(metrics['labels'])
+    cells = np.searchsorted(metrics['labels'], y_true) * n + np.searchsorted(metrics['labels'], y_pred)
+    metrics['matrix'] += np.bincount(cells, minlength=n * n).reshape(n, n)             # Un solo passaggio sul lotto.
+    return metrics
+
+def merge(*parts):
+    """
+    Unisce gli stati di valutazione calcolati separatamente (es. da processi diversi).
+
+    Args:
+        *parts (dict): Gli stati da unire.
+
+    Returns:
+        dict: Un nuovo stato con la somma delle matrici di confusione.
+    """
+    merged = new_metrics()
+    for part in parts:
+        merged = _with_labels(merged, part['labels'])
+        position = np.searchsorted(merged['labels'], part['labels'])
+        merged['matrix'][np.ix_(position, position)] += part['matrix']
+    return merged
+
+def class_metrics(metrics):
+    """
+    Calcola precisione, richiamo, F1 e supporto di ogni classe dalla matrice di confusione.
+
+    Le divisioni per zero (classe mai prevista o mai presente) danno 0, come in scikit-learn.
+
+    Args:
+        metrics (dict): Lo stato della valutazione.
+
+    Returns:
+        pd.DataFrame: Una riga per classe con 'precision', 'recall', 'f1-score' e 'support'.
+    """
+    matrix = metrics['matrix']
+    true_positive = np.diag(matrix).astype(float)
+    predicted, support = matrix.sum(axis=0), matrix.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, true_positive / predicted, 0.0)
+        recall = np.where(support > 0, true_positive / support, 0.0)
+        denominator = predicted + support                                               # 2·TP + FP + FN
+        f1 = np.where(denominator > 0, 2 * true_positive / denominator, 0.0)
+    return pd.DataFrame({'precision': precision, 'recall': recall, 'f1-score': f1, 'support': support},
+                        index=pd.Index(metrics['labels'], name='label'))
+
+def accuracy(metrics):
+    """
+    Calcola l'accuratezza complessiva.
+
+    Args:
+        metrics (dict): Lo stato della valutazione.
+
+    Returns:
+        float: La frazione di previsioni corrette (0 se non ci sono previsioni).
+    """
+    total = metrics['matrix'].sum()
+    return float(np.trace(metrics['matrix']) / total) if total else 0.0
+
+def classification_report(metrics, digits=2):
+    """
+    Formatta le metriche come 'sklearn.metrics.classification_report'.
+
+    Args:
+        metrics (dict): Lo stato della valutazione.
+        digits (int): Le cifre decimali delle metriche.
+
+    Returns:
+        str: Il report, con una riga per classe, l'accuratezza e le medie macro e pesata.
+    """
+    table = class_metrics(metrics)
+    names = [str(label) for label in table.index]
+    width = max([len(name) for name in names] + [len('weighted avg'), digits])
+    headers = ['precision', 'recall', 'f1-score', 'support']
+    row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+    report = ("{:>{width}s} " + " {:>9}" * len(headers)).format('', *headers, width=width) + "\n\n"
+    for name, row in zip(names, table.itertuples(index=False)):
+        report += row_fmt.format(name, row[0], row[1], row[2], int(row[3]), width=width, digits=digits)
+    report += "\n"
+
+    total = int(table['support'].sum())
+    scores = table[['precision', 'recall', 'f1-score']]
+    weights = table['support'] / total if total else np.zeros(len(table))
+    report += ("{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n").format(
+        'accuracy', '', '', accuracy(metrics), total, width=width, digits=digits)
+    report += row_fmt.format('macro avg', *scores.mean(), total, width=width, digits=digits)
+    report += row_fmt.format('weighted avg', *scores.mul(weights, axis=0).sum(), total, width=width, digits=digits)
+    return report
+
+def confusion_frame(metrics):
+    """
+    Restituisce la matrice di confusione come tabella, con le classi in maiuscolo per la mappa di calore.
+
+    Args:
+        metrics (dict): Lo stato della valutazione.
+
+    Returns:
+        pd.DataFrame: Righe = valori reali, colonne = valori predetti (es. 'Bad', 'Good').
+    """
+    names = [str(label).capitalize() for label in metrics['labels']]
+    return pd.DataFrame(metrics['matrix'], index=names, columns=names)
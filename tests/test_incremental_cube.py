@@ -0,0 +1,48 @@
+# ###########################################################################################################
+# Test dell'aggiornamento incrementale del cubo: righe ancora in scrittura e file che crescono
+# ###########################################################################################################
+
+import os                                                                               # Per i percorsi del CSV e della cartella di stato
+import sys                                                                              # Per importare i moduli dalla radice del progetto
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incremental_cube import load_state, update_cube                                    # Il modulo sotto test
+from sales_cube import COUNT_COLUMN                                                     # Numero di fatture di ogni cella
+
+SALES_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'supermarket_sales - Copia.csv')
+
+def sales_lines():
+    with open(SALES_CSV, 'rb') as handle:
+        return handle.read().splitlines(keepends=True)
+
+def test_partial_last_line_waits_for_next_update(tmp_path):
+    lines = sales_lines()
+    path, state_dir = tmp_path / 'sales.csv', str(tmp_path / 'state')
+    half = len(lines[11]) // 2
+    path.write_bytes(b''.join(lines[:11]) + lines[11][:half])                           # 10 righe e metà dell'undicesima.
+
+    cube, added = update_cube(state_dir, [str(path)])
+    assert added == 10
+
+    with open(path, 'ab') as handle:
+        handle.write(lines[11][half:] + b''.join(lines[12:21]))                         # Completa la riga e ne aggiunge altre 9.
+    cube, added = update_cube(state_dir, [str(path)])
+    assert added == 10
+    cube, added = update_cube(state_dir, [str(path)])
+    assert added == 0                                                                   # Nessuna riga contata due volte.
+
+    _, invoice_ids = load_state(state_dir)
+    assert len(invoice_ids) == 20
+    assert cube[COUNT_COLUMN].sum() == 20
+
+def test_rewritten_file_is_read_again(tmp_path):
+    lines = sales_lines()
+    path, state_dir = tmp_path / 'sales.csv', str(tmp_path / 'state')
+    path.write_bytes(b''.join(lines[:11]))
+    update_cube(state_dir, [str(path)])
+
+    path.write_bytes(lines[0] + b''.join(lines[6:16]))                                  # Riscritto: 5 righe già contate e 5 nuove.
+    cube, added = update_cube(state_dir, [str(path)])
+    assert added == 5
+    assert cube[COUNT_COLUMN].sum() == 15
@@ -0,0 +1,207 @@
+# ###########################################################################################################
+# Serie temporali delle vendite: indice temporale ordinato e ricampionamento a qualunque granularità
+# ###########################################################################################################
+#
+# Il trend mensile del report usa 'Month' come periodo e 'Time' non viene mai usato. Qui data e ora vengono
+# combinate una sola volta ('Datetime' di 'loaders.py') in un indice temporale ordinato; le misure e le
+# dimensioni (Città, Categoria di prodotto, ...) vengono conservate come array NumPy nello stesso ordine, con
+# le dimensioni già tradotte in codici interi.
+#
+# Ogni granularità ('hour', 'day', 'week', 'month', 'hour_weekday') viene calcolata una sola volta come vettore
+# di codici di intervallo, consecutivi e senza buchi (dicembre e gennaio sono adiacenti, come ogni altra coppia
+# di mesi). Un ricampionamento è allora un solo 'np.bincount' su codice di intervallo x codice di gruppo; anche
+# i risultati vengono memorizzati, quindi le richieste ripetute non toccano più le righe originali.
+#
+# Lo stato è un dizionario ('build_time_store'): si costruisce una volta per dataset e si riusa per tutte le
+# richieste (tabelle, finestre mobili, mappe di calore ora x giorno della settimana).
+
+import numpy as np                                                                      # NumPy per i codici degli intervalli e le somme vettorizzate
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+
+TIME_MEASURES = ['Total', 'Quantity', 'cogs', 'gross income', 'Rating']                 # Misure conservate nello stato delle serie temporali
+TIME_GROUPS = ['City', 'Branch', 'Customer type', 'Gender', 'Product line', 'Payment']  # Dimensioni per cui si possono separare le serie
+FREQUENCIES = ('hour', 'day', 'week', 'month')                                          # Granularità del ricampionamento
+AGGREGATIONS = ('sum', 'mean', 'count')                                                 # Aggregazioni disponibili in ogni intervallo
+WEEKDAYS = ['Lun', 'Mar', 'Mer', 'Gio', 'Ven', 'Sab', 'Dom']                            # Etichette dei giorni della settimana (da lunedì)
+
+def build_time_store(sales_data, measures=TIME_MEASURES, groups=TIME_GROUPS):
+    """
+    Ordina le vendite per data e ora una sola volta e ne conserva misure e dimensioni come array.
+
+    Args:
+        sales_data (pd.DataFrame): Il DataFrame delle vendite con 'Datetime' (vedi 'loaders.parse_sales_datetimes').
+        measures (list): Le misure numeriche da conservare (quelle assenti vengono ignorate).
+        groups (list): Le dimensioni da conservare (quelle assenti vengono ignorate).
+
+    Returns:
+        dict: L'indice temporale ordinato ('index'), le misure ('measures'), i codici e le categorie di ogni
+            dimensione ('groups') e le cache degli intervalli ('buckets') e dei risultati ('results').
+    """
+    moments = sales_data['Datetime'].to_numpy()
+    order = np.argsort(moments, kind='stable')                                          # L'unico ordinamento: tutto il resto segue questo ordine.
+    store = {'index': pd.DatetimeIndex(moments[order]), 'measures': {}, 'groups': {}, 'buckets': {}, 'results': {}}
+    for measure in measures:
+        if measure in sales_data.columns:
+            store['measures'][measure] = sales_data[measure].to_numpy(dtype=np.float64)[order]
+    for group in groups:
+        if group in sales_data.columns:
+            codes, categories = pd.factorize(sales_data[group], sort=True)
+            store['groups'][group] = (codes[order], pd.Index(categories, name=group))
+    return store
+
+def bucket_codes(store, freq):
+    """
+    Restituisce il codice di intervallo di ogni vendita per una granularità, calcolandolo una sola volta.
+
+    Args:
+        store (dict): Lo stato delle serie temporali.
+        freq (str): 'hour', 'day', 'week' (da lunedì), 'month' oppure 'hour_weekday' (giorno x 24 + ora).
+
+    Returns:
+        tuple: (codici interi da 0, etichette di tutti gli intervalli dal primo all'ultimo, senza buchi).
+
+    Raises:
+        ValueError: Se la granularità non è supportata.
+    """
+    if freq in store['buckets']:
+        return store['buckets'][freq]
+    moments = store['index'].to_numpy()
+    days = moments.astype('datetime64[D]')
+    if freq == 'hour_weekday':
+        weekday = (days.astype(np.int64) + 3) % 7                                       # Il 1° gennaio 1970 era un giovedì: lunedì = 0.
+        hour = (moments - days).astype('timedelta64[h]').astype(np.int64)
+        store['buckets'][freq] = (weekday * 24 + hour, pd.MultiIndex.from_product([WEEKDAYS, range(24)], names=['weekday', 'hour']))
+        return store['buckets'][freq]
+    if freq == 'hour':
+        units, step = moments.astype('datetime64[h]'), 1
+    elif freq == 'day':
+        units, step = days, 1
+    elif freq == 'week':
+        units, step = days - (days.astype(np.int64) + 3) % 7, 7                          # Il lunedì della settimana di ogni vendita.
+    elif freq == 'month':
+        units, step = moments.astype('datetime64[M]'), 1
+    else:
+        raise ValueError(f"Granularità non supportata: {freq} (disponibili: {', '.join(FREQUENCIES)}, hour_weekday)")
+    ordinals = units.astype(np.int64)
+    first = ordinals[0] if len(ordinals) else 0                                         # L'indice è ordinato: il primo è il minimo.
+    codes = (ordinals - first) // step
+    count = int(codes[-1]) + 1 if len(codes) else 0
+    labels = pd.DatetimeIndex((np.arange(count) * step + first).astype(units.dtype), name=freq)  # Tutti gli intervalli, anche quelli senza vendite.
+    store['buckets'][freq] = (codes, labels)
+    return store['buckets'][freq]
+
+def normalize_where(store, where):
+    """
+    Normalizza i filtri in una chiave: per ogni dimensione, i valori ammessi ordinati e senza duplicati.
+
+    Args:
+        store (dict): Lo stato delle serie temporali.
+        where (dict | None): I valori ammessi per dimensione (una lista oppure un solo valore come stringa).
+
+    Returns:
+        tuple: Coppie (dimensione, valori ammessi), ordinate per dimensione.
+
+    Raises:
+        KeyError: Se una colonna dei filtri non è una dimensione dello stato.
+    """
+    unknown = sorted(set(where or {}) - set(store['groups']))
+    if unknown:
+        raise KeyError(f"Colonne non filtrabili: {unknown} (disponibili: {', '.join(store['groups'])})")
+    return tuple(sorted((group, tuple(sorted({values} if isinstance(values, str) else set(values))))
+                        for group, values in (where or {}).items()))
+
+def resample(store, freq, measure='Total', by=None, how='sum', where=None):
+    """
+    Aggrega una misura per intervallo di tempo ed eventualmente per gruppo, con un solo 'np.bincount'.
+
+    Args:
+        store (dict): Lo stato delle serie temporali.
+        freq (str): La granularità (vedi 'bucket_codes').
+        measure (str): La misura da aggregare.
+        by (str | list | None): La dimensione o le dimensioni per cui separare le serie (es. 'City' oppure
+            ['City', 'Product line']); None = una sola serie.
+        how (str): 'sum', 'mean' oppure 'count'.
+        where (dict | None): I valori ammessi per dimensione, come in 'query.parse_filters' (es. {'City': ['Yangon',
+            'Mandalay']}; un solo valore può essere anche una stringa).
+
+    Returns:
+        pd.DataFrame: Una riga per intervallo (anche quelli senza vendite) e una colonna per gruppo (per ogni
+            combinazione dei gruppi, con più dimensioni), oppure la sola colonna della misura se 'by' è None.
+
+    Raises:
+        KeyError: Se la misura, una dimensione o una colonna dei filtri non sono nello stato.
+        ValueError: Se l'aggregazione non è supportata.
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Aggregazione non supportata: {how} (disponibili: {', '.join(AGGREGATIONS)})")
+    by = [by] if isinstance(by, str) else list(by or [])
+    where = normalize_where(store, where)
+    key = (freq, measure, tuple(by), how, where)
+    if key in store['results']:
+        return store['results'][key].copy()                                             # Richiesta già vista: nessun accesso alle righe.
+
+    codes, labels = bucket_codes(store, freq)
+    values = store['measures'][measure]
+    group_codes = np.zeros(len(codes), dtype=np.int64)
+    for group in by:                                                                    # Codice misto delle dimensioni: (città, categoria) -> un solo intero.
+        group_codes = group_codes * len(store['groups'][group][1]) + store['groups'][group][0]
+    if where:
+        mask = np.ones(len(codes), dtype=bool)
+        for group, allowed in where:
+            codes_of_group, categories = store['groups'][group]
+            mask &= np.isin(codes_of_group, [categories.get_loc(value) for value in allowed if value in categories])
+        codes, values, group_codes = codes[mask], values[mask], group_codes[mask]
+    if len(by) > 1:
+        columns = pd.MultiIndex.from_product([store['groups'][group][1] for group in by])
+    else:
+        columns = store['groups'][by[0]][1] if by else pd.Index([measure])
+    cells = codes * len(columns) + group_codes
+    size = len(labels) * len(columns)
+    counts = np.bincount(cells, minlength=size).reshape(len(labels), len(columns))
+    if how == 'count':
+        table = counts
+    else:
+        table = np.bincount(cells, weights=values, minlength=size).reshape(len(labels), len(columns))
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                table = table / counts                                                  # Intervalli senza vendite: NaN.
+    store['results'][key] = pd.DataFrame(table, index=labels, columns=columns)
+    return store['results'][key].copy()
+
+def rolling(store, freq, window, measure='Total', by=None, how='sum', where=None):
+    """
+    Calcola la media mobile di una serie ricampionata (es. media su 7 giorni delle vendite giornaliere).
+
+    Args:
+        store (dict): Lo stato delle serie temporali.
+        freq (str): La granularità del ricampionamento.
+        window (int): Il numero di intervalli della finestra mobile.
+        measure (str): La misura da aggregare.
+        by (str | list | None): La dimensione o le dimensioni per cui separare le serie.
+        how (str): L'aggregazione di ogni intervallo prima della media mobile.
+        where (dict | None): I valori ammessi per dimensione (vedi 'resample').
+
+    Returns:
+        pd.DataFrame: La media mobile, con la stessa forma di 'resample' (finestre incomplete all'inizio incluse).
+    """
+    by = [by] if isinstance(by, str) else list(by or [])
+    key = ('rolling', window, freq, measure, tuple(by), how, normalize_where(store, where))
+    if key not in store['results']:
+        store['results'][key] = resample(store, freq, measure, by, how, where).rolling(window, min_periods=1).mean()
+    return store['results'][key].copy()
+
+def hour_weekday(store, measure='Total', how='sum', where=None):
+    """
+    Costruisce la tabella giorno della settimana x ora del giorno di una misura, per la mappa di calore.
+
+    Args:
+        store (dict): Lo stato delle serie temporali.
+        measure (str): La misura da aggregare.
+        how (str): 'sum', 'mean' oppure 'count'.
+        where (dict | None): I valori ammessi per dimensione (es. {'Product line': ['Sports and travel']}).
+
+    Returns:
+        pd.DataFrame: 7 righe (da lunedì a domenica) e 24 colonne (le ore del giorno).
+    """
+    series = resample(store, 'hour_weekday', measure, None, how, where)[measure]
+    return series.unstack('hour').reindex(WEEKDAYS)                                     # Dalle 168 celle alla griglia 7 x 24.
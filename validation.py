@@ -0,0 +1,237 @@
+# ###########################################################################################################
+# Validazione dei dati: regole dichiarative valutate per colonna, righe non valide in quarantena
+# ###########################################################################################################
+#
+# La pulizia originale (conversione con errors='coerce' e poi 'dropna') scarta righe senza dirlo, e nessuno
+# controlla le vendite: valori di 'Total' come 5489715 (invece di 548.9715) gonfiano ogni cifra del report.
+# Qui ogni controllo è una regola dichiarata come dizionario:
+# - 'name': il nome della regola, usato nei conteggi e nella colonna 'violations' della quarantena;
+# - 'kind': il tipo di controllo ('not_null', 'numeric', 'datetime', 'range', 'identity', 'unique');
+# - 'column': la colonna controllata, più i parametri del tipo di controllo (es. 'min'/'max' per 'range',
+#   'product' e 'factor' per 'identity': column ≈ prodotto delle colonne x fattore).
+# Ogni regola è valutata su intere colonne con operazioni vettorizzate (nessun ciclo sulle righe): il risultato
+# è un vettore booleano delle righe che la violano. Le righe che violano almeno una regola vanno in un file di
+# quarantena, con l'elenco delle regole violate; le altre proseguono nell'analisi.
+#
+# 'validate_csv' valida un file a blocchi (memoria limitata, quarantena scritta man mano): l'unicità di
+# 'Invoice ID' tra blocchi diversi usa l'elenco ordinato degli hash a 64 bit degli ID già visti (8 byte per ID),
+# con una ricerca binaria come in 'incremental_cube.py'.
+
+import os                                                                               # Per la cartella dei file di quarantena
+import time                                                                             # Per misurare il throughput della validazione
+import numpy as np                                                                      # NumPy per i vettori delle violazioni
+import pandas as pd                                                                     # Pandas è utilizzato per la manipolazione e l'analisi dei dati
+from loaders import DATA_DIR, SALES_DATE_FORMAT, SALES_TIME_FORMAT                      # Formati delle colonne temporali delle vendite
+
+DEFAULT_CHUNKSIZE = 250_000                                                             # Righe validate per ogni blocco in 'validate_csv'
+DEFAULT_QUARANTINE_DIR = os.path.join(DATA_DIR, 'quarantine')                           # Cartella predefinita dei file di quarantena
+VIOLATIONS_COLUMN = 'violations'                                                        # Colonna della quarantena con le regole violate da ogni riga
+
+SALES_MEASURES = ['Unit price', 'Quantity', 'Tax 5%', 'Total', 'cogs', 'gross income', 'Rating']
+
+# Regole di 'supermarket_sales'
+SALES_RULES = [
+    {'name': 'invoice_id_present', 'kind': 'not_null', 'column': 'Invoice ID'},
+    {'name': 'invoice_id_unique', 'kind': 'unique', 'column': 'Invoice ID'},                # La prima occorrenza è valida, le successive no
+    *({'name': f'{column}_numeric', 'kind': 'numeric', 'column': column} for column in SALES_MEASURES),
+    {'name': 'date_format', 'kind': 'datetime', 'column': 'Date', 'format': SALES_DATE_FORMAT},
+    {'name': 'time_format', 'kind': 'datetime', 'column': 'Time', 'format': SALES_TIME_FORMAT},
+    {'name': 'unit_price_positive', 'kind': 'range', 'column': 'Unit price', 'min': 0.01},
+    {'name': 'quantity_positive', 'kind': 'range', 'column': 'Quantity', 'min': 1},
+    {'name': 'rating_range', 'kind': 'range', 'column': 'Rating', 'min': 0, 'max': 10},
+    {'name': 'cogs_identity', 'kind': 'identity', 'column': 'cogs', 'product': ['Unit price', 'Quantity']},
+    {'name': 'tax_identity', 'kind': 'identity', 'column': 'Tax 5%', 'product': ['Unit price', 'Quantity'], 'factor': 0.05},
+    {'name': 'total_identity', 'kind': 'identity', 'column': 'Total', 'product': ['Unit price', 'Quantity'], 'factor': 1.05},
+    {'name': 'gross_income_identity', 'kind': 'identity', 'column': 'gross income', 'product': ['Tax 5%']},
+]
+
+# Regole di 'apple_quality': la riga di testo finale del file non è più scartata senza traccia
+APPLE_RULES = [
+    {'name': 'a_id_unique', 'kind': 'unique', 'column': 'A_id'},
+    *({'name': f'{column}_numeric', 'kind': 'numeric', 'column': column}
+      for column in ['A_id', 'Size', 'Weight', 'Sweetness', 'Crunchiness', 'Juiciness', 'Ripeness', 'Acidity']),
+    {'name': 'quality_present', 'kind': 'not_null', 'column': 'Quality'},
+]
+
+DATASET_RULES = {'sales': SALES_RULES, 'apple': APPLE_RULES}                            # Regole predefinite per ogni dataset
+
+def _numeric(frame, column, cache):
+    """
+    Restituisce una colonna come float64, con i valori non numerici mancanti; la conversione avviene una sola volta.
+
+    Args:
+        frame (pd.DataFrame): Il blocco di righe.
+        column (str): La colonna da convertire.
+        cache (dict): Le colonne già convertite per questo blocco.
+
+    Returns:
+        np.ndarray: I valori della colonna.
+    """
+    if column not in cache:
+        values = frame[column]
+        if values.dtype.kind not in 'fiu':
+            values = pd.to_numeric(values, errors='coerce')                             # Solo le colonne lette come testo vanno convertite.
+        cache[column] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return cache[column]
+
+def _check_not_null(frame, rule, cache, state):
+    """Righe con valore mancante."""
+    return frame[rule['column']].isna().to_numpy()
+
+def _check_numeric(frame, rule, cache, state):
+    """Righe con un valore presente ma non numerico."""
+    return np.isnan(_numeric(frame, rule['column'], cache)) & frame[rule['column']].notna().to_numpy()  # Presente ma non numerico.
+
+def _check_datetime(frame, rule, cache, state):
+    """Righe con una data o un'ora che non rispetta il formato 'format'."""
+    values = frame[rule['column']]
+    if pd.api.types.is_datetime64_any_dtype(values) or pd.api.types.is_timedelta64_dtype(values):
+        return np.zeros(len(frame), dtype=bool)                                         # Già convertita dal caricamento tipizzato.
+    return pd.to_datetime(values, format=rule['format'], errors='coerce').isna().to_numpy() & values.notna().to_numpy()
+
+def _check_range(frame, rule, cache, state):
+    """Righe con un valore fuori dall'intervallo ['min', 'max'] (estremi facoltativi)."""
+    values = _numeric(frame, rule['column'], cache)
+    failed = np.zeros(len(frame), dtype=bool)
+    with np.errstate(invalid='ignore'):                                                 # I valori mancanti sono compito di altre regole.
+        if 'min' in rule:
+            failed |= values < rule['min']
+        if 'max' in rule:
+            failed |= values > rule['max']
+    return failed
+
+def _check_identity(frame, rule, cache, state):
+    """Righe in cui 'column' differisce dal prodotto delle colonne 'product' per 'factor' oltre la tolleranza ('atol', 'rtol')."""
+    expected = np.full(len(frame), rule.get('factor', 1.0))
+    for column in rule['product']:
+        expected = expected * _numeric(frame, column, cache)
+    actual = _numeric(frame, rule['column'], cache)
+    with np.errstate(invalid='ignore'):
+        failed = np.abs(actual - expected) > rule.get('atol', 0.01) + rule.get('rtol', 1e-4) * np.abs(expected)
+    return failed
+
+def _check_unique(frame, rule, cache, state):
+    """Righe con un valore già comparso prima, nel blocco o nei blocchi precedenti (stato in 'state')."""
+    keys = pd.util.hash_array(frame[rule['column']].to_numpy())                         # Hash a 64 bit: ordinare interi è molto più rapido che ordinare stringhe.
+    failed = pd.Series(keys).duplicated(keep='first').to_numpy().copy()                 # Duplicati all'interno del blocco.
+    seen = state.get(rule['name'])
+    if seen is not None and len(seen):
+        positions = np.searchsorted(seen, keys).clip(max=len(seen) - 1)
+        failed |= seen[positions] == keys                                               # Già visto in un blocco precedente.
+        keys = np.concatenate([seen, keys])
+    state[rule['name']] = np.sort(keys, kind='stable')                                   # Due tratti già ordinati: la fusione è quasi lineare.
+    return failed
+
+RULE_CHECKS = {                                                                         # Funzione di controllo per ogni tipo di regola
+    'not_null': _check_not_null,
+    'numeric': _check_numeric,
+    'datetime': _check_datetime,
+    'range': _check_range,
+    'identity': _check_identity,
+    'unique': _check_unique,
+}
+
+def validate(frame, rules, state=None):
+    """
+    Valuta le regole su un blocco di righe e lo divide in righe valide e righe in quarantena.
+
+    Args:
+        frame (pd.DataFrame): Il blocco di righe.
+        rules (list): Le regole da applicare (vedi 'SALES_RULES'); quelle su colonne assenti vengono saltate.
+        state (dict | None): Lo stato tra blocchi successivi (gli ID già visti dalle regole 'unique'); None se
+            il blocco è l'intero dataset.
+
+    Returns:
+        tuple: (righe valide, righe in quarantena con la colonna 'violations', violazioni per regola).
+
+    Raises:
+        KeyError: Se una regola ha un tipo sconosciuto.
+    """
+    state = {} if state is None else state
+    cache = {}
+    counts = {}
+    failed_any = np.zeros(len(frame), dtype=bool)
+    failures = {}
+    for rule in rules:
+        if rule['kind'] not in RULE_CHECKS:
+            raise KeyError(f"Tipo di regola sconosciuto: {rule['kind']} (regola {rule['name']})")
+        columns = [rule['column'], *rule.get('product', ())]
+        if any(column not in frame.columns for column in columns):
+            continue
+        failed = RULE_CHECKS[rule['kind']](frame, rule, cache, state)
+        counts[rule['name']] = int(failed.sum())
+        if counts[rule['name']]:
+            failures[rule['name']] = failed
+            failed_any |= failed
+
+    quarantine = frame[failed_any].copy()
+    violations = pd.Series('', index=quarantine.index, dtype=object)
+    for name, failed in failures.items():                                               # Un'operazione per regola, non per riga.
+        violations = violations + np.where(failed[failed_any], name + ';', '')
+    quarantine[VIOLATIONS_COLUMN] = violations.str.rstrip(';')
+    return frame[~failed_any], quarantine, counts
+
+def quarantine_path(path, quarantine_dir=None):
+    """
+    Restituisce il percorso del file di quarantena di un CSV: stesso nome, nella cartella di quarantena.
+
+    Args:
+        path (str): Il CSV validato.
+        quarantine_dir (str | None): La cartella di quarantena (di default 'quarantine' accanto a questo file).
+
+    Returns:
+        str: Il percorso del file di quarantena.
+    """
+    return os.path.join(quarantine_dir or DEFAULT_QUARANTINE_DIR, os.path.basename(path))
+
+def write_quarantine(quarantine, path, header=True):
+    """
+    Scrive (o aggiunge) le righe in quarantena in un CSV.
+
+    Args:
+        quarantine (pd.DataFrame): Le righe in quarantena, con la colonna 'violations'.
+        path (str): Il file di quarantena.
+        header (bool): Se True il file viene ricreato con l'intestazione, altrimenti le righe vengono aggiunte.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    quarantine.to_csv(path, mode='w' if header else 'a', header=header, index=False, lineterminator='\n')
+
+def validate_csv(path, rules, quarantine=None, output=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Valida un CSV a blocchi, scrivendo le righe in quarantena (ed eventualmente quelle valide) man mano.
+
+    Le colonne vengono lette con i tipi dedotti da pandas: le colonne numeriche con valori non numerici restano
+    testo e vengono segnalate dalle regole 'numeric'.
+
+    Args:
+        path (str): Il CSV da validare.
+        rules (list): Le regole da applicare.
+        quarantine (str | None): Il file di quarantena (di default 'quarantine_path(path)').
+        output (str | None): Se indicato, il CSV in cui scrivere le sole righe valide.
+        chunksize (int): Il numero di righe di ogni blocco.
+
+    Returns:
+        dict: Righe lette ('rows'), valide ('valid') e in quarantena ('quarantined'), violazioni per regola
+            ('violations'), il file di quarantena ('quarantine'), secondi trascorsi ('seconds') e throughput in
+            righe al secondo ('rows_per_s').
+    """
+    quarantine = quarantine or quarantine_path(path)
+    start = time.perf_counter()
+    state = {}
+    counts = {}
+    rows = valid_rows = 0
+    for index, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+        valid, rejected, chunk_counts = validate(chunk, rules, state)
+        for name, count in chunk_counts.items():
+            counts[name] = counts.get(name, 0) + count
+        write_quarantine(rejected, quarantine, header=index == 0)                      # Il file viene ricreato al primo blocco, anche se vuoto.
+        if output:
+            valid.to_csv(output, mode='w' if index == 0 else 'a', header=index == 0, index=False, lineterminator='\n')
+        rows += len(chunk)
+        valid_rows += len(valid)
+    seconds = time.perf_counter() - start
+    return {'rows': rows, 'valid': valid_rows, 'quarantined': rows - valid_rows, 'violations': counts,
+            'quarantine': quarantine, 'seconds': seconds, 'rows_per_s': rows / seconds if seconds else 0.0}